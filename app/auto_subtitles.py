@@ -2,23 +2,58 @@
 
 import os
 import tempfile
-import shutil
 import textwrap
+import threading
+import contextvars
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 import srt
-import cv2
-import pytesseract
-from PIL import Image
 import logging
 
-from app.pipeline.FFmpegBurner import mux_multiple_srts_into_mkv, burn
+from app.pipeline.FFmpegBurner import mux_multiple_srts_into_mkv
+from app.pipeline.encode_scheduler import EncodeScheduler
+from app.pipeline.burned_subs import count_frames_with_subtitles
+from app.pipeline.audio import prepare_audio, duration_seconds
+from app.pipeline.metrics import timed
+from app.pipeline.devices import device_kind, translation_kind
 
 logger = logging.getLogger(__name__)
 
 
 class AutoSubtitlePipeline:
-    def __init__(self, transcriber, translator=None):
+    def __init__(self, transcriber, translator=None, devices=None):
         self.transcriber = transcriber
         self.translator = translator
+        # DevicePool placing transcription and translation; None runs them where they were built
+        self.devices = devices
+
+    def place_models(self, stack, transcribe=True, translate=True):
+        """
+        Put the transcriber and translator on pool devices until `stack` closes;
+        returns {stage: device name}. The transcriber's device ("cuda" or "cpu")
+        is the kind asked for, and translation prefers a different device. When
+        none has room, translation shares the transcription's device (the job
+        runs the two one after the other) rather than waiting on itself.
+        """
+        placed = {}
+        if self.devices is None:
+            return placed
+        kind = device_kind(self.transcriber.device)
+        if transcribe:
+            device = stack.enter_context(self.devices.place(
+                "transcribe", kind, memory_mb=self.transcriber.memory_mb(),
+                affinity=(type(self.transcriber).__name__, getattr(self.transcriber, "model_size", None)),
+            ))
+            self.transcriber.use_device(device.torch_device)
+            placed["transcribe"] = device.name
+        if translate and self.translator:
+            device = stack.enter_context(self.devices.place(
+                "translate", translation_kind(kind), memory_mb=self.translator.MEMORY_MB,
+                affinity=type(self.translator).__name__, avoid=placed.values(), held=placed.values(),
+            ))
+            self.translator.use_device(device.torch_device)
+            placed["translate"] = device.name
+        return placed
 
     @staticmethod
     def extract_audio(video_path, audio_path):
@@ -29,19 +64,22 @@ class AutoSubtitlePipeline:
             audio_path
         ], check=True)
 
-    def create_srt(self, segments, src_lang, srt_path, to_language=None, do_translate=False,
-                   max_chars=80, max_lines=2, max_duration=5.0):
-        subs, idx = [], 1
+    @staticmethod
+    def prepare_segments(segments):
+        """Keep only timed, non-empty segments as (start, end, text) tuples."""
+        valid = []
         for seg in segments:
             start, end = seg.get('start'), seg.get('end')
             text = seg.get('text', '').strip()
             if start is None or end is None or not text:
                 continue
-            if do_translate and self.translator and to_language:
-                try:
-                    text = self.translator.translate(text, src_lang, to_language)
-                except Exception as e:
-                    print(f"Translation error: {e}")
+            valid.append((start, end, text))
+        return valid
+
+    @staticmethod
+    def build_subtitles(prepared, texts, max_chars=80, max_lines=2, max_duration=5.0):
+        subs, idx = [], 1
+        for (start, end, _), text in zip(prepared, texts):
             seg_duration = end - start
             lines = textwrap.wrap(text, width=max_chars)
             n_blocks = max(1, (len(lines) + max_lines - 1) // max_lines)
@@ -65,41 +103,112 @@ class AutoSubtitlePipeline:
                         content='\n'.join(sub_lines)
                     ))
                     idx += 1
+        return subs
+
+    @staticmethod
+    def write_srt(subs, srt_path):
         with open(srt_path, "w", encoding="utf-8") as f:
             f.write(srt.compose(subs))
 
+    def create_srt(self, segments, src_lang, srt_path, to_language=None, do_translate=False,
+                   max_chars=80, max_lines=2, max_duration=5.0, batch_size=16):
+        if do_translate and self.translator and to_language:
+            self.create_srts(segments, src_lang, {to_language: srt_path}, max_chars=max_chars,
+                             max_lines=max_lines, max_duration=max_duration, batch_size=batch_size)
+            return
+        prepared = self.prepare_segments(segments)
+        texts = [text for _, _, text in prepared]
+        self.write_srt(self.build_subtitles(prepared, texts, max_chars, max_lines, max_duration), srt_path)
+
+    def create_srts(self, segments, src_lang, srt_paths, max_chars=80, max_lines=2, max_duration=5.0,
+                    batch_size=16):
+        """
+        Write one SRT per target language from a single segment list.
+        srt_paths: {lang: path}. Segments are filtered once and translated into all
+        targets in one multi-target pass (shared encoder work for NLLB/M2M100).
+        """
+        prepared = self.prepare_segments(segments)
+        texts = [text for _, _, text in prepared]
+        targets = list(srt_paths)
+        if self.translator and targets:
+            translations = self.translator.translate_texts(texts, src_lang, targets, batch_size=batch_size)
+        else:
+            translations = {lang: texts for lang in targets}
+        for lang, path in srt_paths.items():
+            self.write_srt(self.build_subtitles(prepared, translations[lang], max_chars, max_lines, max_duration), path)
+
+    def stream_srts(self, audio, language, align_output, srt_paths, progress_callback=None,
+                    max_chars=80, max_lines=2, max_duration=5.0, batch_size=16):
+        """
+        Transcribe and write SRTs incrementally. srt_paths: {"orig": path, lang: path, ...}.
+
+        Each chunk from transcriber.transcribe_stream is appended to the original SRT
+        at once and handed to a single translation thread, so MT for chunk N overlaps
+        ASR for chunk N+1 and the SRT files grow on disk while the job runs.
+        progress_callback(dict) receives the partial SRT names, segment counters and
+        the transcription position (seconds of audio covered so far).
+        Returns (result, src_lang) like Transcriber.transcribe.
+        """
+        targets = [label for label in srt_paths if label != "orig"]
+        subs = {label: [] for label in srt_paths}
+        progress = {"segments_transcribed": 0, "segments_translated": 0, "transcribed_seconds": 0.0}
+        if not isinstance(audio, str):
+            progress["audio_seconds"] = round(duration_seconds(audio), 1)
+        segments_all = []
+        src_lang = language
+        lock = threading.Lock()
+
+        def publish():
+            if progress_callback:
+                partial = {label: os.path.basename(path) for label, path in srt_paths.items() if subs[label]}
+                progress_callback({"partial": partial, **progress})
+
+        def translate_and_write(prepared, src):
+            texts = [text for _, _, text in prepared]
+            if self.translator:
+                # One multi-target call shares the encoder across languages, so it is timed as a whole.
+                with timed("translate", langs="+".join(targets)):
+                    translations = self.translator.translate_texts(texts, src, targets, batch_size=batch_size)
+            else:
+                translations = {lang: texts for lang in targets}
+            with lock:
+                for lang in targets:
+                    subs[lang].extend(self.build_subtitles(prepared, translations[lang], max_chars, max_lines, max_duration))
+                    self.write_srt(subs[lang], srt_paths[lang])
+                progress["segments_translated"] += len(prepared)
+                publish()
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="translate") as mt:
+            futures = []
+            transcription = self.transcriber.transcribe_stream(audio, language=language, align_output=align_output)
+            for segments, src_lang in transcription:
+                segments_all.extend(segments)
+                prepared = self.prepare_segments(segments)
+                with lock:
+                    subs["orig"].extend(self.build_subtitles(
+                        prepared, [text for _, _, text in prepared], max_chars, max_lines, max_duration))
+                    self.write_srt(subs["orig"], srt_paths["orig"])
+                    progress["segments_transcribed"] += len(prepared)
+                    if prepared:
+                        progress["transcribed_seconds"] = round(prepared[-1][1], 1)
+                    publish()
+                if targets and prepared:
+                    futures.append(mt.submit(contextvars.copy_context().run, translate_and_write, prepared, src_lang))
+            for future in futures:
+                future.result()
+
+        # Languages with no segments at all still get an (empty) SRT file.
+        for label, path in srt_paths.items():
+            if not subs[label]:
+                self.write_srt([], path)
+        return {"segments": segments_all, "language": src_lang}, src_lang
+
     def detect_burned_in_subs(self, video_path, frames_to_check=10, min_line_length=5, min_frames_with_text=6):
-        import re
-        cap = cv2.VideoCapture(video_path)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if frame_count == 0:
-            cap.release()
-            return False
-        check_idxs = [int(frame_count * i / frames_to_check) for i in range(frames_to_check)]
-        found_text = 0
-
-        for idx in check_idxs:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if not ret:
-                continue
-            h, w, _ = frame.shape
-            bottom = frame[int(h * 0.8):, :]
-            img = Image.fromarray(bottom)
-            text = pytesseract.image_to_string(img).strip()
-
-            # Filter out very short, single words/numbers, or non-subtitle noise
-            if (
-                text
-                and len(text) >= min_line_length
-                and re.search(r'\s', text)  # must contain a space (likely a sentence)
-                and len(text.split()) > 1  # more than one word
-                and len(text) < 100  # ignore unlikely long texts
-            ):
-                found_text += 1
-
-        cap.release()
-        print(f"Detected subtitle-like text in {found_text} of {frames_to_check} frames.")
+        # Keyframes come from one ffmpeg pass; only frames with text-like edge bands are OCR'd, in parallel.
+        found_text, checked = count_frames_with_subtitles(
+            video_path, frames_to_check=frames_to_check, min_line_length=min_line_length
+        )
+        print(f"Detected subtitle-like text in {found_text} of {checked} frames.")
         return found_text >= min_frames_with_text
 
     # def mask_subtitle_area(self, input_video, output_video, percent=0.15, color="black"):
@@ -186,74 +295,121 @@ class AutoSubtitlePipeline:
     def process(
             self, video_path, audio_path, output_path_base,
             output_languages=None, language=None, device=None,
-            align_output=True, subtitle_burn_type="hard",translation_model_path=None
+            align_output=True, subtitle_burn_type="hard",translation_model_path=None,
+            transcription_cache=None, transcription_key=None, progress_callback=None,
+            stage_callback=None, audio_stream=None, completed=None
     ):
+        """
+        completed: stages a previous run of this job finished ({stage: data}, see
+        stage_callback); transcription and translation are skipped when
+        "subtitles_written" is among them and its SRTs are still on disk.
+        """
         logger.info(f"Starting subtitle processing for: {video_path}")
         logger.info(f"Output languages: {output_languages}, burn type: {subtitle_burn_type}")
 
         output_files = {}
 
+        def stage(name):
+            if progress_callback:
+                progress_callback({"stage": name})
+
         with tempfile.TemporaryDirectory() as tmpdir:
             logger.info(f"Created temporary directory: {tmpdir}")
-            masked = self.detect_burned_in_subs(video_path)
+            # Only a hard burn cares about existing burned-in text; soft-mux and SRT-only skip the frame scan.
+            masked = False
+            if subtitle_burn_type in ("hard", "both"):
+                stage("checking_burned_in_subtitles")
+                with timed("detect_burned_in_subs"):
+                    masked = self.detect_burned_in_subs(video_path)
+                if not masked:
+                    logger.info("No burned-in subtitles detected.")
             if masked:
                 logger.info("Burned-in subtitles detected. Masking area before burning new subtitles.")
                 masked_path = os.path.join(tmpdir, "masked.mp4")
                 self.mask_subtitle_area(video_path, masked_path, percent=0.25)
                 video_for_burn = masked_path
             else:
-                logger.info("No burned-in subtitles detected.")
                 video_for_burn = video_path
 
-            audio_for_transcription = audio_path or video_for_burn
-            if not (audio_for_transcription.endswith('.wav') and os.path.exists(audio_for_transcription)):
-                audio_temp_path = os.path.join(tmpdir, "audio.wav")
-                logger.info(f"Extracting audio to: {audio_temp_path}")
-                self.extract_audio(video_for_burn, audio_temp_path)
-                audio_for_transcription = audio_temp_path
-
-            logger.info(f"Starting transcription with language: {language}, align: {align_output}")
-            result, src_lang = self.transcriber.transcribe(
-                audio_for_transcription, language=language, align_output=align_output
-            )
-            logger.info(f"Transcription complete. Detected language: {src_lang}, segments: {len(result.get('segments', []))}")
-            srt_paths = {}
-
-            # --- Create all SRTs first ---
-            srt_orig = os.path.join(tmpdir, "subtitles_orig.srt")
-            self.create_srt(result['segments'], src_lang=src_lang, srt_path=srt_orig)
-            srt_paths["orig"] = srt_orig
             _, ext = os.path.splitext(video_for_burn)
             base_out = os.path.splitext(output_path_base)[0]
+            # SRTs are written straight to their final location so partial files are visible while the job runs.
+            srt_paths = {"orig": f"{base_out}_orig.srt"}
+            for lang in output_languages or []:
+                srt_paths[lang] = f"{base_out}_{lang}.srt"
+            srt_orig = srt_paths["orig"]
 
-            # --- Handle translations ---
-            if output_languages:
-                logger.info(f"Translating subtitles to: {output_languages}")
-                for lang in output_languages:
-                    logger.info(f"Creating translation for: {lang}")
-                    srt_path = os.path.join(tmpdir, f"subtitles_{lang}.srt")
-                    self.create_srt(
-                        result['segments'], src_lang=src_lang,
-                        srt_path=srt_path, to_language=lang, do_translate=True
+            written = (completed or {}).get("subtitles_written")
+            if written and not all(os.path.exists(path) for path in srt_paths.values()):
+                written = None
+            cached = None
+            if not written and transcription_cache:
+                cached = transcription_cache.get(transcription_key)
+            if written:
+                logger.info("Reusing the subtitles written before the restart; skipping transcription and translation.")
+                src_lang = written.get("language")
+                segment_count = written.get("segments", 0)
+                if written.get("devices"):
+                    output_files["devices"] = written["devices"]
+            elif cached:
+                logger.info("Reusing cached transcription; skipping audio extraction and Whisper.")
+                result, src_lang = cached
+                stage("translating")
+                self.create_srt(result['segments'], src_lang=src_lang, srt_path=srt_orig)
+                if output_languages:
+                    logger.info(f"Translating subtitles to: {output_languages}")
+                    with ExitStack() as placement:
+                        output_files["devices"] = self.place_models(placement, transcribe=False)
+                        with timed("translate", langs="+".join(output_languages)):
+                            self.create_srts(result['segments'], src_lang=src_lang,
+                                             srt_paths={lang: srt_paths[lang] for lang in output_languages})
+            else:
+                # The one decode of the soundtrack: the chosen stream straight to 16kHz mono float32,
+                # memory-mapped and shared by transcription and alignment.
+                stage("extracting_audio")
+                with timed("extract_audio"):
+                    audio = prepare_audio(audio_path or video_path, tmpdir, stream_index=audio_stream)
+
+                # Transcription and the translation overlapping it hold their devices until both finish
+                with ExitStack() as placement:
+                    output_files["devices"] = self.place_models(placement, translate=bool(output_languages))
+                    if progress_callback and output_files["devices"]:
+                        progress_callback({"devices": output_files["devices"]})
+                    stage("transcribing")
+
+                    logger.info(f"Starting streaming transcription with language: {language}, align: {align_output}")
+                    result, src_lang = self.stream_srts(
+                        audio, language, align_output, srt_paths, progress_callback=progress_callback
                     )
-                    srt_paths[lang] = srt_path
+                del audio
+                if transcription_cache:
+                    transcription_cache.put(transcription_key, result, src_lang)
+            if not written:
+                segment_count = len(result.get("segments", []))
+                if stage_callback:
+                    stage_callback("subtitles_written", {
+                        "segments": segment_count, "language": src_lang, "devices": output_files.get("devices", {}),
+                    })
+            logger.info(f"Transcription complete. Detected language: {src_lang}, segments: {segment_count}")
+
+            for lang, path in srt_paths.items():
+                output_files[f"{lang}_srt"] = os.path.basename(path)
+            if subtitle_burn_type == "none":
+                logger.info(f"SRT-only job complete. Total output files: {len(output_files)}")
+                return output_files
 
-            # --- Hard-burn (still per-language and original) ---
+            # --- Burns and soft-mux run concurrently under the shared device limits ---
+            stage("encoding")
+            scheduler = EncodeScheduler(device, progress_callback=progress_callback)
             if subtitle_burn_type in ("hard", "both"):
                 logger.info("Starting hard-burn subtitle process")
-                # Hard-burn original
-                out_video_orig = f"{base_out}_orig{ext}"
-                logger.info(f"Burning original subtitles to: {out_video_orig}")
-                burn(video_for_burn, srt_orig, out_video_orig, device=device, masked=masked)
-                output_files["orig"] = os.path.basename(out_video_orig)
-                # Hard-burn translations
-                if output_languages:
-                    for lang in output_languages:
-                        srt_path = srt_paths[lang]
-                        out_video = f"{base_out}_{lang}{ext}"
-                        logger.info(f"Burning {lang} subtitles to: {out_video}")
-                        burn(video_for_burn, srt_path, out_video, device=device, masked=masked)
-                        output_files[lang] = os.path.basename(out_video)
+                burn_jobs = [("orig", srt_orig, f"{base_out}_orig{ext}")]
+                for lang in output_languages or []:
+                    burn_jobs.append((lang, srt_paths[lang], f"{base_out}_{lang}{ext}"))
+                logger.info(f"Burning {len(burn_jobs)} subtitle outputs: {[out for _, _, out in burn_jobs]}")
+                scheduler.submit_burns(video_for_burn, burn_jobs, masked=masked)
+                for label, _, out in burn_jobs:
+                    output_files[label] = os.path.basename(out)
 
             # --- Soft-mux: make one MKV with ALL SRTs ---
             if subtitle_burn_type in ("soft", "both"):
@@ -265,21 +421,13 @@ class AutoSubtitlePipeline:
                     for lang in output_languages:
                         srt_list.append((lang, srt_paths[lang]))
                 logger.info(f"Muxing {len(srt_list)} subtitle tracks into: {multi_soft_mkv}")
-                mux_multiple_srts_into_mkv(video_for_burn, srt_list, multi_soft_mkv)
+                scheduler.submit("multi_soft", "io", mux_multiple_srts_into_mkv, video_for_burn, srt_list, multi_soft_mkv,
+                                 progress_callback=scheduler.progress_for("multi_soft"))
                 output_files["multi_soft"] = os.path.basename(multi_soft_mkv)
 
-            # Move SRTs to output location and add to output_files
-            logger.info("Moving SRT files to output directory")
-            for lang, path in srt_paths.items():
-                final_srt_path = f"{base_out}_{lang}.srt"
-                shutil.move(path, final_srt_path)
-                output_files[f"{lang}_srt"] = os.path.basename(final_srt_path)
-                logger.info(f"Moved {lang} SRT to: {final_srt_path}")
-
-            # Also move and track the original SRT file
-            # final_srt_orig_path = f"{base_out}_orig.srt"
-            # shutil.move(srt_orig, final_srt_orig_path)
-            # output_files["orig_srt"] = os.path.basename(final_srt_orig_path)
+            output_files["timings"] = scheduler.wait()
+            if stage_callback:
+                stage_callback("encoded", {"outputs": output_files})
 
             logger.info(f"Process complete. Total output files: {len(output_files)}")
             return output_files
@@ -0,0 +1,314 @@
+# app/chunked_upload.py
+import os
+import json
+import time
+import zlib
+import secrets
+import logging
+import threading
+
+from app.staging import content_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = int(float(os.getenv("UPLOAD_CHUNK_MB", "8")) * 1024 * 1024)
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadBusy(UploadError):
+    """The upload is being finalized or aborted, so it takes no more chunks."""
+
+
+def combine_crcs(crcs):
+    """Whole-file checksum the client and server can both compute: CRC32 over the chunk CRC32s in order."""
+    digest = 0
+    for crc in crcs:
+        digest = zlib.crc32(int(crc).to_bytes(4, "big"), digest)
+    return f"{digest:08x}"
+
+
+def _preallocate(fd, size):
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass  # e.g. filesystems without fallocate support
+    os.ftruncate(fd, size)
+
+
+class ChunkedUploads:
+    """
+    Resumable uploads written straight into a preallocated file.
+
+    Chunks may arrive in any order and in parallel; each one is CRC32-checked and
+    written with a positional write at its offset, then appended to the upload's
+    chunk log next to its (write-once) manifest, so a client that lost its
+    connection (or a restarted server) picks up where it left off. Uploads are
+    locked one by one: finalize waits for the chunks being written and then
+    turns away new ones. On finalize the file is renamed to
+    `analyze_{upload_id}.{ext}` in `staged_dir`, the same place `/analyze` stages
+    files, so `/upload` can use it by `file_id`.
+    """
+
+    def __init__(self, work_dir, staged_dir):
+        self.work_dir = work_dir
+        self.staged_dir = staged_dir
+        os.makedirs(work_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._guards = {}
+        self._fds = {}
+        self._write_locks = {}
+
+    # ---- manifests ----
+
+    def _manifest_path(self, upload_id):
+        return os.path.join(self.work_dir, f"{upload_id}.json")
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.work_dir, f"{upload_id}.part")
+
+    def _log_path(self, upload_id):
+        return os.path.join(self.work_dir, f"{upload_id}.chunks")
+
+    def _save(self, session):
+        path = self._manifest_path(session["upload_id"])
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(session, f)
+        os.replace(tmp_path, path)
+
+    def _load(self, upload_id):
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is None:
+                if not all(c.isalnum() for c in upload_id):
+                    raise UploadError("Invalid upload id")
+                try:
+                    with open(self._manifest_path(upload_id)) as f:
+                        session = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    raise UploadError("Unknown upload")
+                try:
+                    with open(self._log_path(upload_id)) as f:
+                        for line in f:
+                            fields = line.split()
+                            if len(fields) == 2 and line.endswith("\n"):  # a torn last line is a chunk to resend
+                                session["crcs"][fields[0]] = int(fields[1])
+                except FileNotFoundError:
+                    pass
+                self._sessions[upload_id] = session
+            return session
+
+    def _guard(self, upload_id):
+        """Per-upload state: a condition guarding its chunk list, chunks being written, and whether it is closing."""
+        with self._lock:
+            if upload_id not in self._sessions:
+                raise UploadError("Unknown upload")
+            guard = self._guards.get(upload_id)
+            if guard is None:
+                guard = self._guards[upload_id] = {"cond": threading.Condition(), "writers": 0, "closing": False}
+            return guard
+
+    def _close_to_writers(self, upload_id):
+        """Turn away new chunks and wait for the ones being written; UploadBusy if already closing."""
+        guard = self._guard(upload_id)
+        with guard["cond"]:
+            if guard["closing"]:
+                raise UploadBusy("Upload is already being finalized")
+            guard["closing"] = True
+            while guard["writers"]:
+                guard["cond"].wait()
+        return guard
+
+    def _forget(self, upload_id):
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+            self._guards.pop(upload_id, None)
+            for path in (self._manifest_path(upload_id), self._log_path(upload_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _received(self, upload_id):
+        """Copy of {index: crc} for the chunks received so far."""
+        session = self._load(upload_id)
+        with self._guard(upload_id)["cond"]:
+            return dict(session["crcs"])
+
+    def _find_resumable(self, resume_key):
+        for name in os.listdir(self.work_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                session = self._load(name[:-len(".json")])
+            except UploadError:
+                continue
+            if session.get("resume_key") == resume_key and os.path.exists(self._data_path(session["upload_id"])):
+                return session
+        return None
+
+    # ---- protocol ----
+
+    def init(self, filename, size, chunk_size=None, resume_key=None):
+        """Start an upload, or return the existing session for `resume_key` with what it already has."""
+        if size <= 0:
+            raise UploadError("Empty file")
+        chunk_size = min(chunk_size or DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE)
+        with self._lock:
+            if resume_key:
+                session = self._find_resumable(resume_key)
+                if session and session["size"] == size:
+                    logger.info(f"[upload-{session['upload_id']}] Resuming: {len(session['crcs'])}/{session['chunks']} chunks present")
+                    return self.status(session["upload_id"])
+            upload_id = secrets.token_hex(6)
+            ext = filename.rsplit(".", 1)[-1] if "." in filename else "bin"
+            session = {
+                "upload_id": upload_id, "filename": filename, "ext": ext, "size": size,
+                "chunk_size": chunk_size, "chunks": (size + chunk_size - 1) // chunk_size,
+                "resume_key": resume_key, "crcs": {}, "created": time.time(),
+            }
+            fd = os.open(self._data_path(upload_id), os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                _preallocate(fd, size)
+            finally:
+                os.close(fd)
+            self._sessions[upload_id] = session
+            self._save(session)
+        logger.info(f"[upload-{upload_id}] New upload {filename} ({size / (1024 * 1024):.1f}MB, {session['chunks']} chunks)")
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        session = self._load(upload_id)
+        received = sorted(int(i) for i in self._received(upload_id))
+        return {
+            "upload_id": upload_id, "size": session["size"], "chunk_size": session["chunk_size"],
+            "chunks": session["chunks"], "received": received, "created": session["created"],
+        }
+
+    def received_prefix(self, upload_id):
+        """Length of the contiguous data received from the start."""
+        session = self._load(upload_id)
+        crcs = self._received(upload_id)
+        n = 0
+        while n < session["chunks"] and str(n) in crcs:
+            n += 1
+        return min(n * session["chunk_size"], session["size"])
+
+    def partial_path(self, upload_id):
+        self._load(upload_id)
+        return self._data_path(upload_id)
+
+    def _fd(self, upload_id):
+        with self._lock:
+            fd = self._fds.get(upload_id)
+            if fd is None:
+                fd = os.open(self._data_path(upload_id), os.O_RDWR | getattr(os, "O_BINARY", 0))
+                self._fds[upload_id] = fd
+                self._write_locks[upload_id] = threading.Lock()
+            return fd
+
+    def _write_at(self, upload_id, offset, data):
+        fd = self._fd(upload_id)
+        if hasattr(os, "pwrite"):
+            written = 0
+            view = memoryview(data)
+            while written < len(data):
+                written += os.pwrite(fd, view[written:], offset + written)
+        else:
+            # No positional writes on Windows: serialize seek + write per file.
+            with self._write_locks[upload_id]:
+                os.lseek(fd, offset, os.SEEK_SET)
+                os.write(fd, data)
+
+    def write_chunk(self, upload_id, offset, data, crc32=None):
+        """Blocking; call from a worker thread. Returns the chunk index."""
+        session = self._load(upload_id)
+        chunk_size = session["chunk_size"]
+        if offset % chunk_size:
+            raise UploadError("Offset is not on a chunk boundary")
+        index = offset // chunk_size
+        expected = min(chunk_size, session["size"] - offset)
+        if index >= session["chunks"] or len(data) != expected:
+            raise UploadError(f"Chunk {index} should be {expected} bytes, got {len(data)}")
+        crc = zlib.crc32(data)
+        if crc32 is not None and int(crc32, 16) != crc:
+            raise UploadError(f"Checksum mismatch for chunk {index}")
+        guard = self._guard(upload_id)
+        with guard["cond"]:
+            if guard["closing"]:
+                raise UploadBusy("Upload is being finalized")
+            guard["writers"] += 1
+        try:
+            self._write_at(upload_id, offset, data)
+            with guard["cond"]:
+                with open(self._log_path(upload_id), "a") as f:
+                    f.write(f"{index} {crc}\n")
+                session["crcs"][str(index)] = crc
+        finally:
+            with guard["cond"]:
+                guard["writers"] -= 1
+                guard["cond"].notify_all()
+        return index
+
+    def _close(self, upload_id):
+        with self._lock:
+            fd = self._fds.pop(upload_id, None)
+            self._write_locks.pop(upload_id, None)
+            if fd is not None:
+                os.close(fd)
+
+    def finalize(self, upload_id, checksum=None):
+        """Verify every chunk arrived (and the combined checksum, if given); returns (staged_path, content_key)."""
+        session = self._load(upload_id)
+        guard = self._close_to_writers(upload_id)
+        try:
+            missing = [i for i in range(session["chunks"]) if str(i) not in session["crcs"]]
+            if missing:
+                raise UploadError(f"{len(missing)} chunk(s) missing, first is {missing[0]}")
+            combined = combine_crcs(session["crcs"][str(i)] for i in range(session["chunks"]))
+            if checksum and checksum.lower() != combined:
+                raise UploadError(f"File checksum mismatch: expected {checksum}, got {combined}")
+            fd = self._fd(upload_id)
+            os.fsync(fd)
+        except Exception:
+            with guard["cond"]:
+                guard["closing"] = False
+            raise
+        self._close(upload_id)
+        staged_path = os.path.join(self.staged_dir, f"analyze_{upload_id}.{session['ext']}")
+        os.replace(self._data_path(upload_id), staged_path)
+        self._forget(upload_id)
+        logger.info(f"[upload-{upload_id}] Upload complete, checksum {combined}")
+        key = content_key(session["size"], session["chunk_size"], (session["crcs"][str(i)] for i in range(session["chunks"])))
+        return staged_path, key
+
+    def abort(self, upload_id):
+        """Drop an upload and its data; UploadBusy while it is being finalized."""
+        try:
+            self._load(upload_id)
+        except UploadError:
+            return
+        self._close_to_writers(upload_id)
+        self._close(upload_id)
+        if os.path.exists(self._data_path(upload_id)):
+            os.remove(self._data_path(upload_id))
+        self._forget(upload_id)
+
+    def cleanup(self, max_age_seconds=24 * 3600):
+        """Drop sessions that have not received a chunk for `max_age_seconds`."""
+        now = time.time()
+        for name in os.listdir(self.work_dir):
+            if name.endswith(".json"):
+                upload_id = name[:-len(".json")]
+                paths = (os.path.join(self.work_dir, name), self._log_path(upload_id))
+                if max(os.stat(p).st_mtime for p in paths if os.path.exists(p)) < now - max_age_seconds:
+                    try:
+                        self.abort(upload_id)
+                    except UploadBusy:
+                        continue
+                    logger.info(f"Cleaned up abandoned upload: {upload_id}")
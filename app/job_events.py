@@ -0,0 +1,76 @@
+# app/job_events.py
+import time
+import asyncio
+import threading
+
+TERMINAL_STATUSES = ("done", "failed")
+
+
+class JobStateStore:
+    """
+    In-memory job state with push notification. Pipeline threads call set/update;
+    SSE handlers on the event loop wait on subscribe() events and read the latest
+    state, so bursts of progress updates coalesce into one message per wake-up.
+    Finished jobs are kept for `retention_seconds`, then served from their status file.
+    """
+
+    def __init__(self, retention_seconds=3600):
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._states = {}
+        self._finished = {}
+        self._subscribers = {}
+
+    def set(self, job_id, data):
+        with self._lock:
+            self._states[job_id] = dict(data)
+            if data.get("status", "done") in TERMINAL_STATUSES:
+                self._finished[job_id] = time.time()
+            else:
+                self._finished.pop(job_id, None)
+            self._prune()
+        self._notify(job_id)
+
+    def update(self, job_id, fields):
+        with self._lock:
+            state = self._states.setdefault(job_id, {})
+            for key, value in fields.items():
+                if isinstance(value, dict) and isinstance(state.get(key), dict):
+                    state[key] = {**state[key], **value}
+                else:
+                    state[key] = value
+        self._notify(job_id)
+
+    def get(self, job_id):
+        with self._lock:
+            state = self._states.get(job_id)
+            return dict(state) if state is not None else None
+
+    def subscribe(self, job_id):
+        """Call from the event loop; the returned event is set whenever the job's state changes."""
+        event = asyncio.Event()
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add((asyncio.get_running_loop(), event))
+        return event
+
+    def unsubscribe(self, job_id, event):
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is event})
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    def _notify(self, job_id):
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed (shutdown)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [j for j, t in self._finished.items() if t < cutoff]:
+            self._finished.pop(job_id, None)
+            self._states.pop(job_id, None)
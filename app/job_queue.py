@@ -0,0 +1,453 @@
+# app/job_queue.py
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+
+from app.pipeline.devices import whisper_vram_mb
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobHandedOver(Exception):
+    """The job was re-queued (or claimed by another worker) while this worker was still running it."""
+
+
+def _int_env(name, default):
+    raw = os.getenv(name)
+    return int(raw) if raw and raw.strip() else default
+
+
+def estimate_resources(kind, params):
+    """Resources a job holds while running: {"cpu_slots": n, "gpu_mem_mb": n}."""
+    resources = {"cpu_slots": 1, "gpu_mem_mb": 0}
+    if kind == "full" and str(params.get("ml_device", "")).startswith("cuda"):
+        resources["gpu_mem_mb"] = whisper_vram_mb(params.get("model", "large"))
+    return resources
+
+
+def detect_gpu_memory_mb():
+    """GPU_MEMORY_MB if set, else ~90% of all GPUs together when torch is already loaded with CUDA, else 0."""
+    configured = os.getenv("GPU_MEMORY_MB")
+    if configured and configured.strip():
+        return int(configured)
+    import sys
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            total = sum(torch.cuda.get_device_properties(i).total_memory for i in range(torch.cuda.device_count()))
+            return int(total / (1024 * 1024) * 0.9)
+    except Exception:
+        pass
+    return 0
+
+
+class ResourcePool:
+    """
+    Admission control for running jobs. A job is admitted when its resources fit in
+    what is left; a job larger than the whole pool is admitted only when the pool is
+    idle, so oversized requests still run instead of starving.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = dict(capacity)
+        self.in_use = {k: 0 for k in capacity}
+        self._lock = threading.Lock()
+
+    def fits(self, resources):
+        with self._lock:
+            idle = not any(self.in_use.values())
+            for key, amount in resources.items():
+                if not amount:
+                    continue
+                cap = self.capacity.get(key, 0)
+                if self.in_use.get(key, 0) + amount > cap and not (idle and amount > cap):
+                    return False
+            return True
+
+    def set_capacity(self, key, amount):
+        with self._lock:
+            self.capacity[key] = amount
+
+    def acquire(self, resources):
+        with self._lock:
+            for key, amount in resources.items():
+                self.in_use[key] = self.in_use.get(key, 0) + amount
+
+    def release(self, resources):
+        with self._lock:
+            for key, amount in resources.items():
+                self.in_use[key] = self.in_use.get(key, 0) - amount
+
+    def snapshot(self):
+        with self._lock:
+            return {"capacity": dict(self.capacity), "in_use": dict(self.in_use)}
+
+
+class JobStore:
+    """
+    SQLite-backed job table. Claiming runs inside BEGIN IMMEDIATE, so several
+    processes sharing the same database never pick up the same job. Every
+    dispatching process heartbeats into the workers table; running jobs of a
+    worker that stopped heartbeating go back in the queue.
+
+    A queued job that does not fit yet counts how often a job behind it was
+    started instead; after `max_passovers` of those, nothing behind it is
+    claimed until it fits, so capacity drains toward it instead of it starving.
+    """
+
+    def __init__(self, db_path, max_passovers=None):
+        self.db_path = db_path
+        self.max_passovers = _int_env("JOB_MAX_PASSOVERS", 8) if max_passovers is None else max_passovers
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        # WAL relies on shared memory (one host); DELETE works for several nodes on a network filesystem with locking
+        conn.execute(f"PRAGMA journal_mode={os.getenv('JOB_DB_JOURNAL_MODE', 'WAL')}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0,"
+            " state TEXT NOT NULL, params TEXT NOT NULL, resources TEXT NOT NULL,"
+            " checkpoint TEXT NOT NULL DEFAULT '{}', attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT, error TEXT, created REAL NOT NULL, started REAL, finished REAL,"
+            " passed_over INTEGER NOT NULL DEFAULT 0)"
+        )
+        if "passed_over" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN passed_over INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_pick ON jobs (state, priority DESC, created)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            " name TEXT PRIMARY KEY, host TEXT NOT NULL, pid INTEGER NOT NULL,"
+            " started REAL NOT NULL, heartbeat REAL NOT NULL, info TEXT NOT NULL DEFAULT '{}')"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("params", "resources", "checkpoint"):
+            job[key] = json.loads(job[key]) if job[key] else {}
+        return job
+
+    def enqueue(self, job_id, kind, params, priority=0, resources=None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (id, kind, priority, state, params, resources, created)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, int(priority), QUEUED, json.dumps(params),
+             json.dumps(resources or estimate_resources(kind, params)), time.time()),
+        )
+
+    def get(self, job_id):
+        return self._row(self._conn().execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+    def claim_next(self, worker, fits=lambda resources: True):
+        """
+        Atomically move the best queued job that `fits` to running and return it.
+        Jobs ahead of it that did not fit are charged a pass-over; one that has
+        been passed over max_passovers times blocks everything behind it.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE state=? ORDER BY priority DESC, created", (QUEUED,)
+            ).fetchall()
+            skipped = []
+            for row in rows:
+                job = self._row(row)
+                if fits(job["resources"]):
+                    conn.executemany("UPDATE jobs SET passed_over=passed_over+1 WHERE id=?",
+                                     [(job_id,) for job_id in skipped])
+                    conn.execute(
+                        "UPDATE jobs SET state=?, worker=?, started=?, attempts=attempts+1, passed_over=0 WHERE id=?",
+                        (RUNNING, worker, time.time(), job["id"]),
+                    )
+                    conn.execute("COMMIT")
+                    job.update(state=RUNNING, worker=worker, attempts=job["attempts"] + 1, passed_over=0)
+                    return job
+                if job["passed_over"] >= self.max_passovers:
+                    break  # hold the capacity that frees up for this job
+                skipped.append(job["id"])
+            conn.execute("COMMIT")
+            return None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # A claim is (worker, attempts): the same worker may claim a job again after it was re-queued.
+    _OWNED = "id=? AND state=? AND worker=? AND attempts=?"
+
+    def owns(self, job):
+        """Whether the claim in `job` (as returned by claim_next) still holds."""
+        row = self._conn().execute(
+            f"SELECT 1 FROM jobs WHERE {self._OWNED}", (job["id"], RUNNING, job["worker"], job["attempts"])
+        ).fetchone()
+        return row is not None
+
+    def checkpoint(self, job, stage, data=None):
+        """Record a finished stage under the job's claim; False when the claim no longer holds."""
+        current = self.get(job["id"])
+        if current is None:
+            return False
+        checkpoint = current["checkpoint"]
+        checkpoint[stage] = {"at": time.time(), **(data or {})}
+        cur = self._conn().execute(
+            f"UPDATE jobs SET checkpoint=? WHERE {self._OWNED}",
+            (json.dumps(checkpoint), job["id"], RUNNING, job["worker"], job["attempts"]),
+        )
+        return cur.rowcount > 0
+
+    def finish(self, job, error=None):
+        """Mark the claimed job done or failed; False (and nothing written) when the claim no longer holds."""
+        cur = self._conn().execute(
+            f"UPDATE jobs SET state=?, error=?, finished=? WHERE {self._OWNED}",
+            (FAILED if error else DONE, error, time.time(), job["id"], RUNNING, job["worker"], job["attempts"]),
+        )
+        return cur.rowcount > 0
+
+    def requeue_running(self, worker=None):
+        """Put jobs interrupted by a restart back in the queue (all of them, or one worker's)."""
+        if worker is None:
+            cur = self._conn().execute("UPDATE jobs SET state=?, worker=NULL WHERE state=?", (QUEUED, RUNNING))
+        else:
+            cur = self._conn().execute(
+                "UPDATE jobs SET state=?, worker=NULL WHERE state=? AND worker=?", (QUEUED, RUNNING, worker)
+            )
+        return cur.rowcount
+
+    def requeue_stale(self, timeout):
+        """Put back running jobs whose worker has not heartbeated for `timeout` seconds."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET state=?, worker=NULL WHERE state=? AND (worker IS NULL OR worker NOT IN"
+            " (SELECT name FROM workers WHERE heartbeat >= ?))", (QUEUED, RUNNING, time.time() - timeout),
+        )
+        return cur.rowcount
+
+    def heartbeat(self, worker, info=None):
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO workers (name, host, pid, started, heartbeat, info) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET heartbeat=excluded.heartbeat, info=excluded.info",
+            (worker, socket.gethostname(), os.getpid(), now, now, json.dumps(info or {})),
+        )
+
+    def remove_worker(self, worker):
+        self._conn().execute("DELETE FROM workers WHERE name=?", (worker,))
+
+    def workers(self, max_age=None):
+        """Registered workers, optionally only those that heartbeated within `max_age` seconds."""
+        cutoff = time.time() - max_age if max_age else 0
+        rows = self._conn().execute(
+            "SELECT * FROM workers WHERE heartbeat >= ? ORDER BY name", (cutoff,)
+        ).fetchall()
+        workers = []
+        for row in rows:
+            worker = dict(row)
+            worker["info"] = json.loads(worker["info"]) if worker["info"] else {}
+            workers.append(worker)
+        return workers
+
+    def list(self, states=(QUEUED, RUNNING), limit=200):
+        placeholders = ",".join("?" * len(states))
+        rows = self._conn().execute(
+            f"SELECT * FROM jobs WHERE state IN ({placeholders})"
+            f" ORDER BY state DESC, priority DESC, created LIMIT ?", (*states, limit)
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def counts(self):
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: n for state, n in rows}
+
+    def queue_position(self, job_id):
+        job = self.get(job_id)
+        if job is None or job["state"] != QUEUED:
+            return None
+        (ahead,) = self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE state=? AND (priority > ? OR (priority = ? AND created < ?))",
+            (QUEUED, job["priority"], job["priority"], job["created"]),
+        ).fetchone()
+        return ahead + 1
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # exists, owned by someone else
+    return True
+
+
+class JobQueue:
+    """
+    Dispatches jobs from a JobStore to `handler(job)` on worker threads, admitting
+    a job only when its resources fit in the ResourcePool and fewer than
+    `max_concurrent` jobs are running. Any number of JobQueues (API process or
+    `python -m app.worker`, on any host) can share one store.
+    """
+
+    def __init__(self, store, handler, resources=None, max_concurrent=None, worker_name=None, poll_seconds=1.0,
+                 heartbeat_seconds=5.0, worker_timeout=None):
+        self.store = store
+        self.handler = handler
+        self.pool = ResourcePool(resources or {
+            "cpu_slots": _int_env("JOB_CPU_SLOTS", 4),
+            "gpu_mem_mb": detect_gpu_memory_mb(),
+        })
+        self.max_concurrent = max_concurrent or _int_env("JOB_MAX_CONCURRENCY", 4)
+        self.worker_name = worker_name or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.worker_timeout = worker_timeout or _int_env("WORKER_TIMEOUT_SECONDS", 60)
+        self._last_heartbeat = 0.0
+        self._last_sweep = 0.0
+        self._running = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, recover=True):
+        self._heartbeat()
+        if recover:
+            recovered = self.recover()
+            if recovered:
+                logger.info(f"Job queue: re-queued {recovered} job(s) interrupted by the last shutdown")
+        self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def shutdown(self):
+        """Stop claiming, hand this worker's running jobs back to the queue and deregister."""
+        self.stop()
+        requeued = self.store.requeue_running(worker=self.worker_name)
+        self.store.remove_worker(self.worker_name)
+        if requeued:
+            logger.info(f"Job queue: handed {requeued} running job(s) back to the queue")
+        return requeued
+
+    def recover(self):
+        """
+        Re-queue running jobs whose worker is gone: an earlier process with this
+        worker's name, dead processes on this host, and workers that stopped heartbeating.
+        """
+        recovered = self.store.requeue_running(worker=self.worker_name)
+        host = socket.gethostname()
+        for worker in self.store.workers():
+            if worker["name"] != self.worker_name and worker["host"] == host and not _pid_alive(worker["pid"]):
+                recovered += self.store.requeue_running(worker=worker["name"])
+                self.store.remove_worker(worker["name"])
+        return recovered + self.store.requeue_stale(self.worker_timeout)
+
+    def is_running_here(self, job_id):
+        return job_id in self._running
+
+    def running(self):
+        return sorted(self._running)
+
+    def _heartbeat(self):
+        self.store.heartbeat(self.worker_name, {
+            "running": self.running(), "max_concurrent": self.max_concurrent,
+            "resources": self.pool.snapshot(),
+        })
+        self._last_heartbeat = time.monotonic()
+
+    def enqueue(self, job_id, kind, params, priority=0):
+        self.store.enqueue(job_id, kind, params, priority=priority)
+        self._wake.set()
+
+    def checkpoint(self, job, stage, data=None):
+        """Record a finished stage; raises JobHandedOver when the job now belongs to another run."""
+        if not self.store.checkpoint(job, stage, data):
+            raise JobHandedOver(f"[{job['id']}] was handed back to the queue while running here")
+
+    def owns(self, job):
+        return self.store.owns(job)
+
+    def cpu_share(self, job_id):
+        """Cores in proportion to the CPU slots a running job holds, at least one."""
+        job = self._running.get(job_id)
+        slots = job["resources"].get("cpu_slots", 1) if job else 1
+        total = max(1, self.pool.capacity.get("cpu_slots", 1))
+        return max(1, (os.cpu_count() or 1) * slots // total)
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            try:
+                now = time.monotonic()
+                if now - self._last_heartbeat >= self.heartbeat_seconds:
+                    self._heartbeat()
+                if now - self._last_sweep >= self.worker_timeout / 2:
+                    self._last_sweep = now
+                    swept = self.store.requeue_stale(self.worker_timeout)
+                    if swept:
+                        logger.warning(f"Job queue: re-queued {swept} job(s) of workers that stopped heartbeating")
+                while len(self._running) < self.max_concurrent:
+                    job = self.store.claim_next(self.worker_name, fits=self.pool.fits)
+                    if job is None:
+                        break
+                    self._launch(job)
+            except Exception as e:
+                logger.error(f"Job queue dispatch error: {e}", exc_info=True)
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def _launch(self, job):
+        self.pool.acquire(job["resources"])
+        self._running[job["id"]] = job
+        logger.info(f"[{job['id']}] Starting {job['kind']} job (priority {job['priority']}, attempt {job['attempts']})")
+
+        def run():
+            error = None
+            try:
+                self.handler(job)
+            except JobHandedOver as e:
+                logger.warning(f"{e}; abandoning this run")
+            except Exception as e:
+                logger.error(f"[{job['id']}] Job failed: {e}", exc_info=True)
+                error = str(e) or e.__class__.__name__
+            finally:
+                if not self.store.finish(job, error):
+                    logger.warning(f"[{job['id']}] Not recording the outcome: the job was handed to another run")
+                self.pool.release(job["resources"])
+                self._running.pop(job["id"], None)
+                self._wake.set()
+
+        threading.Thread(target=run, name=f"job-{job['id']}", daemon=True).start()
+
+    def snapshot(self):
+        return {
+            "worker": self.worker_name,
+            "max_concurrent": self.max_concurrent,
+            "resources": self.pool.snapshot(),
+            "counts": self.store.counts(),
+            "workers": self.store.workers(max_age=self.worker_timeout),
+            "jobs": [
+                {
+                    "id": job["id"], "kind": job["kind"], "state": job["state"], "priority": job["priority"],
+                    "resources": job["resources"], "checkpoint": sorted(job["checkpoint"]),
+                    "attempts": job["attempts"], "worker": job["worker"], "created": job["created"],
+                    "started": job["started"], "passed_over": job["passed_over"],
+                }
+                for job in self.store.list()
+            ],
+        }
@@ -1,36 +1,32 @@
-import torch
-import typing
-# Patch torch.load to handle PyTorch 2.6 weights_only default change
-original_load = torch.load
-def patched_load(*args, **kwargs):
-    # Force weights_only=False for all loads in this process
-    kwargs['weights_only'] = False
-    return original_load(*args, **kwargs)
-torch.load = patched_load
-
-from omegaconf.listconfig import ListConfig
-from omegaconf.dictconfig import DictConfig
-from omegaconf.base import ContainerMetadata, Node
-torch.serialization.add_safe_globals([ListConfig, DictConfig, ContainerMetadata, Node, typing.Any])
 import os
 import secrets
-import tempfile
 from datetime import datetime
 from fastapi import FastAPI, Request, File, UploadFile, Form
-from fastapi.responses import FileResponse, HTMLResponse
-import shutil
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 import logging
 from logging.handlers import RotatingFileHandler
 
-from app.pipeline.FFmpegBurner import burn, mux_multiple_srts_into_mkv, analyze_media
-from app.pipeline.transcriber import FasterWhisperTranscriber, OpenAIWhisperTranscriber
-from app.pipeline.translator import LocalLLMTranslate, preload_models, NLLBTranslate, M2M100Translate
+from app.pipeline.FFmpegBurner import mux_multiple_srts_into_mkv, analyze_media, extract_subtitle_stream
+from app.pipeline.encode_scheduler import EncodeScheduler
+from app.pipeline.bitmap_subs import is_bitmap_subtitle, ocr_subtitle_stream
+from app.pipeline.transcription_cache import TranscriptionCache, audio_stream_hash, full_file_hash
+from app.pipeline.model_registry import registry
+from app.pipeline.devices import device_pool, device_kind, translation_kind
+from app.pipeline.metrics import metrics, timed
+from app.job_queue import JobQueue, JobStore, JobHandedOver, detect_gpu_memory_mb
+from app.ml_stack import ml_stack, cuda_device_count, READY
+from app.prewarm import Prewarmer
+from app.chunked_upload import ChunkedUploads, UploadError, UploadBusy, DEFAULT_CHUNK_SIZE
+from app.staging import StagingArea, StreamingChecksum, ProbeCache
+from app.job_events import JobStateStore, TERMINAL_STATUSES
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import json
+import subprocess
+import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import threading
 
 load_dotenv()
 
@@ -49,7 +45,7 @@ while root_logger.handlers:
     root_logger.removeHandler(root_logger.handlers[0])
 
 file_handler = RotatingFileHandler(
-    os.path.join(LOG_DIR, 'app.log'),
+    os.path.join(LOG_DIR, os.getenv("LOG_FILE", "app.log")),
     maxBytes=10*1024*1024,
     backupCount=5
 )
@@ -75,9 +71,284 @@ STATIC_DIR = os.path.join(BASE_DIR2, "static")
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+job_states = JobStateStore()
+transcription_cache = TranscriptionCache(os.path.join(OUTPUT_DIR, "cache", "transcripts"))
+# Staged uploads default to a directory inside OUTPUT_DIR so staging -> job input is a rename on the same
+# filesystem (important when OUTPUT_DIR is symlinked to another drive). Partial uploads live beside them.
+STAGING_DIR = resolve_project_path("STAGING_DIR", os.path.join(os.path.relpath(OUTPUT_DIR, PROJECT_ROOT), "staging"))
+staging = StagingArea(STAGING_DIR)
+probe_cache = ProbeCache(os.path.join(STAGING_DIR, "probes"))
+chunked_uploads = ChunkedUploads(os.path.join(STAGING_DIR, "uploads"), STAGING_DIR)
+PROBE_MIN_BYTES = 2 * 1024 * 1024  # enough for MKV/TS headers
 TEMPLATES_DIR = os.path.join(BASE_DIR2, "templates")
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
-executor = ThreadPoolExecutor(max_workers=4)  # allow parallel jobs
+
+
+PROGRESS_FLUSH_SECONDS = float(os.getenv("PROGRESS_FLUSH_SECONDS", "2"))
+_progress_flushed = {}
+
+
+def write_status(job_id, data):
+    """Stage transitions: pushed to listeners and persisted, so a restarted server still knows the outcome."""
+    job_states.set(job_id, data)
+    write_status_file(job_id, data)
+    if data.get("status") != "processing":
+        _progress_flushed.pop(job_id, None)
+
+
+def publish_progress(job_id, fields):
+    """
+    Frequent progress (stage, positions, encode percentages): memory and push channel,
+    and every PROGRESS_FLUSH_SECONDS the status file, for an API in another process.
+    """
+    job_states.update(job_id, fields)
+    now = time.monotonic()
+    if now - _progress_flushed.get(job_id, 0) >= PROGRESS_FLUSH_SECONDS:
+        _progress_flushed[job_id] = now
+        state = job_states.get(job_id)
+        if state and state.get("status") == "processing":
+            write_status_file(job_id, state)
+
+
+def write_status_file(job_id, data):
+    # Write-then-rename so /status never reads a half-written file.
+    status_path = os.path.join(OUTPUT_DIR, f"{job_id}.status")
+    tmp_path = f"{status_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, status_path)
+
+
+def load_status(job_id):
+    """
+    In-memory state for jobs this process runs or ran; the status file otherwise.
+    A job this process only queued may have been picked up by a worker elsewhere,
+    so "queued" is re-read from the file the worker writes.
+    """
+    data = job_states.get(job_id)
+    if data is not None and data.get("status") != "queued":
+        return data
+    status_path = os.path.join(OUTPUT_DIR, f"{job_id}.status")
+    if not os.path.exists(status_path):
+        return data
+    with open(status_path, "r") as f:
+        return json.load(f)
+
+
+def build_translator(translator_type):
+    from app.pipeline.translator import build_translator as build
+    return build(translator_type, MODEL_DIR)
+
+
+def resumed_outputs(completed, output_path):
+    """Outputs recorded with a finished "encoded" stage, if every file they name is still there; else None."""
+    outputs = (completed.get("encoded") or {}).get("outputs")
+    if outputs is None:
+        return None
+    out_dir = os.path.dirname(output_path)
+    files = [name for name in outputs.values() if isinstance(name, str)]
+    return outputs if all(os.path.exists(os.path.join(out_dir, name)) for name in files) else None
+
+
+def run_subtitles_only_job(job_id, params, checkpoint, completed):
+    input_path, output_path, ext = params["input_path"], params["output_path"], params["ext"]
+    outputs = resumed_outputs(completed, output_path)
+    if outputs is not None:
+        logger.info(f"[{job_id}] Outputs were encoded before the restart; nothing left to run")
+        return outputs
+    langs_list = params["langs_list"]
+    subtitle_burn_type = params["subtitle_burn_type"]
+    original_lang = params["original_lang"]
+    current_translator = build_translator(params["translator_type"])
+
+    analysis = probe_media(input_path)
+    sub_stream = None
+    orig_lang_from_track = None
+    for stream in analysis.get('streams', []):
+        if stream['codec_type'] == 'subtitle' and (str(stream['index']) == str(params["subtitle_track"])):
+            sub_stream = stream
+            orig_lang_from_track = stream.get('tags', {}).get('language', None)
+            break
+    if sub_stream is None:
+        raise ValueError("Subtitle track not found")
+
+    subtitle_lang = original_lang.strip() if original_lang and original_lang.strip() else (orig_lang_from_track or "und")
+    srt_path = os.path.splitext(output_path)[0] + "_orig.srt"
+    if "subtitles_extracted" in completed and os.path.exists(srt_path):
+        logger.info(f"[{job_id}] Reusing the subtitles extracted before the restart")
+    elif is_bitmap_subtitle(sub_stream):
+        # PGS/VobSub pictures: OCR them into the SRT the translator reads, instead of transcribing the audio
+        publish_progress(job_id, {"stage": "ocr_subtitles"})
+        with timed("ocr_subtitles", codec=sub_stream["codec_name"]):
+            cues = ocr_subtitle_stream(input_path, sub_stream, srt_path, streams=analysis.get("streams"),
+                                       language=orig_lang_from_track, workers=job_queue.cpu_share(job_id))
+        logger.info(f"[{job_id}] OCR'd {cues} subtitle cues from {sub_stream['codec_name']} track")
+        checkpoint("subtitles_extracted")
+    else:
+        publish_progress(job_id, {"stage": "extracting_subtitles"})
+        with timed("extract_subtitles"):
+            extract_subtitle_stream(input_path, sub_stream, srt_path)
+        checkpoint("subtitles_extracted")
+
+    outputs = {"orig_srt": os.path.basename(srt_path)}
+    burn_jobs = []
+    if subtitle_burn_type in ("hard", "both"):
+        out_video_orig = os.path.splitext(output_path)[0] + f"_orig.{ext}"
+        burn_jobs.append(("orig", srt_path, out_video_orig))
+
+    srt_list = [("und", srt_path)]
+    if langs_list:
+        translated_srt_paths = {lang: os.path.splitext(output_path)[0] + f"_{lang}.srt" for lang in langs_list}
+        if "translated" in completed and all(os.path.exists(path) for path in translated_srt_paths.values()):
+            logger.info(f"[{job_id}] Reusing the translations written before the restart")
+            outputs["devices"] = completed["translated"].get("devices", {})
+        else:
+            publish_progress(job_id, {"stage": "translating"})
+            kind = translation_kind(device_kind(params["ml_device"]))
+            with device_pool.place("translate", kind, memory_mb=current_translator.MEMORY_MB,
+                                   affinity=type(current_translator).__name__) as device:
+                current_translator.use_device(device.torch_device)
+                outputs["devices"] = {"translate": device.name}
+                with timed("translate", langs="+".join(langs_list)):
+                    current_translator.translate_srt_multi(srt_path, translated_srt_paths, subtitle_lang)
+            checkpoint("translated", {"devices": outputs["devices"]})
+        for lang in langs_list:
+            translated_srt_path = translated_srt_paths[lang]
+            outputs[f"{lang}_srt"] = os.path.basename(translated_srt_path)
+            srt_list.append((lang, translated_srt_path))
+            if subtitle_burn_type in ("hard", "both"):
+                out_video = os.path.splitext(output_path)[0] + f"_{lang}.{ext}"
+                burn_jobs.append((lang, translated_srt_path, out_video))
+
+    if subtitle_burn_type == "none":
+        # SRT-only: no video output, so nothing reads the video beyond the subtitle extraction
+        return outputs
+
+    publish_progress(job_id, {"stage": "encoding"})
+    scheduler = EncodeScheduler(progress_callback=lambda progress: publish_progress(job_id, progress))
+    if burn_jobs:
+        scheduler.submit_burns(input_path, burn_jobs)
+        for label, _, out in burn_jobs:
+            outputs[label] = os.path.basename(out)
+
+    if subtitle_burn_type in ("soft", "both"):
+        multi_soft_mkv = os.path.splitext(output_path)[0] + "_multi_soft.mkv"
+        filtered_srt_list = [item for item in srt_list if '_orig' not in item[1]]
+        scheduler.submit("multi_soft", "io", mux_multiple_srts_into_mkv, input_path, filtered_srt_list, multi_soft_mkv,
+                         progress_callback=scheduler.progress_for("multi_soft"))
+        outputs["multi_soft"] = os.path.basename(multi_soft_mkv)
+    outputs["timings"] = scheduler.wait()
+    checkpoint("encoded", {"outputs": outputs})
+    return outputs
+
+
+def run_full_pipeline_job(job_id, params, checkpoint, completed):
+    input_path, output_path = params["input_path"], params["output_path"]
+    outputs = resumed_outputs(completed, output_path)
+    if outputs is not None:
+        logger.info(f"[{job_id}] Outputs were encoded before the restart; nothing left to run")
+        return outputs
+    model, model_type, ml_device = params["model"], params["model_type"], params["ml_device"]
+    original_lang, align, audio_track = params["original_lang"], params["align"], params["audio_track"]
+
+    analysis = probe_media(input_path)
+    audio_stream_index = None
+    if audio_track is not None:
+        for stream in analysis.get('streams', []):
+            if stream['codec_type'] == 'audio' and (str(stream['index']) == str(audio_track)):
+                audio_stream_index = stream['index']
+                break
+
+    transcription_language = original_lang.strip() if original_lang and original_lang.strip() else None
+    transcription_key = TranscriptionCache.make_key(
+        transcription_media_key(input_path, audio_stream_index, params), model_type, model, transcription_language, align
+    )
+
+    from app.pipeline.transcriber import build_transcriber
+    transcriber = build_transcriber(MODEL_DIR, model_type, model, ml_device)
+
+    from app.auto_subtitles import AutoSubtitlePipeline
+    pipeline = AutoSubtitlePipeline(transcriber, build_translator(params["translator_type"]), devices=device_pool)
+
+    start_time = datetime.now()
+    result_files = pipeline.process(
+        video_path=input_path, audio_path=None, audio_stream=audio_stream_index,
+        output_path_base=output_path, output_languages=params["langs_list"],
+        language=transcription_language,
+        device=params["video_device"], align_output=align,
+        subtitle_burn_type=params["subtitle_burn_type"], translation_model_path=MODEL_DIR,
+        transcription_cache=transcription_cache, transcription_key=transcription_key,
+        progress_callback=lambda progress: publish_progress(job_id, progress), stage_callback=checkpoint,
+        completed=completed,
+    )
+    duration = round((datetime.now() - start_time).total_seconds(), 2)
+    result_files["duration_seconds"] = str(duration)
+    return result_files
+
+
+def transcription_media_key(input_path, audio_stream_index, params):
+    """
+    What the transcription cache knows the audio by: a hash of the selected
+    stream's packets, kept per file identity so a job on the same file reads
+    nothing. If ffmpeg cannot hash it, the upload's content key (the whole
+    file), or with TRANSCRIPTION_CACHE_FULL_HASH=1 a full read of the file;
+    else None, and the job runs uncached.
+    """
+    try:
+        return "audio:" + probe_cache.get_or_probe(
+            input_path, lambda path: {"audio_hash": audio_stream_hash(path, audio_stream_index)},
+            variant=f"audio_hash:{audio_stream_index}",
+        )["audio_hash"]
+    except (subprocess.CalledProcessError, RuntimeError, OSError) as e:
+        logger.warning(f"Could not hash the audio of {os.path.basename(input_path)}: {e}")
+    stream = "default" if audio_stream_index is None else audio_stream_index
+    content_key = params.get("content_key") or staging.content_key_of(input_path)
+    if content_key:
+        return f"file:{content_key}:{stream}"
+    if os.getenv("TRANSCRIPTION_CACHE_FULL_HASH", "0").lower() in ("1", "true", "yes", "on"):
+        return f"file:{full_file_hash(input_path)}:{stream}"
+    return None
+
+
+def run_job(job):
+    """
+    Job-queue handler. A job interrupted by a restart skips the stages its
+    checkpoint records as finished, as long as their files are still there;
+    the rest re-run, cheaply where caches apply (transcription cache, translation memory).
+    """
+    job_id, params = job["id"], job["params"]
+    if job["checkpoint"]:
+        logger.info(f"[{job_id}] Resuming; completed stages before restart: {sorted(job['checkpoint'])}")
+    write_status(job_id, {"status": "processing", "start_time": datetime.now().isoformat()})
+
+    def checkpoint(stage, data=None):
+        job_queue.checkpoint(job, stage, data)
+
+    try:
+        if ml_stack.state != READY:
+            publish_progress(job_id, {"stage": "loading_models"})
+            ml_stack.ensure_loaded()
+        with metrics.job_context(job_id, on_update=lambda snap: publish_progress(job_id, {"metrics": snap})) as job_metrics:
+            with timed("job", kind=job["kind"]):
+                if job["kind"] == "subtitles_only":
+                    logger.info(f"[{job_id}] Starting subtitle-only pipeline")
+                    result = run_subtitles_only_job(job_id, params, checkpoint, job["checkpoint"])
+                else:
+                    result = run_full_pipeline_job(job_id, params, checkpoint, job["checkpoint"])
+        result["metrics"] = job_metrics.snapshot()
+        # A run that was handed back to the queue must not overwrite the status of the run that took over
+        if job_queue.owns(job):
+            write_status(job_id, result)
+    except JobHandedOver:
+        raise
+    except Exception as e:
+        logger.error(f"[{job_id}] Pipeline failed: {str(e)}", exc_info=True)
+        if job_queue.owns(job):
+            write_status(job_id, {"error": str(e), "status": "failed"})
+        raise
+
+
+job_queue = JobQueue(JobStore(os.path.join(OUTPUT_DIR, "jobs.sqlite3")), handler=run_job)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -98,18 +369,11 @@ async def upload_video(
         audio_track: int = Form(None),
         subtitle_track: int = Form(None),
         use_subtitles_only: bool = Form(False),
-        translator_type: str = Form("m2m100")
+        translator_type: str = Form("m2m100"),
+        priority: int = Form(0)
 ):
-    import subprocess
     loop = asyncio.get_running_loop()
-
-    # --- RESOLVE TRANSLATOR ---
-    if translator_type == "nllb":
-        current_translator = NLLBTranslate(MODEL_DIR)
-    elif translator_type == "localllm":
-        current_translator = LocalLLMTranslate(MODEL_DIR)
-    else:
-        current_translator = M2M100Translate(MODEL_DIR)
+    key = None  # content key of a direct upload; staged files are looked up in the dedupe index
 
     if file:
         filename = file.filename
@@ -120,34 +384,23 @@ async def upload_video(
 
         logger.info(f"[{job_id}] Starting upload for file: {filename}")
         try:
-            bytes_written = 0
-            # Open file once and write chunks in a thread-safe way
-            with open(input_path, "wb") as f:
-                while True:
-                    chunk = await file.read(app.state.upload_chunk_size)
-                    if not chunk:
-                        break
-                    # Use run_in_executor for blocking file write
-                    await loop.run_in_executor(None, f.write, chunk)
-                    bytes_written += len(chunk)
+            bytes_written, key = await receive_upload(file, input_path)
             logger.info(f"[{job_id}] Upload complete - size: {bytes_written / (1024*1024):.2f}MB")
+            await loop.run_in_executor(None, staging.dedupe, input_path, key)
         except Exception as e:
             logger.error(f"[{job_id}] Upload failed: {str(e)}", exc_info=True)
             raise
     elif file_id:
-        temp_dir = tempfile.gettempdir()
-        matches = [f for f in os.listdir(temp_dir) if f.startswith(f"analyze_{file_id}")]
-        if not matches:
+        staged_path = staging.find(file_id)
+        if not staged_path:
             return {"error": "Staged file not found. Please re-analyze or upload manually."}
 
-        staged_filename = matches[0]
-        staged_path = os.path.join(temp_dir, staged_filename)
+        staged_filename = os.path.basename(staged_path)
         ext = staged_filename.split('.')[-1]
 
         job_id = f"staged_{file_id}"
-        input_path = os.path.join(OUTPUT_DIR, f"{job_id}_input.{ext}")
-        # Use run_in_executor for blocking shutil.move
-        await loop.run_in_executor(None, shutil.move, staged_path, input_path)
+        # Same filesystem as OUTPUT_DIR by default, so this is a rename, not a 30GB copy.
+        input_path = staging.adopt(staged_path, os.path.join(OUTPUT_DIR, f"{job_id}_input.{ext}"))
         logger.info(f"[{job_id}] Using staged file: {staged_filename}")
     else:
         return {"error": "No file or file_id provided"}
@@ -155,174 +408,126 @@ async def upload_video(
     align = align or None
     logger.info(f"[{job_id}] Parameters - langs: {langs}, model: {model}, model_type: {model_type}")
 
-    langs_list = langs.strip().split()
-    output_path = os.path.join(OUTPUT_DIR, f"{job_id}_output.{ext}")
     ml_device, video_device = resolve_device(user_device=processor)
+    params = {
+        "input_path": input_path,
+        "output_path": os.path.join(OUTPUT_DIR, f"{job_id}_output.{ext}"),
+        "ext": ext,
+        "langs_list": langs.strip().split(),
+        "model": model,
+        "model_type": model_type,
+        "ml_device": ml_device,
+        "video_device": video_device,
+        "subtitle_burn_type": subtitle_burn_type,
+        "align": align,
+        "original_lang": original_lang,
+        "audio_track": audio_track,
+        "subtitle_track": subtitle_track,
+        "translator_type": translator_type,
+        "content_key": key,
+    }
+    kind = "subtitles_only" if use_subtitles_only and subtitle_track is not None else "full"
 
     # --- MAIN PIPELINE SUBMIT ---
-    # Create initial status file
-    initial_status = {"status": "processing", "start_time": datetime.now().isoformat()}
-    with open(os.path.join(OUTPUT_DIR, f"{job_id}.status"), "w") as f:
-        json.dump(initial_status, f)
-
-    async def run_pipeline_task():
-        if use_subtitles_only and subtitle_track is not None:
-            logger.info(f"[{job_id}] Starting subtitle-only pipeline in executor")
-            # We wrap the whole subtitle-only logic in executor if it's blocking
-            def process_subs_only():
-                analysis = analyze_media(input_path)
-                sub_stream_index = None
-                orig_lang_from_track = None
-                for stream in analysis.get('streams', []):
-                    if stream['codec_type'] == 'subtitle' and (str(stream['index']) == str(subtitle_track)):
-                        sub_stream_index = stream['index']
-                        orig_lang_from_track = stream.get('tags', {}).get('language', None)
-                        break
-                if sub_stream_index is None:
-                    return {"error": "Subtitle track not found"}
-
-                subtitle_lang = original_lang.strip() if original_lang and original_lang.strip() else (orig_lang_from_track or "und")
-                srt_path = os.path.splitext(output_path)[0] + "_orig.srt"
-
-                def extract_subs(infile, outfile, ffmpeg_index):
-                    cmd = ["ffmpeg", "-y", "-i", infile, "-map", f"0:{ffmpeg_index}", outfile]
-                    subprocess.run(cmd, check=True)
-                extract_subs(input_path, srt_path, sub_stream_index)
-
-                outputs = {"orig_srt": os.path.basename(srt_path)}
-                if subtitle_burn_type in ("hard", "both"):
-                    out_video_orig = os.path.splitext(output_path)[0] + f"_orig.{ext}"
-                    burn(input_path, srt_path, out_video_orig)
-                    outputs["orig"] = os.path.basename(out_video_orig)
-
-                srt_list = [("und", srt_path)]
-                if langs_list:
-                    for lang in langs_list:
-                        translated_srt_path = os.path.splitext(output_path)[0] + f"_{lang}.srt"
-                        current_translator.translate_srt(translated_srt_path, srt_path, subtitle_lang, lang)
-                        outputs[f"{lang}_srt"] = os.path.basename(translated_srt_path)
-                        srt_list.append((lang, translated_srt_path))
-                        if subtitle_burn_type in ("hard", "both"):
-                            out_video = os.path.splitext(output_path)[0] + f"_{lang}.{ext}"
-                            burn(input_path, translated_srt_path, out_video)
-                            outputs[lang] = os.path.basename(out_video)
-
-                if subtitle_burn_type in ("soft", "both"):
-                    multi_soft_mkv = os.path.splitext(output_path)[0] + "_multi_soft.mkv"
-                    filtered_srt_list = [item for item in srt_list if '_orig' not in item[1]]
-                    mux_multiple_srts_into_mkv(input_path, filtered_srt_list, multi_soft_mkv)
-                    outputs["multi_soft"] = os.path.basename(multi_soft_mkv)
-
-                with open(os.path.join(OUTPUT_DIR, f"{job_id}.status"), "w") as f:
-                    json.dump(outputs, f)
-                return outputs
-
-            await loop.run_in_executor(executor, process_subs_only)
-        else:
-            # AUDIO-TRACK OR FULL PIPELINE
-            def run_full_pipeline():
-                try:
-                    analysis = analyze_media(input_path)
-                    audio_stream_index = None
-                    if audio_track is not None:
-                        for stream in analysis.get('streams', []):
-                            if stream['codec_type'] == 'audio' and (str(stream['index']) == str(audio_track)):
-                                audio_stream_index = stream['index']
-                                break
-
-                    transcription_audio_path = None
-                    if audio_stream_index is not None:
-                        transcription_audio_path = os.path.splitext(output_path)[0] + "_track.wav"
-                        cmd = ["ffmpeg", "-y", "-i", input_path, "-map", f"0:{audio_stream_index}", "-vn", "-acodec", "pcm_s16le", transcription_audio_path]
-                        subprocess.run(cmd, check=True)
-                    else:
-                        transcription_audio_path = input_path
-
-                    if model_type == "faster-whisper":
-                        transcriber = FasterWhisperTranscriber(MODEL_DIR, model_type, model, ml_device)
-                    else:
-                        transcriber = OpenAIWhisperTranscriber(MODEL_DIR, model_type, model, ml_device)
-
-                    from app.auto_subtitles import AutoSubtitlePipeline
-                    pipeline = AutoSubtitlePipeline(transcriber, current_translator)
-
-                    start_time = datetime.now()
-                    result_files = pipeline.process(
-                        video_path=input_path, audio_path=transcription_audio_path,
-                        output_path_base=output_path, output_languages=langs_list,
-                        language=original_lang.strip() if original_lang and original_lang.strip() else None,
-                        device=video_device, align_output=align,
-                        subtitle_burn_type=subtitle_burn_type, translation_model_path=MODEL_DIR
-                    )
-                    duration = round((datetime.now() - start_time).total_seconds(), 2)
-                    result_files["duration_seconds"] = str(duration)
-                    with open(os.path.join(OUTPUT_DIR, f"{job_id}.status"), "w") as f:
-                        json.dump(result_files, f)
-
-                    if transcription_audio_path and os.path.exists(transcription_audio_path) and transcription_audio_path != input_path:
-                        os.remove(transcription_audio_path)
-                except Exception as e:
-                    logger.error(f"[{job_id}] Pipeline failed: {str(e)}", exc_info=True)
-                    with open(os.path.join(OUTPUT_DIR, f"{job_id}.status"), "w") as f:
-                        json.dump({"error": str(e), "status": "failed"}, f)
-
-            await loop.run_in_executor(executor, run_full_pipeline)
-
-    asyncio.create_task(run_pipeline_task())
+    write_status(job_id, {"status": "queued", "queued_at": datetime.now().isoformat()})
+    job_queue.enqueue(job_id, kind, params, priority=priority)
     return {"job_id": job_id}
 
+def track_list(analysis):
+    tracks = []
+    for stream in analysis.get('streams', []):
+        tracks.append({
+            'index': stream['index'],
+            'type': stream['codec_type'],
+            'codec': stream.get('codec_name'),
+            'lang': stream.get('tags', {}).get('language', 'und'),
+            'default': stream.get('disposition', {}).get('default', 0),
+            'forced': stream.get('disposition', {}).get('forced', 0),
+            'title': stream.get('tags', {}).get('title', ''),
+            'id': stream.get('id', None)
+        })
+    return tracks
+
+def probe_media(path):
+    """ffprobe a complete file; the result is cached per file, so the job reuses what /analyze or finalize probed."""
+    with timed("analyze_media"):
+        return probe_cache.get_or_probe(path, analyze_media)
+
+async def receive_upload(file, path):
+    """Stream a multipart upload to `path`; returns (bytes_written, content_key) for the dedupe index."""
+    loop = asyncio.get_running_loop()
+    checksum = StreamingChecksum(DEFAULT_CHUNK_SIZE)
+    started = time.perf_counter()
+
+    def write(f, chunk):
+        f.write(chunk)
+        checksum.update(chunk)
+
+    with open(path, "wb") as f:
+        while True:
+            chunk = await file.read(app.state.upload_chunk_size)
+            if not chunk:
+                break
+            await loop.run_in_executor(None, write, f, chunk)
+    metrics.observe("upload", time.perf_counter() - started, protocol="multipart")
+    metrics.count("subtitle_upload_bytes_total", checksum.size, protocol="multipart")
+    return checksum.size, checksum.key()
+
 @app.post("/analyze")
 async def analyze_file(file: UploadFile = File(...)):
     ext = file.filename.split('.')[-1]
     analyze_id = secrets.token_hex(6)
-    tmp_path = os.path.join(tempfile.gettempdir(), f"analyze_{analyze_id}.{ext}")
+    tmp_path = staging.path(f"analyze_{analyze_id}.{ext}")
     loop = asyncio.get_running_loop()
 
     logger.info(f"[analyze-{analyze_id}] Starting analysis for: {file.filename}")
     try:
-        with open(tmp_path, "wb") as f:
-            while True:
-                chunk = await file.read(app.state.upload_chunk_size)
-                if not chunk:
-                    break
-                await loop.run_in_executor(None, f.write, chunk)
+        _, key = await receive_upload(file, tmp_path)
+        await loop.run_in_executor(None, staging.dedupe, tmp_path, key)
 
-        analysis = await loop.run_in_executor(None, analyze_media, tmp_path)
-        tracks = []
-        for stream in analysis.get('streams', []):
-            tracks.append({
-                'index': stream['index'],
-                'type': stream['codec_type'],
-                'codec': stream.get('codec_name'),
-                'lang': stream.get('tags', {}).get('language', 'und'),
-                'default': stream.get('disposition', {}).get('default', 0),
-                'forced': stream.get('disposition', {}).get('forced', 0),
-                'title': stream.get('tags', {}).get('title', ''),
-                'id': stream.get('id', None)
-            })
-        return {'tracks': tracks, 'file_id': analyze_id}
+        analysis = await loop.run_in_executor(None, probe_media, tmp_path)
+        return {'tracks': track_list(analysis), 'file_id': analyze_id}
     except Exception as e:
         logger.error(f"[analyze-{analyze_id}] Analysis failed: {str(e)}", exc_info=True)
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
         raise
 
+# Declarative model warm-up (see warmup.example.json); no file means nothing is prewarmed
+WARMUP_PROFILE = resolve_project_path("WARMUP_PROFILE", "warmup.json")
+prewarmer = Prewarmer(WARMUP_PROFILE, MODEL_DIR)
+
+# "inline": this process runs jobs as well; "external": the API only enqueues, `python -m app.worker` runs them
+JOB_RUNNER = os.getenv("JOB_RUNNER", "inline").strip().lower()
+STATUS_POLL_SECONDS = float(os.getenv("STATUS_POLL_SECONDS", "1"))
+
+def start_job_runner(warm_up=True):
+    """Run queued jobs in this process (the API in inline mode, or app.worker)."""
+    # Jobs still marked running were interrupted by the last shutdown; they go back in the queue.
+    job_queue.start(recover=True)
+
+    # GPU memory for admission is only known once torch is loaded
+    ml_stack.on_ready(lambda: job_queue.pool.set_capacity("gpu_mem_mb", detect_gpu_memory_mb()))
+    # The profile runs whenever the stack is imported, so /ready settles even if the import waits for a job
+    ml_stack.on_ready(prewarmer.start_in_background)
+    # ML_WARMUP=0 (e.g. analyze-only replicas) leaves the import to the first job
+    if warm_up and os.getenv("ML_WARMUP", "1").lower() not in ("0", "false", "no", "off"):
+        ml_stack.warm_up_in_background()
+
 @app.on_event("startup")
 async def startup_event():
-    # Optional: cleanup old staged files on startup
-    import time
-    temp_dir = tempfile.gettempdir()
-    now = time.time()
-    for f in os.listdir(temp_dir):
-        if f.startswith("analyze_"):
-            path = os.path.join(temp_dir, f)
-            if os.stat(path).st_mtime < now - 24 * 3600:
-                os.remove(path)
-                logger.info(f"Cleaned up old staged file: {f}")
+    if JOB_RUNNER == "inline":
+        start_job_runner()
+    else:
+        logger.info("JOB_RUNNER=external: jobs are only enqueued here; run them with `python -m app.worker`")
+
+    # Optional: cleanup old staged files and unreferenced dedupe blobs on startup
+    staging.cleanup()
+    chunked_uploads.cleanup()
+    probe_cache.cleanup()
 
 def resolve_device(user_device: str = None):
     import platform
-    import torch
 
     system = platform.system()
     if system == "Darwin":
@@ -333,39 +538,222 @@ def resolve_device(user_device: str = None):
         return "cpu", "cpu"
 
     # Otherwise try cuda if available
-    if torch.cuda.is_available():
+    if cuda_device_count():
         return "cuda", "cuda"
 
     return "cpu", "cpu"
 
-@app.get("/status/{job_id}")
-async def get_status(job_id: str):
-    status_path = os.path.join(OUTPUT_DIR, f"{job_id}.status")
-    if not os.path.exists(status_path):
-        return {"status": "not_found"}
+# ---- Resumable chunked upload: init -> PUT chunks (parallel, any order) -> finalize ----
+
+@app.post("/uploads")
+async def init_upload(
+        filename: str = Form(...),
+        size: int = Form(...),
+        chunk_size: int = Form(None),
+        resume_key: str = Form(None)
+):
+    try:
+        return chunked_uploads.init(filename, size, chunk_size=chunk_size, resume_key=resume_key)
+    except UploadError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
 
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    try:
+        return chunked_uploads.status(upload_id)
+    except UploadError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    data = await request.body()
+    loop = asyncio.get_running_loop()
+    try:
+        index = await loop.run_in_executor(
+            None, chunked_uploads.write_chunk, upload_id, offset, data, request.headers.get("x-chunk-crc32")
+        )
+    except UploadBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    except UploadError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return {"chunk": index}
+
+@app.get("/uploads/{upload_id}/tracks")
+async def probe_upload(upload_id: str):
+    """
+    Track list from a still-uploading file. ffprobe is fed only the contiguous
+    prefix received so far, through a pipe, so it never reads the unwritten
+    rest; MKV/TS headers are usually readable from the first chunks. Files
+    that keep their index at the end (MP4 with moov last) stay `ready: false`
+    until they are finalized.
+    """
     try:
-        with open(status_path, "r") as f:
-            data = json.load(f)
+        prefix_bytes = chunked_uploads.received_prefix(upload_id)
+        size = chunked_uploads.status(upload_id)["size"]
+        partial_path = chunked_uploads.partial_path(upload_id)
+    except UploadError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    if prefix_bytes < min(PROBE_MIN_BYTES, size):
+        return {"ready": False, "received_bytes": prefix_bytes}
+    loop = asyncio.get_running_loop()
+    try:
+        analysis = await loop.run_in_executor(None, lambda: analyze_media(partial_path, prefix_bytes=prefix_bytes))
+    except (RuntimeError, ValueError, FileNotFoundError):
+        return {"ready": False, "received_bytes": prefix_bytes}
+    tracks = track_list(analysis)
+    if not tracks:
+        return {"ready": False, "received_bytes": prefix_bytes}
+    logger.info(f"[upload-{upload_id}] Early probe found {len(tracks)} tracks from {prefix_bytes / (1024 * 1024):.1f}MB")
+    return {"ready": True, "tracks": tracks, "file_id": upload_id}
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, checksum: str = Form(None)):
+    loop = asyncio.get_running_loop()
+    try:
+        session = chunked_uploads.status(upload_id)
+        staged_path, key = await loop.run_in_executor(None, chunked_uploads.finalize, upload_id, checksum)
+    except UploadBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    except UploadError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    # Includes client think time between chunks and any pause before a resume
+    metrics.observe("upload", time.time() - session["created"], protocol="chunked")
+    metrics.count("subtitle_upload_bytes_total", session["size"], protocol="chunked")
+    await loop.run_in_executor(None, staging.dedupe, staged_path, key)
+    analysis = await loop.run_in_executor(None, probe_media, staged_path)
+    return {'tracks': track_list(analysis), 'file_id': upload_id}
+
+@app.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    try:
+        chunked_uploads.abort(upload_id)
+    except UploadBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    return {"aborted": upload_id}
 
-        if "status" in data and data["status"] == "failed":
-            return {"status": "failed", "error": data.get("error")}
+def status_response(job_id, data):
+    if data is None:
+        return {"status": "not_found"}
+
+    if "status" in data and data["status"] == "failed":
+        return {"status": "failed", "error": data.get("error")}
 
-        # If it's the initial processing status
-        if "status" in data and data["status"] == "processing":
-            return {"status": "processing"}
+    if "status" in data and data["status"] == "queued":
+        return {"status": "queued", "queue_position": job_queue.store.queue_position(job_id)}
 
-        # If it's finished (contains output files)
-        # We wrap the results in 'outputs' and set status to 'done' for the frontend
-        outputs = {k: v for k, v in data.items() if k not in ["duration_seconds", "status"]}
+    # Still running: stage, positions and partial outputs
+    if "status" in data and data["status"] == "processing":
         return {
-            "status": "done",
-            "outputs": outputs,
-            "duration_seconds": data.get("duration_seconds")
+            "status": "processing",
+            "stage": data.get("stage"),
+            "partial": data.get("partial", {}),
+            "segments_transcribed": data.get("segments_transcribed"),
+            "segments_translated": data.get("segments_translated"),
+            "transcribed_seconds": data.get("transcribed_seconds"),
+            "audio_seconds": data.get("audio_seconds"),
+            "encode_progress": data.get("encode_progress", {}),
+            "devices": data.get("devices", {}),
+            "metrics": data.get("metrics")
         }
+
+    # If it's finished (contains output files)
+    # We wrap the results in 'outputs' and set status to 'done' for the frontend
+    outputs = {k: v for k, v in data.items() if k not in ["duration_seconds", "status", "timings", "devices", "metrics"]}
+    return {
+        "status": "done",
+        "outputs": outputs,
+        "duration_seconds": data.get("duration_seconds"),
+        "timings": data.get("timings", {}),
+        "devices": data.get("devices", {}),
+        "metrics": data.get("metrics", {})
+    }
+
+@app.get("/status/{job_id}")
+async def get_status(job_id: str):
+    try:
+        return status_response(job_id, load_status(job_id))
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
+@app.get("/events/{job_id}")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events: the status payload of /status, pushed on every change until the job ends."""
+    async def stream():
+        changed = job_states.subscribe(job_id)
+        try:
+            while True:
+                changed.clear()
+                payload = status_response(job_id, load_status(job_id))
+                yield f"data: {json.dumps(payload)}\n\n"
+                if payload["status"] in TERMINAL_STATUSES + ("not_found",):
+                    return
+                # A job run by another process (python -m app.worker) only changes in its status file
+                poll = 15 if job_queue.is_running_here(job_id) else STATUS_POLL_SECONDS
+                idle = 0.0
+                while True:
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout=poll)
+                        break
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            return
+                        idle += poll
+                        if payload["status"] == "queued" and idle >= 15:
+                            break  # queue position moves without this job's state changing
+                        if poll < 15 and status_response(job_id, load_status(job_id)) != payload:
+                            break
+                        if idle >= 15:
+                            idle = 0.0
+                            yield ": keep-alive\n\n"
+                # Coalesce bursts of progress into one message
+                await asyncio.sleep(0.25)
+        finally:
+            job_states.unsubscribe(job_id, changed)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/health")
+async def health():
+    """Liveness: uploads, /analyze and /status work without the ML stack."""
+    return {"status": "ok", "ml_stack": ml_stack.state, "job_runner": JOB_RUNNER}
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness for transcription/translation: 200 once the ML stack is imported and the warm-up profile has run,
+    else 503. With external workers: 200 while at least one worker is heartbeating.
+    """
+    if JOB_RUNNER != "inline":
+        workers = job_queue.store.workers(max_age=job_queue.worker_timeout)
+        return JSONResponse({"job_runner": JOB_RUNNER, "workers": workers}, status_code=200 if workers else 503)
+    status = ml_stack.status()
+    status["prewarm"] = prewarmer.status()
+    warm = status["state"] == READY and prewarmer.settled()
+    return JSONResponse(status, status_code=200 if warm else 503)
+
+@app.get("/queue")
+async def get_queue():
+    snapshot = job_queue.snapshot()
+    snapshot["devices"] = device_pool.snapshot()
+    return snapshot
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text format: stage-time histograms, upload bytes, queue depth, model cache and memory."""
+    extra = {f'subtitle_jobs{{state="{state}"}}': n for state, n in job_queue.store.counts().items()}
+    extra["subtitle_workers"] = len(job_queue.store.workers(max_age=job_queue.worker_timeout))
+    cache = registry.stats()
+    for device_class, used_mb in cache["used_mb"].items():
+        extra[f'model_cache_used_bytes{{device_class="{device_class}"}}'] = int(used_mb * 1024 * 1024)
+    extra["model_cache_hits"] = cache["hits"]
+    extra["model_cache_misses"] = cache["misses"]
+    for device in device_pool.snapshot():
+        extra[f'device_memory_bytes{{device="{device["device"]}"}}'] = device["memory_mb"] * 1024 * 1024
+        extra[f'device_reserved_bytes{{device="{device["device"]}"}}'] = device["reserved_mb"] * 1024 * 1024
+        extra[f'device_stages{{device="{device["device"]}"}}'] = len(device["stages"])
+    return PlainTextResponse(metrics.render_prometheus(extra), media_type="text/plain; version=0.0.4")
+
 @app.get("/download/{filename}")
 async def download_file(filename: str):
     file_path = os.path.join(OUTPUT_DIR, filename)
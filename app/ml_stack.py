@@ -0,0 +1,159 @@
+# app/ml_stack.py
+"""
+torch, whisperx and transformers take many seconds to import, and nothing the
+API serves without a job (uploads, /analyze, /status) needs them. So the API
+does not import them at startup. ml_stack.ensure_loaded() imports them once
+(applying the torch.load compatibility patch first); the background warm-up
+started with the app, or else the first job, pays that cost.
+"""
+import os
+import sys
+import time
+import ctypes
+import logging
+import functools
+import threading
+
+logger = logging.getLogger(__name__)
+
+NOT_LOADED, LOADING, READY, FAILED = "not_loaded", "loading", "ready", "failed"
+
+
+def _patch_torch_load(torch):
+    import typing
+    # Patch torch.load to handle PyTorch 2.6 weights_only default change
+    original_load = torch.load
+
+    def patched_load(*args, **kwargs):
+        # Force weights_only=False for all loads in this process
+        kwargs['weights_only'] = False
+        return original_load(*args, **kwargs)
+    torch.load = patched_load
+
+    from omegaconf.listconfig import ListConfig
+    from omegaconf.dictconfig import DictConfig
+    from omegaconf.base import ContainerMetadata, Node
+    torch.serialization.add_safe_globals([ListConfig, DictConfig, ContainerMetadata, Node, typing.Any])
+
+
+def _import_stack():
+    import torch
+    _patch_torch_load(torch)
+    import app.pipeline.transcriber  # noqa: F401  (whisperx)
+    import app.pipeline.translator  # noqa: F401  (transformers)
+
+
+class MLStack:
+    def __init__(self):
+        self.state = NOT_LOADED
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def ensure_loaded(self):
+        """Import the ML libraries if not done yet; blocks while another thread is importing them."""
+        if self.state == READY:
+            return
+        with self._lock:
+            if self.state == READY:
+                return
+            self.state, self.error = LOADING, None
+            started = time.perf_counter()
+            logger.info("Importing ML stack (torch, whisperx, transformers)...")
+            try:
+                _import_stack()
+            except Exception as e:
+                self.state, self.error = FAILED, str(e)
+                logger.error(f"ML stack import failed: {e}", exc_info=True)
+                raise
+            self.load_seconds = round(time.perf_counter() - started, 2)
+            self.state = READY
+            logger.info(f"ML stack ready in {self.load_seconds}s")
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"ML stack ready callback failed: {e}")
+
+    def on_ready(self, callback):
+        """Run `callback()` once the stack is loaded (at once if it already is)."""
+        with self._lock:
+            if self.state != READY:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def warm_up_in_background(self, then=None):
+        """Import the stack on a background thread, then call `then()` (e.g. model prewarming) on that thread."""
+        def run():
+            try:
+                self.ensure_loaded()
+            except Exception:
+                return  # logged; the first job retries
+            if then is not None:
+                then()
+        threading.Thread(target=run, name="ml-warmup", daemon=True).start()
+
+    def status(self):
+        return {"state": self.state, "error": self.error, "load_seconds": self.load_seconds}
+
+
+def cuda_device_count():
+    """
+    CUDA devices visible to this process. Asks torch when it is already imported,
+    otherwise the driver library directly, so request handlers never import torch.
+    """
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        try:
+            return torch.cuda.device_count() if torch.cuda.is_available() else 0
+        except Exception:
+            return 0
+    return _driver_device_count()
+
+
+def cuda_total_memory_mb(index):
+    """Total memory of CUDA device `index` in MB (0 if unknown), without importing torch."""
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        try:
+            return int(torch.cuda.get_device_properties(index).total_memory / (1024 * 1024))
+        except Exception:
+            return 0
+    cuda = _libcuda()
+    if cuda is None:
+        return 0
+    device, total = ctypes.c_int(0), ctypes.c_size_t(0)
+    if cuda.cuDeviceGet(ctypes.byref(device), index) != 0:
+        return 0
+    if cuda.cuDeviceTotalMem_v2(ctypes.byref(total), device) != 0:
+        return 0
+    return int(total.value / (1024 * 1024))
+
+
+@functools.lru_cache(maxsize=1)
+def _libcuda():
+    """The CUDA driver library, initialised; None without a driver or with CUDA hidden."""
+    if os.getenv("CUDA_VISIBLE_DEVICES", None) in ("", "-1"):
+        return None
+    for name in ("libcuda.so.1", "libcuda.so", "nvcuda.dll"):
+        try:
+            cuda = ctypes.CDLL(name)
+        except OSError:
+            continue
+        return cuda if cuda.cuInit(0) == 0 else None
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _driver_device_count():
+    cuda = _libcuda()
+    count = ctypes.c_int(0)
+    if cuda is not None and cuda.cuDeviceGetCount(ctypes.byref(count)) == 0:
+        return count.value
+    return 0
+
+
+ml_stack = MLStack()
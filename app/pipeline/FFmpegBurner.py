@@ -3,57 +3,124 @@ import os
 
 import subprocess
 import json
+import threading
 
+from . import processes
 
 
 
 
 
-def burn(video_path, srt_path, output_path, device=None, mask_percent=0.25,masked=False):
-    import platform
-    import subprocess
 
+def _subtitle_force_style(video_path, mask_percent=0.25, masked=False):
     # Font settings
     font_name = "Arial"
     alignment = 2  # bottom-center
-    video_height = get_video_height(video_path)
     if masked:
+        video_height = get_video_height(video_path)
         margin_v = int(video_height * mask_percent / 2)
-        force_style = f"FontName={font_name},Alignment={alignment},MarginV={margin_v}"
-    else:
-        margin_v = 40
-        force_style = f"FontName={font_name}"
+        return f"FontName={font_name},Alignment={alignment},MarginV={margin_v}"
+    return f"FontName={font_name}"
 
+
+def default_burn_device(device):
+    import platform
     if not device:
         system = platform.system()
         if system == "Darwin":
             device = "videotoolbox"
         else:
             device = "cuda"  # fallback to CPU if cuda not available
+    return device
+
 
-    vf_arg = f"subtitles='{srt_path}':force_style='{force_style}'"
+def _cuda_index(device):
+    """GPU index of "cuda:N"; None for plain "cuda" (ffmpeg's default GPU)."""
+    _, _, index = str(device).partition(":")
+    return index or None
 
+
+def _input_args(video_path, device):
+    if device and device.startswith("cuda"):
+        index = _cuda_index(device)
+        return ["-hwaccel", "cuda"] + (["-hwaccel_device", index] if index else []) + ["-i", video_path]
+    return ["-i", video_path]
+
+
+def _encoder_args(device):
     if device == "videotoolbox":
-        cmd = [
-            "ffmpeg", "-y", "-i", video_path,
-            "-vf", vf_arg,
-            "-c:v", "h264_videotoolbox", "-c:a", "copy", output_path
-        ]
-    elif device == "cuda":
-        cmd = [
-            "ffmpeg", "-y", "-hwaccel", "cuda", "-i", video_path,
-            "-vf", vf_arg,
-            "-c:v", "h264_nvenc", "-preset", "p4", "-cq", "18",
-            "-c:a", "copy", output_path
-        ]
-    else:
-        cmd = [
-            "ffmpeg", "-y", "-i", video_path,
-            "-vf", vf_arg,
-            "-c:v", "libx264", "-preset", "fast", "-crf", "18",
-            "-c:a", "copy", output_path
-        ]
-    subprocess.run(cmd, check=True)
+        return ["-c:v", "h264_videotoolbox"]
+    elif device and device.startswith("cuda"):
+        index = _cuda_index(device)
+        return ["-c:v", "h264_nvenc"] + (["-gpu", index] if index else []) + ["-preset", "p4", "-cq", "18"]
+    return ["-c:v", "libx264", "-preset", "fast", "-crf", "18"]
+
+
+def probe_duration(path):
+    """Container duration in seconds, 0.0 if ffprobe cannot tell."""
+    proc = processes.run([
+        "ffprobe", "-v", "quiet", "-show_entries", "format=duration", "-of", "csv=p=0", path
+    ], capture_output=True, text=True)
+    try:
+        return float(proc.stdout.strip())
+    except ValueError:
+        return 0.0
+
+
+def run_ffmpeg(cmd, progress_callback=None, duration_source=None):
+    """
+    processes.run(cmd, check=True), optionally reporting progress: with a callback,
+    ffmpeg writes `-progress` key=value lines to stdout and progress_callback(fraction)
+    is called with out_time / duration of `duration_source`.
+    """
+    if progress_callback is None:
+        processes.run(cmd, check=True)
+        return
+    duration = probe_duration(duration_source) if duration_source else 0.0
+    cmd = cmd[:1] + ["-progress", "pipe:1", "-nostats"] + cmd[1:]
+    with processes.popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            # out_time_ms is in microseconds as well (long-standing ffmpeg quirk)
+            if key in ("out_time_us", "out_time_ms") and value.isdigit() and duration > 0:
+                progress_callback(min(1.0, int(value) / 1e6 / duration))
+            elif key == "progress" and value == "end":
+                progress_callback(1.0)
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def burn(video_path, srt_path, output_path, device=None, mask_percent=0.25,masked=False, progress_callback=None):
+    burn_many(video_path, [(srt_path, output_path)], device=device, mask_percent=mask_percent, masked=masked,
+              progress_callback=progress_callback)
+
+
+def burn_many(video_path, jobs, device=None, mask_percent=0.25, masked=False, progress_callback=None):
+    """
+    Burn several subtitle files into separate outputs with a single decode.
+    jobs: list of tuples (srt_path, output_path)
+
+    The decoded video is fanned out with a `split` filter; each branch gets its own
+    subtitles filter and encoder, so N outputs cost one decode instead of N.
+    Every output carries the first video stream and all audio tracks, copied,
+    whether it was burned alone or in a group.
+    """
+    if not jobs:
+        return []
+    force_style = _subtitle_force_style(video_path, mask_percent, masked)
+    device = default_burn_device(device)
+
+    n = len(jobs)
+    graph = [f"[0:v]split={n}" + "".join(f"[v{i}]" for i in range(n))]
+    for i, (srt_path, _) in enumerate(jobs):
+        graph.append(f"[v{i}]subtitles='{srt_path}':force_style='{force_style}'[o{i}]")
+
+    cmd = ["ffmpeg", "-y"] + _input_args(video_path, device) + ["-filter_complex", ";".join(graph)]
+    for i, (_, output_path) in enumerate(jobs):
+        cmd += ["-map", f"[o{i}]", "-map", "0:a?"] + _encoder_args(device) + ["-c:a", "copy", output_path]
+    run_ffmpeg(cmd, progress_callback, video_path)
+    return [output_path for _, output_path in jobs]
 
 
 def mux_srt_into_video(video_in, srt_path, video_out):
@@ -86,15 +153,14 @@ def mux_srt_into_video(video_in, srt_path, video_out):
             "ffmpeg", "-y", "-i", video_in, "-i", srt_path,
             "-c", "copy", "-c:s", "srt", "-map", "0", "-map", "1", video_out
         ]
-    subprocess.run(cmd, check=True)
+    processes.run(cmd, check=True)
     return video_out
 
 
-def mux_multiple_srts_into_mkv(video_in, srt_paths, video_out):
+def mux_multiple_srts_into_mkv(video_in, srt_paths, video_out, progress_callback=None):
     """
     srt_paths: list of tuples (lang_code, srt_path)
     """
-    import subprocess
 
     cmd = ["ffmpeg", "-y", "-i", video_in]
     # Add all srt files as inputs
@@ -114,19 +180,75 @@ def mux_multiple_srts_into_mkv(video_in, srt_paths, video_out):
         cmd += [f"-metadata:s:s:{idx}", f"language={lang}"]
     cmd += [video_out]
 
-    subprocess.run(cmd, check=True)
+    run_ffmpeg(cmd, progress_callback, video_in)
     return video_out
 
 
-def analyze_media(file_path):
+# Text subtitle codecs ffmpeg can turn into SRT; subrip itself is stream-copied
+TEXT_SUBTITLE_CODECS = ("subrip", "srt", "ass", "ssa", "mov_text", "webvtt", "text")
+
+
+def extract_subtitle_stream(media_path, stream, srt_path):
+    """
+    Write one subtitle stream (an ffprobe stream dict) to `srt_path`. Only that
+    stream is mapped, so the demuxer discards video and audio packets instead of
+    decoding them, and SubRip tracks are stream-copied without re-encoding.
+    """
+    codec = stream.get("codec_name")
+    if codec not in TEXT_SUBTITLE_CODECS:
+        raise ValueError(f"Subtitle track {stream['index']} is {codec}, not a text format that converts to SRT")
+    cmd = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", media_path,
+        "-map", f"0:{stream['index']}", "-vn", "-an", "-dn",
+        "-c:s", "copy" if codec in ("subrip", "srt") else "srt", "-f", "srt", srt_path,
+    ]
+    processes.run(cmd, check=True)
+    return srt_path
+
+
+def analyze_media(file_path, prefix_bytes=None):
+    """
+    ffprobe as JSON. With `prefix_bytes` (partial files), ffprobe reads only the
+    first prefix_bytes of the file through a pipe, so it cannot seek into the
+    part that has not been written yet.
+    """
     cmd = [
         'ffprobe', '-v', 'quiet', '-print_format', 'json',
-        '-show_format', '-show_streams', '-show_chapters', file_path
+        '-show_format', '-show_streams', '-show_chapters'
     ]
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if prefix_bytes is None:
+        proc = processes.run(cmd + [file_path], capture_output=True, text=True)
+        stdout = proc.stdout
+    else:
+        with processes.popen(cmd + ['pipe:0'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL) as proc:
+
+            def feed():
+                try:
+                    with open(file_path, 'rb') as f:
+                        remaining = prefix_bytes
+                        while remaining > 0:
+                            block = f.read(min(remaining, 1024 * 1024))
+                            if not block:
+                                break
+                            proc.stdin.write(block)
+                            remaining -= len(block)
+                except (BrokenPipeError, OSError):
+                    pass  # ffprobe has what it needs and closed its input
+                finally:
+                    try:
+                        proc.stdin.close()
+                    except OSError:
+                        pass
+
+            feeder = threading.Thread(target=feed, daemon=True)
+            feeder.start()
+            stdout = proc.stdout.read().decode('utf-8', errors='replace')
+            proc.wait()
+            feeder.join()
     if proc.returncode != 0:
         raise RuntimeError("ffprobe failed")
-    return json.loads(proc.stdout)
+    return json.loads(stdout)
 
 
 def get_video_height(video_path):
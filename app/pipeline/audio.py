@@ -0,0 +1,88 @@
+# app/pipeline/audio.py
+"""
+One decode of the soundtrack per job: the chosen stream is demuxed and
+resampled straight to 16kHz mono float32 (what Whisper and the alignment
+models consume) in a raw file, which every stage then memory-maps.
+"""
+import os
+import logging
+
+import numpy as np
+
+from . import processes
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+def extract_audio(media_path, out_path, stream_index=None):
+    """Decode one audio stream (absolute ffprobe index, or ffmpeg's default) to raw 16kHz mono f32le."""
+    cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", media_path]
+    if stream_index is not None:
+        cmd += ["-map", f"0:{stream_index}"]
+    cmd += ["-vn", "-sn", "-dn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-c:a", "pcm_f32le", "-f", "f32le", out_path]
+    processes.run(cmd, check=True)
+    return out_path
+
+
+def load_audio(raw_path):
+    """Memory-map a raw f32le file. Copy-on-write, so consumers that want a writable array don't copy it all."""
+    if os.path.getsize(raw_path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(raw_path, dtype=np.float32, mode="c")
+
+
+def prepare_audio(media_path, work_dir, stream_index=None):
+    """Extract once into `work_dir` and return the memory-mapped samples."""
+    raw_path = os.path.join(work_dir, "audio_16k.f32")
+    logger.info(f"Extracting audio (stream {stream_index if stream_index is not None else 'default'}) to {raw_path}")
+    extract_audio(media_path, raw_path, stream_index)
+    audio = load_audio(raw_path)
+    logger.info(f"Audio ready: {duration_seconds(audio):.0f}s")
+    return audio
+
+
+def duration_seconds(audio):
+    return len(audio) / float(SAMPLE_RATE)
+
+
+def detect_silences(audio, noise_db=-35, min_silence=0.5, frame_seconds=0.01, block_frames=60000):
+    """
+    [(start, end), ...] in seconds of stretches whose 10ms RMS stays under `noise_db`
+    for at least `min_silence`. Reads the array block by block, so a memory-mapped
+    multi-hour track is never loaded whole.
+    """
+    frame = int(SAMPLE_RATE * frame_seconds)
+    n_frames = len(audio) // frame
+    if not n_frames:
+        return []
+    threshold = 10 ** (noise_db / 20)
+    silent = np.empty(n_frames, dtype=bool)
+    for first in range(0, n_frames, block_frames):
+        last = min(n_frames, first + block_frames)
+        block = np.asarray(audio[first * frame:last * frame], dtype=np.float32).reshape(last - first, frame)
+        silent[first:last] = np.sqrt(np.mean(block * block, axis=1)) < threshold
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    min_frames = int(round(min_silence / frame_seconds))
+    return [(float(s * frame_seconds), float(e * frame_seconds)) for s, e in zip(starts, ends) if e - s >= min_frames]
+
+
+class AudioSlice:
+    """
+    Samples [start, end) of a raw f32le file. Small and picklable, so worker
+    processes receive the slice bounds and map the shared file themselves
+    instead of getting audio copied through a pipe.
+    """
+
+    def __init__(self, raw_path, start=0, end=None):
+        self.raw_path = raw_path
+        self.start = start
+        self.end = end
+
+    def load(self):
+        return load_audio(self.raw_path)[self.start:self.end]
+
+    def __repr__(self):
+        return f"AudioSlice({os.path.basename(self.raw_path)}, {self.start}, {self.end})"
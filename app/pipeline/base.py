@@ -3,11 +3,115 @@
 from abc import ABC, abstractmethod
 
 class Transcriber(ABC):
+    device = "cpu"
+
+    def use_device(self, device):
+        """Run on `device` ("cpu", "cuda:N") from now on; models load there on first use."""
+        self.device = device
+
+    def memory_mb(self):
+        """Rough peak memory of a transcription, for device placement."""
+        return 0
+
     @abstractmethod
     def transcribe(self, audio_path, language=None):
         pass
 
+    def transcribe_stream(self, audio_path, language=None, align_output=True):
+        """
+        Yield (segments, language) as transcription progresses, segments in time order.
+        This fallback yields everything at once; chunking transcribers yield per chunk.
+        """
+        result, language = self.transcribe(audio_path, language=language, align_output=align_output)
+        yield result.get("segments", []), language
+
 class Translator(ABC):
+    device = "cpu"
+    MEMORY_MB = 0  # rough footprint of the loaded model(s), for device placement
+
+    def use_device(self, device):
+        """Run on `device` ("cpu", "cuda:N") from now on; models load there on first use."""
+        self.device = device
+
     @abstractmethod
     def translate(self, text,src_lang, target_lang):
         pass
+
+    def translate_batch(self, texts, src_lang, target_lang, batch_size=16):
+        """
+        Translate a list of texts, preserving order. Subclasses backed by a model
+        override this with real batched inference; this fallback loops over translate().
+        """
+        return [self.translate(text, src_lang, target_lang) if text.strip() else text for text in texts]
+
+    def translate_multi(self, texts, src_lang, target_langs, batch_size=16):
+        """
+        Translate `texts` into every language in `target_langs` in one pass.
+        Returns {lang: [translations]}. Models with a shared multilingual encoder
+        override this to encode each source batch once for all targets.
+        """
+        return {lang: self.translate_batch(texts, src_lang, lang, batch_size=batch_size)
+                for lang in target_langs}
+
+    def warm(self, src_lang, target_lang):
+        """Load whatever translating this pair needs, without translating anything."""
+
+    def translate_texts(self, texts, src_lang, target_langs, batch_size=16):
+        """translate_multi with per-language and per-text fallbacks; failed lines keep the source text."""
+        try:
+            return self.translate_multi(texts, src_lang, target_langs, batch_size=batch_size)
+        except Exception as e:
+            print(f"Multi-target translation error, falling back to per-language: {e}", flush=True)
+        results = {}
+        for lang in target_langs:
+            try:
+                results[lang] = self.translate_batch(texts, src_lang, lang, batch_size=batch_size)
+                continue
+            except Exception as e:
+                print(f"Batch translation error ({lang}), falling back to per-line: {e}", flush=True)
+            translated = []
+            for i, text in enumerate(texts, 1):
+                try:
+                    translated.append(self.translate(text, src_lang, lang) if text.strip() else text)
+                except Exception as e:
+                    print(f"Translation error ({lang}, line {i}): {e}", flush=True)
+                    translated.append(text)
+            results[lang] = translated
+        return results
+
+    def translate_srt(self, input_srt, output_srt, src_lang, tgt_lang, batch_size=16):
+        self.translate_srt_multi(input_srt, {tgt_lang: output_srt}, src_lang, batch_size=batch_size)
+
+    def translate_srt_multi(self, input_srt, output_srts, src_lang, batch_size=16):
+        """output_srts: {lang: output_path}. The input SRT is parsed once for all targets."""
+        import srt
+        with open(input_srt, "r", encoding="utf-8") as f:
+            subs = list(srt.parse(f.read()))
+        contents = [sub.content for sub in subs]
+        print(f"Translating {len(subs)} subtitles into {list(output_srts)} in batches of {batch_size}...", flush=True)
+        translations = self.translate_texts(contents, src_lang, list(output_srts), batch_size=batch_size)
+        for lang, output_srt in output_srts.items():
+            translated_subs = [
+                srt.Subtitle(index=sub.index, start=sub.start, end=sub.end, content=text)
+                for sub, text in zip(subs, translations[lang])
+            ]
+            with open(output_srt, "w", encoding="utf-8") as f:
+                f.write(srt.compose(translated_subs))
+
+
+def length_sorted_batches(texts, batch_size=16, max_batch_chars=4096):
+    """
+    Group indices of non-empty `texts` into batches of similar length so padding
+    is minimal. A batch closes at `batch_size` items or once it would exceed
+    `max_batch_chars` (long lines get smaller batches, short lines bigger ones).
+    """
+    order = sorted((i for i, t in enumerate(texts) if t and t.strip()), key=lambda i: len(texts[i]))
+    batch, longest = [], 0
+    for i in order:
+        longest = max(longest, len(texts[i]))
+        if batch and (len(batch) >= batch_size or longest * (len(batch) + 1) > max_batch_chars):
+            yield batch
+            batch, longest = [], len(texts[i])
+        batch.append(i)
+    if batch:
+        yield batch
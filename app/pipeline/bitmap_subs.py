@@ -0,0 +1,227 @@
+# app/pipeline/bitmap_subs.py
+"""
+OCR for bitmap subtitle tracks (Blu-ray PGS, DVD VobSub, DVB) into SRT.
+
+ffmpeg renders the subtitle stream on its own (sub2video), which yields one
+frame each time the displayed picture changes: the subtitle image when a cue
+appears, a blank frame when it is cleared. Frames are read from a pipe with
+their timestamps (showinfo), cropped to the text, and each distinct bitmap is
+OCR'd once on a process pool; repeated bitmaps (the same line re-sent) reuse
+the first result. The pool is shared by every OCR job in the process, and each
+job keeps at most its own share of workers busy.
+"""
+import os
+import re
+import hashlib
+import logging
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import srt
+
+from . import processes
+
+logger = logging.getLogger(__name__)
+
+BITMAP_SUBTITLE_CODECS = ("hdmv_pgs_subtitle", "dvd_subtitle", "dvb_subtitle", "xsub")
+MAX_OCR_WIDTH = 1280
+# A cue with no clear event (some VobSub tracks) ends at the next cue or after this long
+MAX_CUE_SECONDS = 8.0
+
+# ffprobe reports ISO 639-2/B codes; tesseract traineddata uses 639-2/T
+TESSERACT_LANGS = {
+    "fre": "fra", "ger": "deu", "dut": "nld", "chi": "chi_sim", "cze": "ces", "gre": "ell",
+    "per": "fas", "rum": "ron", "slo": "slk", "alb": "sqi", "arm": "hye", "baq": "eus",
+    "geo": "kat", "ice": "isl", "mac": "mkd", "may": "msa", "bur": "mya", "wel": "cym",
+}
+
+_PTS_TIME = re.compile(r"pts_time:\s*(-?[\d.]+)")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def ocr_pool():
+    """The process pool shared by OCR jobs: OCR_WORKERS processes (default one per core), started once."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            raw = os.getenv("OCR_WORKERS")
+            workers = int(raw) if raw and raw.strip() else max(1, os.cpu_count() or 1)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _drop_pool(pool):
+    """Forget a pool whose worker died, so the next job starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def is_bitmap_subtitle(stream):
+    return stream.get("codec_name") in BITMAP_SUBTITLE_CODECS
+
+
+def tesseract_language(code):
+    """Tesseract language for a track's language tag, falling back to English when it is unknown or not installed."""
+    if not code or code == "und":
+        return "eng"
+    code = TESSERACT_LANGS.get(code.lower(), code.lower())
+    try:
+        import pytesseract
+        installed = set(pytesseract.get_languages(config=""))
+    except Exception:
+        return code
+    return code if code in installed else "eng"
+
+
+def crop_to_text(gray, threshold=128, margin=8):
+    """Crop a black-on-white frame to its dark pixels (plus margin); None when the frame is blank."""
+    ink = gray < threshold
+    rows, cols = np.flatnonzero(ink.any(axis=1)), np.flatnonzero(ink.any(axis=0))
+    if not len(rows):
+        return None
+    top, bottom = max(0, rows[0] - margin), min(gray.shape[0], rows[-1] + 1 + margin)
+    left, right = max(0, cols[0] - margin), min(gray.shape[1], cols[-1] + 1 + margin)
+    return np.ascontiguousarray(gray[top:bottom, left:right])
+
+
+def ocr_bitmap(image, lang="eng"):
+    """Runs in a pool worker. Subtitle lines of the image, blank lines dropped."""
+    import pytesseract
+    from PIL import Image
+    text = pytesseract.image_to_string(Image.fromarray(image), lang=lang, config="--psm 6")
+    lines = (" ".join(line.split()) for line in text.replace("\x0c", "").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _canvas(stream, streams):
+    if stream.get("width") and stream.get("height"):
+        return int(stream["width"]), int(stream["height"])
+    for other in streams or []:
+        if other.get("codec_type") == "video" and other.get("width") and other.get("height"):
+            return int(other["width"]), int(other["height"])
+    return 1920, 1080
+
+
+def _read_exact(pipe, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = pipe.read(size - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return bytes(buf)
+
+
+def render_events(media_path, stream, times, streams=None):
+    """
+    Yield a picture for every change of the displayed subtitle: black text on
+    white cropped to the text, or None when the screen was cleared. The change
+    timestamps (seconds) are appended to `times` and complete once the generator is exhausted.
+    """
+    width, height = _canvas(stream, streams)
+    out_w = min(width, MAX_OCR_WIDTH) // 2 * 2
+    out_h = max(2, int(round(height * out_w / width / 2)) * 2)
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats", "-loglevel", "info",
+        "-canvas_size", f"{width}x{height}", "-i", media_path,
+        "-filter_complex", f"[0:{stream['index']}]scale={out_w}:{out_h},format=gray,negate,showinfo[ocr]",
+        "-map", "[ocr]", "-vsync", "passthrough", "-f", "rawvideo", "-pix_fmt", "gray", "-",
+    ]
+    tail = []
+    with processes.popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+
+        def read_stderr():
+            for line in iter(proc.stderr.readline, b""):
+                text = line.decode(errors="ignore")
+                if "showinfo" in text:
+                    match = _PTS_TIME.search(text)
+                    if match:
+                        times.append(float(match.group(1)))
+                else:
+                    tail[:] = (tail + [text])[-20:]
+
+        reader = threading.Thread(target=read_stderr, daemon=True)
+        reader.start()
+        frame_size = out_w * out_h
+        data = b""
+        try:
+            while True:
+                data = _read_exact(proc.stdout, frame_size)
+                if len(data) < frame_size:
+                    break
+                yield crop_to_text(np.frombuffer(data, dtype=np.uint8).reshape(out_h, out_w))
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None and len(data) == frame_size:
+                proc.kill()  # consumer stopped early
+            proc.wait()
+            reader.join()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not render subtitle track {stream['index']}: {''.join(tail)[-500:]}")
+
+
+def build_cues(events, texts, max_cue_seconds=MAX_CUE_SECONDS):
+    """events: [(pts, key_or_None), ...] in order; texts: {key: text}. A cue runs until the picture changes."""
+    subs = []
+    i = 0
+    while i < len(events):
+        start, key = events[i]
+        j = i + 1
+        while j < len(events) and events[j][1] == key:
+            j += 1  # the same bitmap re-sent
+        if key is not None and texts.get(key):
+            end = events[j][0] if j < len(events) else start + max_cue_seconds
+            end = min(end, start + max_cue_seconds)
+            if end > start:
+                subs.append(srt.Subtitle(
+                    index=len(subs) + 1, start=srt.timedelta(seconds=start),
+                    end=srt.timedelta(seconds=end), content=texts[key],
+                ))
+        i = j
+    return subs
+
+
+def ocr_subtitle_stream(media_path, stream, srt_path, streams=None, language=None, workers=None):
+    """
+    OCR a bitmap subtitle stream (ffprobe stream dict) into `srt_path`.
+    `streams` (the rest of the probe) supplies the canvas size when the stream has none.
+    `workers` caps how many bitmaps this job has on the shared pool at once (the job's CPU share).
+    Returns the number of cues written.
+    """
+    lang = tesseract_language(language or stream.get("tags", {}).get("language"))
+    in_flight = threading.BoundedSemaphore(max(1, workers or os.cpu_count() or 1))
+    times, keys, futures = [], [], {}
+    pool = ocr_pool()
+    try:
+        # OCR of early cues overlaps with ffmpeg still rendering later ones
+        for image in render_events(media_path, stream, times, streams):
+            key = None
+            if image is not None:
+                key = hashlib.sha1(str(image.shape).encode() + image.tobytes()).hexdigest()
+                if key not in futures:
+                    in_flight.acquire()
+                    futures[key] = pool.submit(ocr_bitmap, image, lang)
+                    futures[key].add_done_callback(lambda _: in_flight.release())
+            keys.append(key)
+        texts = {key: future.result() for key, future in futures.items()}
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        raise
+    if len(times) != len(keys):
+        logger.warning(f"Bitmap subtitles: {len(keys)} pictures but {len(times)} timestamps; pairing the first ones")
+    events = list(zip(times, keys))
+    shown = sum(1 for key in keys if key is not None)
+    logger.info(f"Bitmap subtitles: {shown} pictures, {len(futures)} distinct bitmaps OCR'd ({lang})")
+    subs = build_cues(events, texts)
+    with open(srt_path, "w", encoding="utf-8") as f:
+        f.write(srt.compose(subs))
+    return len(subs)
@@ -0,0 +1,103 @@
+# app/pipeline/burned_subs.py
+import os
+import re
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import processes
+
+logger = logging.getLogger(__name__)
+
+MAX_OCR_WIDTH = 1280  # wide enough for tesseract to read subtitle-sized glyphs
+
+
+def probe_video(video_path):
+    """(width, height, duration_seconds) of the first video stream."""
+    proc = processes.run([
+        "ffprobe", "-v", "quiet", "-print_format", "json", "-select_streams", "v:0",
+        "-show_entries", "stream=width,height:format=duration", video_path
+    ], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError("ffprobe failed")
+    info = json.loads(proc.stdout)
+    streams = info.get("streams") or [{}]
+    width, height = streams[0].get("width", 0), streams[0].get("height", 0)
+    duration = float(info.get("format", {}).get("duration") or 0)
+    return width, height, duration
+
+
+def grab_bottom_keyframes(video_path, count=10, bottom_fraction=0.2):
+    """
+    Decode only keyframes (-skip_frame nokey) in a single ffmpeg pass and return
+    up to `count` grayscale crops of the bottom of the picture, spread evenly over
+    the video. No seeking, so long-GOP H.264/HEVC stays cheap.
+    """
+    width, height, duration = probe_video(video_path)
+    if not width or not height:
+        return []
+    out_w = min(width, MAX_OCR_WIDTH)
+    out_h = max(2, int(round(height * bottom_fraction * out_w / width / 2)) * 2)
+    interval = duration / count if duration > 0 else 0
+    select = f"select='isnan(prev_selected_t)+gte(t-prev_selected_t\\,{interval:.3f})'," if interval else ""
+    vf = f"{select}crop=iw:ih*{bottom_fraction}:0:ih*{1 - bottom_fraction},scale={out_w}:{out_h},format=gray"
+    proc = processes.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-skip_frame", "nokey", "-i", video_path,
+        "-an", "-sn", "-vf", vf, "-vsync", "vfr", "-frames:v", str(count),
+        "-f", "rawvideo", "-pix_fmt", "gray", "-"
+    ], capture_output=True)
+    if proc.returncode != 0:
+        logger.warning(f"Keyframe extraction failed: {proc.stderr.decode(errors='ignore')[-500:]}")
+        return []
+    frame_size = out_w * out_h
+    n = len(proc.stdout) // frame_size
+    data = np.frombuffer(proc.stdout[:n * frame_size], dtype=np.uint8)
+    return list(data.reshape(n, out_h, out_w))
+
+
+def looks_like_text(gray, edge_threshold=40, min_band_density=0.06, band_rows=8):
+    """
+    Cheap pre-filter: subtitles produce a horizontal band dense in strong
+    vertical edges (glyph strokes against the background). Returns True when
+    some `band_rows`-tall band has at least `min_band_density` strong edges.
+    """
+    if gray.shape[0] < band_rows or gray.shape[1] < 2:
+        return False
+    dx = np.abs(np.diff(gray.astype(np.int16), axis=1)) > edge_threshold
+    row_density = dx.mean(axis=1)
+    band = np.convolve(row_density, np.ones(band_rows) / band_rows, mode="valid")
+    return bool(band.max() >= min_band_density)
+
+
+def ocr_text(gray):
+    import pytesseract
+    from PIL import Image
+    return pytesseract.image_to_string(Image.fromarray(gray)).strip()
+
+
+def is_subtitle_like(text, min_line_length=5):
+    # Filter out very short, single words/numbers, or non-subtitle noise
+    return bool(
+        text
+        and len(text) >= min_line_length
+        and re.search(r'\s', text)  # must contain a space (likely a sentence)
+        and len(text.split()) > 1  # more than one word
+        and len(text) < 100  # ignore unlikely long texts
+    )
+
+
+def count_frames_with_subtitles(video_path, frames_to_check=10, min_line_length=5, workers=None):
+    """(frames_with_text, frames_checked). Only frames passing looks_like_text are OCR'd, in parallel."""
+    frames = grab_bottom_keyframes(video_path, count=frames_to_check)
+    candidates = [f for f in frames if looks_like_text(f)]
+    logger.info(f"Burned-in subtitle check: {len(candidates)} of {len(frames)} keyframes passed the edge pre-filter")
+    if not candidates:
+        return 0, len(frames)
+    workers = workers or min(len(candidates), os.cpu_count() or 1)
+    # tesseract runs as a subprocess per call, so threads give real parallelism
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        texts = list(pool.map(ocr_text, candidates))
+    found = sum(1 for text in texts if is_subtitle_like(text, min_line_length))
+    return found, len(frames)
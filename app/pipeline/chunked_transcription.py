@@ -0,0 +1,304 @@
+# app/pipeline/chunked_transcription.py
+"""
+Split long audio at silences and transcribe it chunk by chunk.
+
+On CPU workers the chunks are spread across a process pool, since a single
+Whisper stream cannot use all cores; elsewhere they run in order on the shared
+model so segments can be streamed to translation while later chunks are still
+being transcribed. Chunks overlap slightly; segments are shifted back to
+absolute time and each one is kept only by the chunk that owns its midpoint.
+Chunks are slices of the job's memory-mapped 16kHz track (see audio.py), so
+nothing is re-decoded or written out per chunk.
+"""
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .audio import SAMPLE_RATE, AudioSlice, detect_silences, duration_seconds
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _int_env(name, default):
+    raw = os.getenv(name)
+    return int(raw) if raw and raw.strip() else default
+
+
+def chunk_settings(device):
+    """
+    (workers, chunk_seconds, overlap_seconds). The process pool is a CPU-only
+    mode (workers <= 1 disables it); chunk length also sets streaming granularity.
+    """
+    workers = _int_env("WHISPER_CHUNK_WORKERS", max(1, (os.cpu_count() or 1) // 4))
+    if device and str(device).startswith("cuda"):
+        workers = 0
+    return workers, _int_env("WHISPER_CHUNK_SECONDS", 600), float(os.getenv("WHISPER_CHUNK_OVERLAP", "1.0"))
+
+
+def is_long_audio(audio, chunk_seconds):
+    """Worth chunking: at least two chunks of audio."""
+    return chunk_seconds > 0 and duration_seconds(audio) >= 2 * chunk_seconds
+
+
+def choose_boundaries(duration, silences, chunk_seconds):
+    """
+    Chunk boundaries [0, b1, ..., duration]. Each cut lands on the silence midpoint
+    closest to the ideal cut point (within a quarter chunk), else on the ideal point.
+    """
+    boundaries = [0.0]
+    window = chunk_seconds / 4
+    target = chunk_seconds
+    while target < duration - chunk_seconds / 2:
+        mids = [(s + e) / 2 for s, e in silences if abs((s + e) / 2 - target) <= window]
+        cut = min(mids, key=lambda m: abs(m - target)) if mids else target
+        if cut > boundaries[-1]:
+            boundaries.append(cut)
+        target = cut + chunk_seconds
+    boundaries.append(duration)
+    return boundaries
+
+
+def slice_chunks(raw_path, duration, boundaries, overlap):
+    """Overlapping AudioSlices over the raw track; returns [(slice, offset, own_start, own_end), ...]."""
+    chunks = []
+    for i in range(len(boundaries) - 1):
+        own_start, own_end = boundaries[i], boundaries[i + 1]
+        start = max(0.0, own_start - overlap)
+        end = min(duration, own_end + overlap)
+        chunks.append((AudioSlice(raw_path, int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)), start, own_start, own_end))
+    return chunks
+
+
+def stitch_chunk(segments, offset, own_start, own_end, prev=None):
+    """
+    Shift one chunk's segments to absolute time, keep those whose midpoint falls
+    in the chunk's own range, and drop an exact repeat of `prev` (the last segment
+    kept from the previous chunk) straddling the boundary.
+    """
+    kept = []
+    for seg in segments:
+        if seg.get("start") is None or seg.get("end") is None:
+            continue
+        seg = dict(seg)
+        seg["start"] += offset
+        seg["end"] += offset
+        if "words" in seg:
+            seg["words"] = [
+                {**w, **{k: w[k] + offset for k in ("start", "end") if w.get(k) is not None}}
+                for w in seg["words"]
+            ]
+        mid = (seg["start"] + seg["end"]) / 2
+        if not (own_start <= mid < own_end):
+            continue
+        last = kept[-1] if kept else prev
+        if last is not None:
+            if last.get("text", "").strip() == seg.get("text", "").strip() and seg["start"] < last["end"]:
+                continue
+        kept.append(seg)
+    return kept
+
+
+def stitch_segments(chunk_results):
+    """chunk_results: [(segments, offset, own_start, own_end), ...] in time order."""
+    stitched = []
+    for segments, offset, own_start, own_end in chunk_results:
+        stitched.extend(stitch_chunk(segments, offset, own_start, own_end, stitched[-1] if stitched else None))
+    return stitched
+
+
+# ---- worker process side ----
+
+_worker_model = None
+
+
+def _init_worker(backend, model_ref, compute_type, download_root, threads):
+    global _worker_model
+    if backend == "faster-whisper":
+        import whisperx
+        _worker_model = whisperx.load_model(
+            model_ref, device="cpu", compute_type=compute_type, local_files_only=True, threads=threads
+        )
+    else:
+        import torch
+        import whisper
+        torch.set_num_threads(threads)
+        _worker_model = whisper.load_model(model_ref, device="cpu", download_root=download_root)
+
+
+def _result_segments(result):
+    # Only what stitching/alignment needs; keeps pickled results small.
+    return [
+        {k: v for k, v in seg.items() if k in ("start", "end", "text", "words")}
+        for seg in result.get("segments", [])
+    ]
+
+
+def _transcribe_chunk(audio_slice, language):
+    result = _worker_model.transcribe(audio_slice.load(), language=language)
+    return _result_segments(result), result.get("language", language)
+
+
+# ---- parent side ----
+
+# Idle warm pools kept for other models; a pool with chunks in flight is never stopped
+WHISPER_IDLE_POOLS = _int_env("WHISPER_IDLE_POOLS", 1)
+
+
+class WorkerPool:
+    """A warm process pool for one (backend, model, compute_type, workers); see worker_pool()."""
+
+    def __init__(self, backend, model_ref, compute_type, download_root, workers):
+        threads = max(1, (os.cpu_count() or workers) // workers)
+        logger.info(f"Starting {workers} transcription workers ({threads} threads each) for {model_ref}")
+        self.model_ref = model_ref
+        self.workers = workers
+        self.users = 0
+        self.pinned = False
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend, model_ref, compute_type, download_root, threads),
+        )
+
+    def submit(self, audio_slice, language):
+        """Future of (segments, language)."""
+        return self.executor.submit(_transcribe_chunk, audio_slice, language)
+
+    def warm(self):
+        """Start the workers now (each loads its model in the initializer) rather than on the first chunk."""
+        for future in [self.executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+
+_pools = OrderedDict()  # key -> WorkerPool, least recently used first
+_pools_lock = threading.Lock()
+
+
+def _idle_pools_to_stop():
+    """Unpinned pools nobody is using beyond WHISPER_IDLE_POOLS, oldest first; removed from _pools. Call under _pools_lock."""
+    idle = [key for key, pool in _pools.items() if not pool.users and not pool.pinned]
+    return [_pools.pop(key) for key in idle[:max(0, len(idle) - WHISPER_IDLE_POOLS)]]
+
+
+def _stop(pools):
+    for pool in pools:
+        logger.info(f"Stopping idle transcription workers for {pool.model_ref}")
+        pool.executor.shutdown(wait=True, cancel_futures=True)
+
+
+@contextmanager
+def worker_pool(backend, model_ref, compute_type="float32", download_root=None, workers=2, pin=False):
+    """
+    Hold the warm worker pool for this model for the block and yield it.
+    Pools are kept per (backend, model, compute_type, workers) and counted by
+    their users, so jobs on different models each keep their own pool; only idle
+    pools are stopped, and pinned ones (startup prewarming) never are.
+    """
+    key = (backend, model_ref, compute_type, workers)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = WorkerPool(backend, model_ref, compute_type, download_root, workers)
+        _pools.move_to_end(key)
+        pool.users += 1
+        pool.pinned = pool.pinned or pin
+    try:
+        yield pool
+    finally:
+        with _pools_lock:
+            pool.users -= 1
+            stale = _idle_pools_to_stop()
+        _stop(stale)
+
+
+class Deferred:
+    """Future-like wrapper that runs `fn` on first result(); keeps in-process chunks lazy and in order."""
+
+    def __init__(self, fn, *args):
+        self._fn = fn
+        self._args = args
+        self._done = False
+        self._value = None
+
+    def result(self):
+        if not self._done:
+            self._value = self._fn(*self._args)
+            self._done = True
+        return self._value
+
+
+def in_process_submitter(model):
+    """submit(audio_slice, language) -> Deferred of (segments, language), run lazily on an already-loaded model."""
+    def run(audio_slice, language):
+        result = model.transcribe(audio_slice.load(), language=language)
+        return _result_segments(result), result.get("language", language)
+    return lambda audio_slice, language: Deferred(run, audio_slice, language)
+
+
+def backing_file(audio, work_dir):
+    """Path of the raw f32le file behind `audio`, writing one to `work_dir` if it is an in-memory array."""
+    if isinstance(audio, np.memmap) and audio.filename and audio.offset == 0 and audio.size * 4 == os.path.getsize(audio.filename):
+        return audio.filename
+    raw_path = os.path.join(work_dir, "chunk_source.f32")
+    np.asarray(audio, dtype=np.float32).tofile(raw_path)
+    return raw_path
+
+
+def plan_chunks(audio, work_dir, chunk_seconds=600, overlap=1.0):
+    """Silence-aligned, overlapping slices of `audio`; returns [(AudioSlice, offset, own_start, own_end), ...]."""
+    duration = duration_seconds(audio)
+    boundaries = choose_boundaries(duration, detect_silences(audio), chunk_seconds)
+    chunks = slice_chunks(backing_file(audio, work_dir), duration, boundaries, overlap)
+    logger.info(f"Chunked transcription: {duration:.0f}s audio in {len(chunks)} chunks")
+    return chunks
+
+
+def stream_chunks(chunks, submit, language=None, postprocess=None):
+    """
+    Transcribe `chunks` and yield (segments, language) per chunk in time order,
+    with segments already in absolute time.
+
+    submit(audio_slice, language) returns a Future-like object of (segments, language).
+    With a known language every chunk is submitted at once, so a pool works on
+    all of them in parallel. Otherwise the first chunk detects the language and
+    the rest follow with it, so every chunk decodes consistently.
+    postprocess(segments, language, audio) runs on chunk-relative segments
+    (alignment against the chunk samples) before stitching.
+    The time spent waiting on transcription results is recorded as "transcribe";
+    postprocess and the consumer time their own work.
+    """
+    waited = 0.0
+
+    def wait(future):
+        nonlocal waited
+        started = time.perf_counter()
+        try:
+            return future.result()
+        finally:
+            waited += time.perf_counter() - started
+
+    try:
+        pending = [submit(chunks[0][0], language)]
+        if language is None:
+            language = wait(pending[0])[1]
+        pending += [submit(audio_slice, language) for audio_slice, _, _, _ in chunks[1:]]
+        prev = None
+        for i, (audio_slice, offset, own_start, own_end) in enumerate(chunks):
+            segments = wait(pending[i])[0]
+            if postprocess:
+                segments = postprocess(segments, language, audio_slice.load())
+            kept = stitch_chunk(segments, offset, own_start, own_end, prev)
+            if kept:
+                prev = kept[-1]
+            yield kept, language
+    finally:
+        metrics.observe("transcribe", waited)
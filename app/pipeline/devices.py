@@ -0,0 +1,229 @@
+# app/pipeline/devices.py
+"""
+Placement of pipeline stages on devices.
+
+Every GPU (cuda:N) and every CPU worker (cpu:N) is a Device with a memory
+budget, and GPUs also have a number of NVENC sessions. A stage asks the pool
+for a device of a kind and holds it while it runs. The stages are transcription,
+translation and each group of burns.
+
+    with device_pool.place("transcribe", "cuda", memory_mb=10000) as device:
+        transcriber.use_device(device.torch_device)   # e.g. "cuda:1"
+
+The pool first prefers devices that are running no stage, so concurrent work
+spreads across GPUs. Next it prefers the device the same model ran on last,
+where the model is probably still loaded. Last it prefers the device with the
+most free memory. Free memory is the device budget minus what running stages
+reserved, or minus what torch's allocator holds when that is more, since cached
+models outlive their stage. When nothing fits, the stage waits. A device that
+runs nothing takes any stage, so an oversized stage still runs.
+
+WORKER_DEVICES overrides discovery. It can be "cuda:0,cuda:1,cpu:0", or
+"cpu:0,cpu:1,cpu:2" on a CPU-only box, where stages then run on separate CPU
+workers.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _int_env(name, default):
+    raw = os.getenv(name)
+    return int(raw) if raw and raw.strip() else default
+
+
+NVENC_MAX_SESSIONS = _int_env("NVENC_MAX_SESSIONS", 3)  # per GPU
+BURN_VRAM_MB = _int_env("BURN_VRAM_MB", 300)  # per NVENC output: decode and encode surfaces
+MEMORY_FRACTION = 0.9
+
+# Rough peak VRAM per Whisper size (model + alignment + activations), for placement and job admission.
+WHISPER_VRAM_MB = {
+    "tiny": 1000, "base": 1200, "small": 2200, "medium": 5000,
+    "large": 10000, "large-v1": 10000, "large-v2": 10000, "large-v3": 10000,
+    "large-v3-turbo": 6000, "turbo": 6000,
+}
+
+
+def whisper_vram_mb(model_size):
+    """Estimated VRAM of a Whisper size; English-only variants count as their base size, unknown ones as large."""
+    return WHISPER_VRAM_MB.get(str(model_size).replace(".en", ""), 10000)
+
+
+def device_kind(device):
+    """"cuda" for cuda / cuda:N, else "cpu"."""
+    return "cuda" if device and str(device).startswith("cuda") else "cpu"
+
+
+def translation_kind(ml_kind):
+    """Where translation runs: TRANSLATE_DEVICE=cpu keeps it off the GPUs, "auto" follows the job's ML device."""
+    configured = os.getenv("TRANSLATE_DEVICE", "auto").strip().lower()
+    return ml_kind if configured in ("", "auto") else device_kind(configured)
+
+
+def _system_memory_mb():
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024 * 1024))
+    except (ValueError, OSError, AttributeError):
+        return 16 * 1024
+
+
+class Device:
+    def __init__(self, name, memory_mb, encoders=0):
+        self.name = name
+        kind, _, index = name.partition(":")
+        self.kind = device_kind(kind)
+        self.index = int(index or 0)
+        self.memory_mb = memory_mb
+        self.encoders = encoders
+        self.reserved_mb = 0
+        self.encoders_in_use = 0
+        self.stages = []
+
+    @property
+    def torch_device(self):
+        """What torch/ffmpeg are given: "cuda:N", or "cpu" for every CPU worker."""
+        return f"cuda:{self.index}" if self.kind == "cuda" else "cpu"
+
+    def allocator_mb(self):
+        """Memory torch's caching allocator holds on this GPU; 0 when torch has not touched CUDA."""
+        torch = sys.modules.get("torch")
+        if self.kind != "cuda" or torch is None:
+            return 0
+        try:
+            if not torch.cuda.is_initialized():
+                return 0
+            return int(torch.cuda.memory_reserved(self.index) / (1024 * 1024))
+        except Exception:
+            return 0
+
+    def free_mb(self):
+        return self.memory_mb - max(self.reserved_mb, self.allocator_mb())
+
+    def fits(self, memory_mb, encoders):
+        if not self.stages:
+            return True
+        if encoders and self.encoders and self.encoders_in_use + encoders > self.encoders:
+            return False
+        return memory_mb <= self.free_mb()
+
+    def snapshot(self):
+        return {
+            "device": self.name, "memory_mb": self.memory_mb, "reserved_mb": self.reserved_mb,
+            "free_mb": self.free_mb(), "encoders": self.encoders, "encoders_in_use": self.encoders_in_use,
+            "stages": list(self.stages),
+        }
+
+
+def discover_devices():
+    """Devices named in WORKER_DEVICES, else every visible GPU plus one CPU worker."""
+    from app.ml_stack import cuda_device_count, cuda_total_memory_mb
+
+    spec = os.getenv("WORKER_DEVICES", "").strip()
+    if spec:
+        names = []
+        for name in spec.split(","):
+            name = name.strip().lower()
+            if name:
+                name = name if ":" in name else f"{name}:0"
+                if name not in names:
+                    names.append(name)
+    else:
+        names = [f"cuda:{i}" for i in range(cuda_device_count())] + ["cpu:0"]
+
+    configured = _int_env("DEVICE_MEMORY_MB", 0)
+    cpu_workers = sum(1 for name in names if device_kind(name) == "cpu")
+    devices = []
+    for name in names:
+        if device_kind(name) == "cuda":
+            device = Device(name, 0, encoders=NVENC_MAX_SESSIONS)
+            device.memory_mb = configured or int(cuda_total_memory_mb(device.index) * MEMORY_FRACTION)
+        else:
+            device = Device(name, configured or int(_system_memory_mb() * MEMORY_FRACTION / max(1, cpu_workers)))
+        devices.append(device)
+    return devices
+
+
+class DevicePool:
+    def __init__(self, devices=None):
+        self._devices = devices
+        self._cond = threading.Condition()
+        self._last = {}  # affinity key -> device name
+
+    @property
+    def devices(self):
+        with self._cond:
+            if self._devices is None:
+                self._devices = discover_devices()
+                logger.info("Worker devices: " + ", ".join(
+                    f"{d.name} ({d.memory_mb}MB)" for d in self._devices))
+            return self._devices
+
+    def has(self, kind):
+        return any(d.kind == kind for d in self.devices)
+
+    def torch_devices(self, kind):
+        """Distinct torch devices of `kind` (every GPU, or just "cpu")."""
+        return list(dict.fromkeys(d.torch_device for d in self.devices if d.kind == kind))
+
+    def _pick(self, candidates, memory_mb, encoders, affinity, avoid, held):
+        # A device the caller already holds always takes the stage: waiting there would wait on itself
+        fitting = [d for d in candidates if d.name in held or d.fits(memory_mb, encoders)]
+        if not fitting:
+            return None
+        last = self._last.get(affinity)
+        return min(fitting, key=lambda d: (d.name in avoid, len(d.stages), d.name != last, -d.free_mb()))
+
+    @contextmanager
+    def place(self, stage, kind, memory_mb=0, encoders=0, affinity=None, avoid=(), held=()):
+        """
+        Reserve a device of `kind` for the block and yield it. Blocks until one fits.
+        `affinity` names the model the stage loads, so it goes back to the same device when it can.
+        `avoid` lists device names to use only when nothing else fits.
+        `held` lists devices the caller already has a stage on (the same job's transcription):
+        the stage may share those instead of waiting for its own reservation to be released.
+        """
+        candidates = [d for d in self.devices if d.kind == kind]
+        if not candidates:
+            logger.warning(f"No {kind} device in the worker pool; placing {stage} on any device")
+            candidates = self.devices
+        if encoders:
+            encoders = min(encoders, max(d.encoders for d in candidates) or encoders)
+        queued = time.monotonic()
+        with self._cond:
+            while True:
+                device = self._pick(candidates, memory_mb, encoders, affinity, set(avoid), set(held))
+                if device is not None:
+                    break
+                self._cond.wait()
+            device.reserved_mb += memory_mb
+            device.encoders_in_use += encoders
+            device.stages.append(stage)
+            if affinity is not None:
+                self._last[affinity] = device.name
+        try:
+            waited = time.monotonic() - queued
+            if waited > 0.01:
+                metrics.observe("device_wait", waited, placement=stage)
+            logger.info(f"Placed {stage} on {device.name} ({memory_mb}MB, waited {waited:.1f}s)")
+            yield device
+        finally:
+            with self._cond:
+                device.reserved_mb -= memory_mb
+                device.encoders_in_use -= encoders
+                device.stages.remove(stage)
+                self._cond.notify_all()
+
+    def snapshot(self):
+        devices = self.devices
+        with self._cond:
+            return [d.snapshot() for d in devices]
+
+
+device_pool = DevicePool()
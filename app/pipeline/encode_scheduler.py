@@ -0,0 +1,182 @@
+# app/pipeline/encode_scheduler.py
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from .FFmpegBurner import burn_many, default_burn_device
+from .metrics import metrics
+from .devices import device_pool, NVENC_MAX_SESSIONS, BURN_VRAM_MB
+
+logger = logging.getLogger(__name__)
+
+
+def _int_env(name, default):
+    raw = os.getenv(name)
+    return int(raw) if raw and raw.strip() else default
+
+
+class SlotLimiter:
+    """Counting limiter where a task can take several slots at once (one per encoder output)."""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n=1):
+        n = min(max(1, n), self.capacity)
+        with self._cond:
+            while self._in_use + n > self.capacity:
+                self._cond.wait()
+            self._in_use += n
+        return n
+
+    def release(self, n=1):
+        with self._cond:
+            self._in_use -= n
+            self._cond.notify_all()
+
+    def in_use(self):
+        with self._cond:
+            return self._in_use
+
+
+# Process-wide limits so concurrent jobs share the same hardware budget.
+# One slot is one encoder output: a VideoToolbox session or a libx264 instance.
+# NVENC sessions are counted per GPU by the device pool (devices.py), which also picks the GPU.
+LIMITERS = {
+    "videotoolbox": SlotLimiter(_int_env("VIDEOTOOLBOX_MAX_SESSIONS", 2)),
+    "cpu": SlotLimiter(_int_env("CPU_ENCODE_SLOTS", max(1, (os.cpu_count() or 4) // 4))),
+    "io": SlotLimiter(_int_env("MUX_CONCURRENCY", 2)),
+}
+
+# How many outputs share one ffmpeg process (and therefore one decode).
+# NVENC/VideoToolbox do the encode off-CPU, so packing outputs saves decodes.
+# On CPU a group is as many outputs as the CPU encode slots allow at once: the
+# decode is paid once per group, and the slots already bound the libx264 instances.
+OUTPUTS_PER_PROCESS = {
+    "cuda": _int_env("NVENC_OUTPUTS_PER_PROCESS", NVENC_MAX_SESSIONS),
+    "videotoolbox": _int_env("VIDEOTOOLBOX_OUTPUTS_PER_PROCESS", LIMITERS["videotoolbox"].capacity),
+    "cpu": _int_env("CPU_OUTPUTS_PER_PROCESS", LIMITERS["cpu"].capacity),
+}
+
+
+def limiter_for(device_class):
+    return LIMITERS.get(device_class, LIMITERS["cpu"])
+
+
+class EncodeScheduler:
+    """
+    Runs burns and soft-muxes for one job concurrently, bounded by the shared
+    per-device limiters, and records per-output wall-clock timings.
+
+        sched = EncodeScheduler(device)
+        sched.submit_burns(video, [(label, srt_path, out_path), ...], masked=masked)
+        sched.submit("multi_soft", "io", mux_multiple_srts_into_mkv, video, srts, out)
+        sched.wait()
+        sched.timings  # {label: {"device": ..., "seconds": ..., "queued_seconds": ...}}
+
+    With a progress_callback, ffmpeg progress is reported as
+    progress_callback({"encode_progress": {label: percent, ...}}).
+    """
+
+    def __init__(self, device=None, progress_callback=None):
+        self.device = default_burn_device(device)
+        self.progress_callback = progress_callback
+        self.progress = {}
+        self.timings = {}
+        self._futures = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(thread_name_prefix="encode")
+        self._created = time.monotonic()
+
+    @staticmethod
+    @contextmanager
+    def _slots(device_class, slots):
+        """Hold `slots` encoder slots; yields the GPU ("cuda:N") for NVENC work, else None."""
+        if device_class == "cuda":
+            with device_pool.place("burn", "cuda", memory_mb=BURN_VRAM_MB * slots, encoders=slots) as device:
+                yield device.name
+            return
+        limiter = limiter_for(device_class)
+        taken = limiter.acquire(slots)
+        try:
+            yield None
+        finally:
+            limiter.release(taken)
+
+    def submit(self, labels, device_class, fn, *args, slots=1, **kwargs):
+        """Run fn(*args, **kwargs) once slots are free; NVENC work is passed the chosen GPU as device=."""
+        labels = [labels] if isinstance(labels, str) else list(labels)
+
+        def run():
+            queued = time.monotonic()
+            with self._slots(device_class, slots) as gpu:
+                started = time.monotonic()
+                try:
+                    return fn(*args, **(dict(kwargs, device=gpu) if gpu else kwargs))
+                finally:
+                    elapsed = time.monotonic() - started
+                    with self._lock:
+                        for label in labels:
+                            self.timings[label] = {
+                                "device": gpu or device_class,
+                                "seconds": round(elapsed, 2),
+                                "queued_seconds": round(started - queued, 2),
+                                "started_at": round(started - self._created, 2),
+                            }
+                    for label in labels:
+                        metrics.observe("mux" if device_class == "io" else "burn", elapsed, output=label)
+                    logger.info(f"Encode {labels} on {gpu or device_class} finished in {elapsed:.1f}s")
+
+        # Run in a copy of the caller's context so timings stay attributed to the job.
+        future = self._executor.submit(contextvars.copy_context().run, run)
+        self._futures.append(future)
+        return future
+
+    def progress_for(self, labels):
+        """progress_callback for ffmpeg helpers encoding `labels`, or None when nobody listens."""
+        if self.progress_callback is None:
+            return None
+        labels = [labels] if isinstance(labels, str) else list(labels)
+
+        def report(fraction):
+            with self._lock:
+                for label in labels:
+                    self.progress[label] = round(fraction * 100, 1)
+                snapshot = dict(self.progress)
+            self.progress_callback({"encode_progress": snapshot})
+        return report
+
+    def submit_burns(self, video_path, jobs, mask_percent=0.25, masked=False):
+        """jobs: list of (label, srt_path, output_path); grouped per OUTPUTS_PER_PROCESS for the device."""
+        per_process = max(1, OUTPUTS_PER_PROCESS.get(self.device, 1))
+        for i in range(0, len(jobs), per_process):
+            group = jobs[i:i + per_process]
+            labels = [label for label, _, _ in group]
+            self.submit(
+                labels, self.device, burn_many,
+                video_path, [(srt_path, out) for _, srt_path, out in group],
+                slots=len(group), device=self.device, mask_percent=mask_percent, masked=masked,
+                progress_callback=self.progress_for(labels),
+            )
+
+    def wait(self):
+        """Block until every task finishes; re-raise the first failure."""
+        try:
+            error = None
+            for future in self._futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Encode task failed: {e}")
+                    error = error or e
+            if error:
+                raise error
+            return self.timings
+        finally:
+            self._executor.shutdown(wait=False)
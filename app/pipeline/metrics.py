@@ -0,0 +1,226 @@
+# app/pipeline/metrics.py
+"""
+Stage timings and resource peaks.
+
+`timed(stage, **labels)` records wall-clock time into process-wide histograms
+(exported in Prometheus text format by render_prometheus) and, when running
+inside `job_context(job_id)`, into that job's breakdown. The job is tracked
+with a contextvar; work handed to thread pools should be submitted through
+`contextvars.copy_context().run` to stay attributed to the job.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.5, 1, 5, 15, 60, 300, 900, 1800, 3600, float("inf"))
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class JobMetrics:
+    """Per-job stage seconds ({"transcribe": s, "burn[en]": s, ...}) plus resource peaks seen while it ran."""
+
+    def __init__(self, job_id, on_update=None):
+        self.job_id = job_id
+        self.on_update = on_update
+        self.stages = {}
+        self.peak_rss_bytes = 0
+        self.peak_gpu_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = round(self.stages.get(name, 0.0) + seconds, 3)
+        if self.on_update:
+            self.on_update(self.snapshot())
+
+    def sample(self):
+        rss, gpu = rss_bytes(), gpu_bytes()
+        with self._lock:
+            self.peak_rss_bytes = max(self.peak_rss_bytes, rss)
+            self.peak_gpu_bytes = max(self.peak_gpu_bytes, gpu)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stage_seconds": dict(self.stages),
+                "peak_rss_mb": round(self.peak_rss_bytes / (1024 * 1024), 1),
+                "peak_gpu_mb": round(self.peak_gpu_bytes / (1024 * 1024), 1),
+            }
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._active_jobs = set()
+        self._sampler = None
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram()
+            hist.observe(seconds)
+        job = _current_job.get()
+        if job is not None:
+            suffix = ",".join(str(v) for _, v in sorted(labels.items()))
+            job.add(f"{stage}[{suffix}]" if suffix else stage, seconds)
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timed(self, stage, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, **labels)
+
+    @contextmanager
+    def job_context(self, job_id, on_update=None):
+        """Attribute stages in this context to `job_id`; yields the JobMetrics."""
+        job = JobMetrics(job_id, on_update)
+        token = _current_job.set(job)
+        with self._lock:
+            self._active_jobs.add(job)
+            self._ensure_sampler()
+        job.sample()
+        try:
+            yield job
+        finally:
+            job.sample()
+            _current_job.reset(token)
+            with self._lock:
+                self._active_jobs.discard(job)
+
+    def _ensure_sampler(self):
+        # Peaks are sampled for the whole process; with concurrent jobs each job sees the shared peak.
+        if self._sampler is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(0.5)
+                with self._lock:
+                    jobs = list(self._active_jobs)
+                for job in jobs:
+                    job.sample()
+
+        self._sampler = threading.Thread(target=run, name="metrics-sampler", daemon=True)
+        self._sampler.start()
+
+    def render_prometheus(self, extra_gauges=None):
+        """Prometheus text exposition of stage histograms, counters and process gauges."""
+        lines = [
+            "# HELP subtitle_stage_seconds Wall-clock seconds per pipeline stage.",
+            "# TYPE subtitle_stage_seconds histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        for (stage, labels), hist in histograms:
+            base = _labels({"stage": stage, **dict(labels)})
+            for bound, n in zip(BUCKETS, hist.counts):
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"subtitle_stage_seconds_bucket{_labels({'stage': stage, **dict(labels), 'le': le})} {n}")
+            lines.append(f"subtitle_stage_seconds_sum{base} {hist.total:.6f}")
+            lines.append(f"subtitle_stage_seconds_count{base} {hist.count}")
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                lines.append(f"# TYPE {name} counter")
+                seen.add(name)
+            lines.append(f"{name}{_labels(dict(labels))} {value}")
+        gauges = {
+            "process_resident_memory_bytes": rss_bytes(),
+            "process_peak_resident_memory_bytes": peak_rss_bytes(),
+            "gpu_memory_reserved_bytes": gpu_bytes(),
+            "gpu_peak_memory_reserved_bytes": gpu_peak_bytes(),
+        }
+        gauges.update(extra_gauges or {})
+        for name, value in gauges.items():
+            family = name.split("{")[0]
+            if family not in seen:
+                lines.append(f"# TYPE {family} gauge")
+                seen.add(family)
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+    return "{" + escaped + "}"
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _cuda():
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            return torch.cuda
+    except Exception:
+        pass
+    return None
+
+
+def gpu_bytes():
+    cuda = _cuda()
+    return sum(cuda.memory_reserved(i) for i in range(cuda.device_count())) if cuda else 0
+
+
+def gpu_peak_bytes():
+    cuda = _cuda()
+    return sum(cuda.max_memory_reserved(i) for i in range(cuda.device_count())) if cuda else 0
+
+
+metrics = Metrics()
+timed = metrics.timed
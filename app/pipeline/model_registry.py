@@ -0,0 +1,239 @@
+# app/pipeline/model_registry.py
+import os
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def _budget_from_env(name, default_mb):
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default_mb * MB
+    return int(float(raw) * MB)
+
+
+def device_class(device):
+    """Group devices into the budget they are charged against ("cpu" or "cuda")."""
+    if device and str(device).startswith("cuda"):
+        return "cuda"
+    return "cpu"
+
+
+def estimate_model_bytes(obj, _seen=None):
+    """
+    Best-effort size of a loaded model in bytes.
+    Torch modules are measured by their parameters and buffers; wrappers
+    (HF pipelines, whisperx pipelines, tuples of (model, tokenizer)) are walked.
+    """
+    if _seen is None:
+        _seen = set()
+    if obj is None or id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_model_bytes(o, _seen) for o in obj)
+    if isinstance(obj, dict):
+        return sum(estimate_model_bytes(o, _seen) for o in obj.values())
+
+    if hasattr(obj, "parameters") and callable(obj.parameters):
+        try:
+            total = sum(p.numel() * p.element_size() for p in obj.parameters())
+            if hasattr(obj, "buffers") and callable(obj.buffers):
+                total += sum(b.numel() * b.element_size() for b in obj.buffers())
+            return total
+        except Exception:
+            pass
+
+    for attr in ("model", "_model"):
+        inner = getattr(obj, attr, None)
+        if inner is not None and inner is not obj:
+            size = estimate_model_bytes(inner, _seen)
+            if size:
+                return size
+    return 0
+
+
+def directory_size_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _key_class(key):
+    return device_class(key[2] if len(key) > 2 else None)
+
+
+class _Entry:
+    __slots__ = ("value", "size", "pinned")
+
+    def __init__(self, value, size, pinned=False):
+        self.value = value
+        self.size = size
+        self.pinned = pinned
+
+
+class ModelRegistry:
+    """
+    Process-wide, thread-safe cache of loaded models.
+
+    Keys are tuples of (backend, size, device, compute_type). Each device class
+    ("cpu" / "cuda") has its own byte budget; when a load pushes a class over its
+    budget, the least-recently-used unpinned entries of that class are evicted.
+    Concurrent requests for the same key share a single load.
+    """
+
+    def __init__(self, ram_budget_bytes=None, vram_budget_bytes=None):
+        self._budgets = {
+            "cpu": ram_budget_bytes if ram_budget_bytes is not None
+            else _budget_from_env("MODEL_CACHE_RAM_MB", 16 * 1024),
+            "cuda": vram_budget_bytes if vram_budget_bytes is not None
+            else _budget_from_env("MODEL_CACHE_VRAM_MB", 7 * 1024),
+        }
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}
+        self._thread_state = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader, size_bytes=None, pin=False):
+        """
+        Return the cached model for `key`, calling `loader()` on a miss.
+        `size_bytes` overrides the automatic size estimate (useful for
+        non-torch backends such as CTranslate2).
+        """
+        key = tuple(key)
+        pin = pin or getattr(self._thread_state, "pinning", False)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    if pin:
+                        entry.pinned = True
+                    return entry.value
+                event = self._loading.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._loading[key] = event
+                    self.misses += 1
+                    break
+            # Another thread is loading this key; wait and re-check.
+            event.wait()
+
+        try:
+            logger.info(f"Model registry: loading {key}")
+            with timed("model_load", backend=key[0]):
+                value = loader()
+            size = size_bytes if size_bytes is not None else estimate_model_bytes(value)
+            with self._lock:
+                self._entries[key] = _Entry(value, size, pinned=pin)
+                self._evict(_key_class(key), keep=key)
+            logger.info(f"Model registry: loaded {key} ({size / MB:.1f}MB)")
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+
+    def _used(self, dev_class):
+        return sum(e.size for k, e in self._entries.items()
+                   if _key_class(k) == dev_class)
+
+    def _evict(self, dev_class, keep=None):
+        """Drop least-recently-used unpinned entries of `dev_class` until it fits; `keep` (the entry just loaded) stays."""
+        budget = self._budgets.get(dev_class)
+        if budget is None:
+            return
+        freed = False
+        for key in list(self._entries.keys()):
+            if self._used(dev_class) <= budget:
+                break
+            entry = self._entries[key]
+            # The model just loaded is about to be used; an oversized one still has to run.
+            if entry.pinned or key == keep or _key_class(key) != dev_class:
+                continue
+            logger.info(f"Model registry: evicting {key} ({entry.size / MB:.1f}MB)")
+            del self._entries[key]
+            freed = True
+        if freed and dev_class == "cuda":
+            _empty_cuda_cache()
+
+    def evict(self, key):
+        with self._lock:
+            entry = self._entries.pop(tuple(key), None)
+        if entry is not None and _key_class(tuple(key)) == "cuda":
+            _empty_cuda_cache()
+        return entry is not None
+
+    @contextmanager
+    def pinning(self):
+        """Models this thread gets inside the block (loaded or already cached) are pinned; used by startup prewarming."""
+        previous = getattr(self._thread_state, "pinning", False)
+        self._thread_state.pinning = True
+        try:
+            yield
+        finally:
+            self._thread_state.pinning = previous
+
+    def is_pinning(self):
+        """Whether this thread is inside pinning(); lets caches outside the registry pin along."""
+        return getattr(self._thread_state, "pinning", False)
+
+    def pin(self, key, pinned=True):
+        with self._lock:
+            entry = self._entries.get(tuple(key))
+            if entry is not None:
+                entry.pinned = pinned
+            return entry is not None
+
+    def contains(self, key):
+        with self._lock:
+            return tuple(key) in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        _empty_cuda_cache()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "budgets_mb": {k: round(v / MB, 1) for k, v in self._budgets.items()},
+                "used_mb": {c: round(self._used(c) / MB, 1) for c in self._budgets},
+                "models": [
+                    {"key": list(k), "size_mb": round(e.size / MB, 1), "pinned": e.pinned}
+                    for k, e in self._entries.items()
+                ],
+            }
+
+
+def _empty_cuda_cache():
+    import sys
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    try:
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+registry = ModelRegistry()
@@ -0,0 +1,74 @@
+# app/pipeline/processes.py
+"""
+ffmpeg/ffprobe children of running jobs.
+
+Job threads are daemons, so a worker that exits abandons them, but not the
+processes they started: an ffmpeg burn would keep writing outputs for a job
+that is already back in the queue. Pipeline code starts its children through
+run() and popen() here, which track them until they exit; terminate_children()
+ends whatever is still running and refuses to start new ones.
+"""
+import time
+import logging
+import threading
+import subprocess
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_children = set()
+_lock = threading.Lock()
+_closing = False
+
+
+@contextmanager
+def popen(cmd, **kwargs):
+    """subprocess.Popen(cmd, **kwargs), tracked for the block; the caller waits for it as usual."""
+    with _lock:
+        if _closing:
+            raise RuntimeError(f"Shutting down; not starting {cmd[0]}")
+        proc = subprocess.Popen(cmd, **kwargs)
+        _children.add(proc)
+    try:
+        yield proc
+    finally:
+        with _lock:
+            _children.discard(proc)
+
+
+def run(cmd, check=False, capture_output=False, **kwargs):
+    """subprocess.run for a tracked child (same check / capture_output / text behaviour)."""
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    with popen(cmd, **kwargs) as proc:
+        try:
+            stdout, stderr = proc.communicate()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+def terminate_children(timeout=10.0):
+    """
+    Stop starting children, SIGTERM the running ones and wait up to `timeout`
+    seconds for them, then SIGKILL the rest. Returns how many were running.
+    """
+    global _closing
+    with _lock:
+        _closing = True
+        children = [proc for proc in _children if proc.poll() is None]
+    for proc in children:
+        proc.terminate()
+    deadline = time.monotonic() + timeout
+    for proc in children:
+        try:
+            proc.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Killing {proc.args[0]} (pid {proc.pid}), still running {timeout:.0f}s after SIGTERM")
+            proc.kill()
+            proc.wait()
+    return len(children)
@@ -6,10 +6,119 @@ import importlib.util
 import os
 import ssl
 import glob
+import tempfile
+from abc import abstractmethod
+from contextlib import ExitStack
 import torch
 from .base import Transcriber
-
-class FasterWhisperTranscriber(Transcriber):
+from .model_registry import registry, directory_size_bytes
+from .audio import prepare_audio
+from .metrics import timed
+from .devices import whisper_vram_mb
+from .chunked_transcription import (
+    chunk_settings, is_long_audio, plan_chunks, stream_chunks, worker_pool, in_process_submitter
+)
+
+
+def load_align_model_cached(language_code, device):
+    """Alignment models are small but slow to build; share them across jobs."""
+    return registry.get_or_load(
+        ("whisperx-align", language_code, device, "default"),
+        lambda: whisperx.load_align_model(language_code=language_code, device=device),
+    )
+
+
+class ChunkedWhisperTranscriber(Transcriber):
+    """
+    Shared transcription flow for the Whisper backends. Short audio goes through
+    one model.transcribe call; long audio is cut into silence-aligned chunks that
+    are transcribed on a CPU process pool or in order on the shared model, and
+    yielded chunk by chunk so downstream stages can start early.
+    Subclasses provide _prepare/_load_model/_worker_pool.
+    """
+
+    def _prepare(self):
+        """Make sure weights are on disk; returns a context passed to the loaders."""
+        return None
+
+    @abstractmethod
+    def _load_model(self, ctx):
+        """The shared in-process model (through the model registry)."""
+
+    @abstractmethod
+    def _worker_pool(self, ctx, workers, pin=False):
+        """Context manager holding the CPU worker pool for this model (chunked_transcription.worker_pool)."""
+
+    def _align(self, segments, language, audio):
+        if not segments:
+            return segments
+        print(f"Aliging Rows")
+        try:
+            model_a, metadata = load_align_model_cached(language or "und", self.device)
+            print("Starting alignment...")
+            with timed("align"):
+                aligned = whisperx.align(segments, model_a, metadata, audio, self.device)
+            print("Alignment finished.")
+            return aligned["segments"]
+        except Exception as e:
+            print(f"⚠️ Alignment failed: {e}")
+            return segments
+
+    def transcribe_stream(self, audio, language=None, align_output=True):
+        """
+        `audio` is 16kHz mono float32 samples (audio.prepare_audio), shared by
+        transcription and alignment; a media path is accepted and decoded once here.
+        Only the Whisper calls are timed as "transcribe"; alignment is "align".
+        """
+        with tempfile.TemporaryDirectory() as work_dir:
+            if isinstance(audio, str):
+                audio = prepare_audio(audio, work_dir)
+            ctx = self._prepare()
+            workers, chunk_seconds, overlap = chunk_settings(self.device)
+            if not is_long_audio(audio, chunk_seconds):
+                model = self._load_model(ctx)
+                with timed("transcribe"):
+                    transcribed = model.transcribe(audio, language=language)
+                lang = transcribed.get("language", language)
+                segments = transcribed["segments"]
+                if align_output:
+                    segments = self._align(segments, lang, audio)
+                yield segments, lang
+                return
+
+            with ExitStack() as stack:
+                if workers > 1:
+                    submit = stack.enter_context(self._worker_pool(ctx, workers)).submit
+                else:
+                    submit = in_process_submitter(self._load_model(ctx))
+                # Alignment runs per chunk against the chunk samples, so nothing re-decodes the full soundtrack.
+                postprocess = self._align if align_output else None
+                chunks = plan_chunks(audio, work_dir, chunk_seconds, overlap)
+                yield from stream_chunks(chunks, submit, language, postprocess)
+
+    def memory_mb(self):
+        return whisper_vram_mb(self.model_size)
+
+    def warm(self):
+        """
+        Load what a job on this device uses: the in-process model, and on multi-worker
+        CPU the worker pool too. Under registry.pinning() the pool is pinned as well.
+        """
+        ctx = self._prepare()
+        self._load_model(ctx)
+        workers, _, _ = chunk_settings(self.device)
+        if workers > 1:
+            with self._worker_pool(ctx, workers, pin=registry.is_pinning()) as pool:
+                pool.warm()
+
+    def transcribe(self, audio, language=None, align_output=True):
+        segments = []
+        for chunk_segments, language in self.transcribe_stream(audio, language, align_output):
+            segments.extend(chunk_segments)
+        return {"segments": segments, "language": language}, language
+
+
+class FasterWhisperTranscriber(ChunkedWhisperTranscriber):
     def __init__(self, models_root, backend_name, model_size, device="cuda"):
         self.models_root = models_root
         self.backend_name = backend_name
@@ -20,7 +129,7 @@ class FasterWhisperTranscriber(Transcriber):
         folder_name = f"{self.backend_name}-{self.model_size}"
         return os.path.join(self.models_root, folder_name)
 
-    def transcribe(self, audio_path, language=None,align_output=True):
+    def _prepare(self):
         model_path = self.get_model_path()
         compute_type = "int8_float32" if self.device.startswith("cuda") else "float32"
         if not os.path.exists(os.path.join(model_path, "model.bin")):
@@ -31,44 +140,49 @@ class FasterWhisperTranscriber(Transcriber):
                 ssl._create_default_https_context = ssl._create_unverified_context
                 whisperx.load_model(
                     self.model_size,
-                    device=self.device,
+                    device=self.device.partition(":")[0],
                     compute_type=compute_type,
                     download_root=model_path,
                     local_files_only=False
                 )
             flatten_whisper_snapshot(model_path)
-        
-        model = whisperx.load_model(
-            model_path, device=self.device, compute_type=compute_type, local_files_only=True
+        return model_path, compute_type
+
+    def _load_model(self, ctx):
+        model_path, compute_type = ctx
+        # CTranslate2 takes the GPU as a separate index, not "cuda:N"
+        device, _, index = self.device.partition(":")
+        return registry.get_or_load(
+            (self.backend_name, self.model_size, self.device, compute_type),
+            lambda: whisperx.load_model(
+                model_path, device=device, device_index=int(index or 0), compute_type=compute_type,
+                local_files_only=True
+            ),
+            size_bytes=directory_size_bytes(model_path),
         )
-        transcribed = model.transcribe(audio_path, language=language)
-        language = transcribed["language"]
-        if align_output:
-            print(f"Aliging Rows")
-            try:
-                model_a, metadata = whisperx.load_align_model(language_code=language, device= self.device)
-                print("Starting alignment...")
-                transcribed = whisperx.align(transcribed["segments"], model_a, metadata, audio_path,  self.device)
-                print("Alignment finished.")
-            except Exception as e:
-                print(f"⚠️ Alignment failed: {e}")
-        return transcribed,language
-
-
-class OpenAIWhisperTranscriber(Transcriber):
+
+    def _worker_pool(self, ctx, workers, pin=False):
+        model_path, compute_type = ctx
+        return worker_pool("faster-whisper", model_path, compute_type=compute_type, workers=workers, pin=pin)
+
+
+class OpenAIWhisperTranscriber(ChunkedWhisperTranscriber):
     def __init__(self, models_root, backend_name, model_size, device="cpu"):
         self.models_root = models_root
         self.backend_name = backend_name
         self.model_size = model_size
+        self.use_device(device)
+
+    def use_device(self, device):
         # Resolve device safely
-        if device == "cuda" and not torch.cuda.is_available():
+        if device.startswith("cuda") and not torch.cuda.is_available():
             device = "cpu"
         self.device = device
 
     def get_model_path(self):
         return os.path.join(self.models_root, f"{self.backend_name}-{self.model_size}")
 
-    def transcribe(self, audio_path, language=None, align_output=True):
+    def _prepare(self):
         model_path = self.get_model_path()
         os.makedirs(model_path, exist_ok=True)
 
@@ -81,25 +195,25 @@ class OpenAIWhisperTranscriber(Transcriber):
             )
         whisper = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(whisper)
+        return model_path, whisper
 
+    def _load_model(self, ctx):
+        model_path, whisper = ctx
         # Whisper will cache to XDG_CACHE_HOME by default (we set /cache in Dockerfile)
-        model = whisper.load_model(self.model_size, device=self.device, download_root=model_path)
-
-        transcribed = model.transcribe(audio_path, language=language)
-        lang = transcribed.get("language", language)
+        return registry.get_or_load(
+            (self.backend_name, self.model_size, self.device, "float32"),
+            lambda: whisper.load_model(self.model_size, device=self.device, download_root=model_path),
+        )
 
-        if align_output:
-            try:
-                print("Aligning rows…")
-                model_a, metadata = whisperx.load_align_model(language_code=lang or "und", device=self.device)
-                aligned = whisperx.align(transcribed["segments"], model_a, metadata, audio_path, self.device)
-                transcribed = aligned
-                print("Alignment finished.")
-            except Exception as e:
-                print(f"⚠️ Alignment failed: {e}")
+    def _worker_pool(self, ctx, workers, pin=False):
+        model_path, _ = ctx
+        return worker_pool("openai-whisper", self.model_size, download_root=model_path, workers=workers, pin=pin)
 
-        return transcribed, lang
 
+def build_transcriber(models_root, model_type, model_size, device):
+    if model_type == "faster-whisper":
+        return FasterWhisperTranscriber(models_root, model_type, model_size, device)
+    return OpenAIWhisperTranscriber(models_root, model_type, model_size, device)
 
 
 def flatten_whisper_snapshot(model_base_dir: str):
@@ -0,0 +1,127 @@
+# app/pipeline/transcription_cache.py
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+from . import processes
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 1024 * 1024  # 1MB per sampled window
+
+
+def fast_file_hash(path, samples=16, sample_size=SAMPLE_SIZE):
+    """
+    Content hash that stays fast on 30GB inputs: the file size plus `samples`
+    evenly spaced windows (always including the head and tail). Files smaller
+    than samples * sample_size are hashed in full.
+    """
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= samples * sample_size:
+            for chunk in iter(lambda: f.read(sample_size), b""):
+                h.update(chunk)
+        else:
+            step = (size - sample_size) / (samples - 1)
+            for i in range(samples):
+                f.seek(int(i * step))
+                h.update(f.read(sample_size))
+    return h.hexdigest()
+
+
+def audio_stream_hash(media_path, stream_index=None):
+    """
+    SHA-256 of the packets of one audio stream (absolute ffprobe index, or the
+    stream ffmpeg picks by default, as audio.extract_audio does). The stream is
+    copied, not decoded, so this costs a demux; a remux or any container or
+    video edit that keeps the audio gives the same hash.
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-i", media_path]
+    if stream_index is not None:
+        cmd += ["-map", f"0:{stream_index}"]
+    cmd += ["-vn", "-sn", "-dn", "-c:a", "copy", "-f", "hash", "-hash", "sha256", "-"]
+    out = processes.run(cmd, capture_output=True, text=True, check=True).stdout.strip()
+    algorithm, _, digest = out.rpartition("\n")[2].partition("=")
+    if algorithm != "SHA256" or not digest:
+        raise RuntimeError(f"Unexpected ffmpeg hash output: {out[-200:]}")
+    return digest
+
+
+def full_file_hash(path, block_size=8 * 1024 * 1024):
+    """Hash of every byte of the file; opt-in fallback (TRANSCRIPTION_CACHE_FULL_HASH=1) when the audio cannot be hashed."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class TranscriptionCache:
+    """
+    Stores whisper segment results as JSON, keyed by the audio that is
+    transcribed (audio_stream_hash of the selected stream) and the
+    transcription settings, so re-submitting the same media (another target
+    language, a different burn type, a remux) skips Whisper. Sampled file
+    hashes are not used: two edits can differ only between the samples.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(media_key, model_type=None, model=None, language=None, align=True):
+        """`media_key` identifies the audio (see main.transcription_media_key); None disables caching for the job."""
+        if media_key is None:
+            return None
+        parts = {
+            "media": media_key,
+            "model_type": model_type,
+            "model": model,
+            "language": language or "auto",
+            "align": bool(align),
+        }
+        return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def contains(self, key):
+        return key is not None and os.path.exists(self._path(key))
+
+    def get(self, key):
+        """Return (result, language) or None."""
+        if key is None:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            logger.info(f"Transcription cache hit: {key}")
+            return data["result"], data["language"]
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, OSError) as e:
+            logger.warning(f"Ignoring unreadable transcription cache entry {key}: {e}")
+            return None
+
+    def put(self, key, result, language):
+        if key is None:
+            return
+        # Keep only what the subtitle stages need; word-level data from whisperx
+        # may contain numpy floats, so coerce through default=float.
+        payload = {"result": {"segments": result.get("segments", []), "language": language},
+                   "language": language}
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, default=float)
+            os.replace(tmp_path, self._path(key))
+            logger.info(f"Transcription cached: {key}")
+        except Exception as e:
+            logger.warning(f"Could not write transcription cache entry {key}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
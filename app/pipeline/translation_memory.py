@@ -0,0 +1,245 @@
+# app/pipeline/translation_memory.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DB_FILENAME = "translation_memory.sqlite3"
+
+
+def normalize_text(text):
+    """Collapse whitespace so re-wrapped lines hit the same entry."""
+    return " ".join(text.split())
+
+
+class TranslationMemory:
+    """
+    On-disk translation memory keyed by (model, src, tgt, normalized text),
+    with an in-memory LRU in front of SQLite.
+
+    `max_entries` bounds the on-disk table; when exceeded, the least recently
+    used rows are dropped. Errors from SQLite are logged and treated as misses
+    so a broken cache never fails a translation job.
+    """
+
+    def __init__(self, db_path, max_entries=1_000_000, lru_size=50_000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tm ("
+            " model TEXT NOT NULL, src TEXT NOT NULL, tgt TEXT NOT NULL, source TEXT NOT NULL,"
+            " translation TEXT NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, src, tgt, source))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tm_last_used ON tm (last_used)")
+        self._conn.commit()
+
+    def _lru_put(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def lookup(self, model, src, tgt, texts):
+        """Return a list aligned with `texts`: the cached translation or None."""
+        results = [None] * len(texts)
+        pending = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = (model, src, tgt, normalize_text(text))
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    results[i] = self._lru[key]
+                else:
+                    pending.setdefault(key[3], []).append(i)
+            if pending:
+                try:
+                    found = self._select(model, src, tgt, list(pending))
+                except sqlite3.Error as e:
+                    logger.warning(f"Translation memory lookup failed: {e}")
+                    found = {}
+                for source, translation in found.items():
+                    self._lru_put((model, src, tgt, source), translation)
+                    for i in pending[source]:
+                        results[i] = translation
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(texts) - hit_count
+        return results
+
+    def _select(self, model, src, tgt, sources):
+        found = {}
+        now = time.time()
+        # Stay well under SQLite's host parameter limit.
+        for start in range(0, len(sources), 500):
+            chunk = sources[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT source, translation FROM tm WHERE model=? AND src=? AND tgt=? AND source IN ({placeholders})",
+                [model, src, tgt, *chunk],
+            ).fetchall()
+            found.update(rows)
+        if found:
+            self._conn.executemany(
+                "UPDATE tm SET last_used=? WHERE model=? AND src=? AND tgt=? AND source=?",
+                [(now, model, src, tgt, source) for source in found],
+            )
+            self._conn.commit()
+        return found
+
+    def store(self, model, src, tgt, texts, translations):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, translation in zip(texts, translations):
+                source = normalize_text(text)
+                if not source or translation is None:
+                    continue
+                self._lru_put((model, src, tgt, source), translation)
+                rows.append((model, src, tgt, source, translation, now))
+            if not rows:
+                return
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO tm VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._conn.commit()
+                self._writes_since_trim += len(rows)
+                if self._writes_since_trim >= 1000:
+                    self._trim()
+            except sqlite3.Error as e:
+                logger.warning(f"Translation memory store failed: {e}")
+
+    def _trim(self):
+        self._writes_since_trim = 0
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM tm").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            logger.info(f"Translation memory: evicting {excess} least recently used entries")
+            self._conn.execute(
+                "DELETE FROM tm WHERE rowid IN (SELECT rowid FROM tm ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self._conn.commit()
+
+    def translate_through(self, model, src, tgt, texts, translate_fn):
+        """
+        Serve `texts` from memory and call `translate_fn(missing_texts)` once for
+        the unique misses; results are stored and returned aligned with `texts`.
+        Misses are grouped by normalized text, but the model gets the first
+        original of each group (line breaks intact); normalizing is only the key.
+        """
+        results = list(texts)
+        wanted = [i for i, t in enumerate(texts) if t and t.strip()]
+        cached = self.lookup(model, src, tgt, [texts[i] for i in wanted])
+        missing = {}
+        for i, hit in zip(wanted, cached):
+            if hit is None:
+                missing.setdefault(normalize_text(texts[i]), []).append(i)
+            else:
+                results[i] = hit
+        if missing:
+            sources = [texts[indices[0]] for indices in missing.values()]
+            translated = translate_fn(sources)
+            self.store(model, src, tgt, sources, translated)
+            for indices, translation in zip(missing.values(), translated):
+                for i in indices:
+                    results[i] = translation
+        return results
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            try:
+                (entries,) = self._conn.execute("SELECT COUNT(*) FROM tm").fetchone()
+            except sqlite3.Error:
+                entries = None
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": entries,
+                "lru_entries": len(self._lru),
+            }
+
+
+def cached_translate(memory, model_id, src, tgt, texts, translate_fn):
+    """Serve `texts` from the translation memory; `translate_fn(texts)` handles the misses."""
+    if memory is None:
+        return translate_fn(texts)
+    return memory.translate_through(model_id, src, tgt, texts, translate_fn)
+
+
+def cached_translate_multi(memory, model_id, src, tgt_codes, texts, translate_fn):
+    """
+    Multi-target variant of cached_translate. tgt_codes: {lang: model code}.
+    `translate_fn(texts, langs)` returns {lang: [translations]} and is called once with
+    the union of texts missing for any language and only the languages that missed.
+    As in translate_through, misses are grouped by normalized text and the model
+    gets an original line of each group.
+    """
+    if memory is None:
+        return translate_fn(texts, list(tgt_codes))
+    wanted = [i for i, t in enumerate(texts) if t and t.strip()]
+    results, missing, originals = {}, {}, {}
+    for lang, tgt in tgt_codes.items():
+        results[lang] = list(texts)
+        hits = memory.lookup(model_id, src, tgt, [texts[i] for i in wanted])
+        for i, hit in zip(wanted, hits):
+            if hit is None:
+                key = normalize_text(texts[i])
+                originals.setdefault(key, texts[i])
+                missing.setdefault(key, {}).setdefault(lang, []).append(i)
+            else:
+                results[lang][i] = hit
+    if missing:
+        keys = list(missing)
+        sources = [originals[key] for key in keys]
+        langs = [lang for lang in tgt_codes if any(lang in by_lang for by_lang in missing.values())]
+        translated = translate_fn(sources, langs)
+        for lang in langs:
+            # Only this language's misses: a hit for it keeps its stored translation
+            missed = [(key, source, translation) for key, source, translation in zip(keys, sources, translated[lang])
+                      if lang in missing[key]]
+            memory.store(model_id, src, tgt_codes[lang], [m[1] for m in missed], [m[2] for m in missed])
+            for key, _, translation in missed:
+                for i in missing[key][lang]:
+                    results[lang][i] = translation
+    return results
+
+
+_memories = {}
+_memories_lock = threading.Lock()
+
+
+def get_translation_memory(cache_dir):
+    """
+    Shared TranslationMemory for `cache_dir` (normally MODEL_DIR), or None when
+    disabled with TRANSLATION_MEMORY=0 or the database cannot be opened.
+    """
+    if os.getenv("TRANSLATION_MEMORY", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    db_path = os.getenv("TRANSLATION_MEMORY_PATH") or os.path.join(cache_dir or "./model", DB_FILENAME)
+    with _memories_lock:
+        if db_path not in _memories:
+            try:
+                _memories[db_path] = TranslationMemory(
+                    db_path,
+                    max_entries=int(os.getenv("TRANSLATION_MEMORY_MAX_ENTRIES", "1000000")),
+                    lru_size=int(os.getenv("TRANSLATION_MEMORY_LRU_SIZE", "50000")),
+                )
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Translation memory disabled, could not open {db_path}: {e}")
+                _memories[db_path] = None
+        return _memories[db_path]
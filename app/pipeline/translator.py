@@ -1,7 +1,11 @@
 import sys
 import os
-import srt
+import json
 import logging
+import tempfile
+import weakref
+import threading
+from copy import deepcopy
 
 logging.basicConfig(level=logging.INFO)
 
@@ -11,29 +15,44 @@ from transformers import (
     AutoModelForSeq2SeqLM
 )
 
-from .base import Translator  # Change this import path if needed
+from .base import Translator, length_sorted_batches  # Change this import path if needed
+from .model_registry import registry, directory_size_bytes
+from .translation_memory import get_translation_memory, cached_translate, cached_translate_multi
 
 REQUIRED_MODELS = [
     "facebook/nllb-200-distilled-600M",
     "facebook/m2m100_418M",
 ]
 
+def load_tokenizer(model_id, cache_dir=None):
+    # Use slow tokenizer for NLLB to avoid transformers bug
+    if "nllb" in model_id:
+        return AutoTokenizer.from_pretrained(model_id, cache_dir=cache_dir, use_fast=False)
+    return AutoTokenizer.from_pretrained(model_id, cache_dir=cache_dir)
+
+def load_seq2seq(model_id, cache_dir=None):
+    tokenizer = load_tokenizer(model_id, cache_dir=cache_dir)
+    try:
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_id, cache_dir=cache_dir, use_safetensors=True)
+    except OSError as e:
+        if "pytorch_model.bin" in str(e) and "TensorFlow weights" in str(e):
+            print(f"Retrying {model_id} with from_tf=True ...", flush=True)
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_id, cache_dir=cache_dir, from_tf=True, use_safetensors=True)
+        else:
+            raise
+    return tokenizer, model
+
+def get_shared_seq2seq(backend, model_id, cache_dir=None, device="cpu"):
+    """(tokenizer, model) for `model_id` on `device`, loaded once per process and device via the model registry."""
+    def load():
+        tokenizer, model = load_seq2seq(model_id, cache_dir=cache_dir)
+        return tokenizer, model.to(device)
+    return registry.get_or_load((backend, model_id, device, "float32"), load)
+
 def ensure_model_downloaded(model_id, cache_dir=None):
     try:
         print(f"Ensuring model {model_id} is available locally...", flush=True)
-        # Use slow tokenizer for NLLB to avoid transformers bug
-        if "nllb" in model_id:
-            AutoTokenizer.from_pretrained(model_id, cache_dir=cache_dir, use_fast=False)
-        else:
-            AutoTokenizer.from_pretrained(model_id, cache_dir=cache_dir)
-        try:
-            AutoModelForSeq2SeqLM.from_pretrained(model_id, cache_dir=cache_dir, use_safetensors=True)
-        except OSError as e:
-            if "pytorch_model.bin" in str(e) and "TensorFlow weights" in str(e):
-                print(f"Retrying {model_id} with from_tf=True ...", flush=True)
-                AutoModelForSeq2SeqLM.from_pretrained(model_id, cache_dir=cache_dir, from_tf=True, use_safetensors=True)
-            else:
-                raise
+        load_seq2seq(model_id, cache_dir=cache_dir)
         print(f"Model {model_id} is ready.", flush=True)
     except Exception as e:
         print(f"Could not download or load model {model_id}: {e}", file=sys.stderr, flush=True)
@@ -66,12 +85,76 @@ def get_pipeline_with_tf_fallback(*args, **kwargs):
             raise
 
 
+def translate_with_pipeline(translator, texts, batch_size=16):
+    """Run an HF translation pipeline over `texts` in length-sorted batches, preserving order."""
+    results = list(texts)
+    for idxs in length_sorted_batches(texts, batch_size=batch_size):
+        chunk = [texts[i] for i in idxs]
+        outputs = translator(chunk, batch_size=len(chunk))
+        for i, out in zip(idxs, outputs):
+            results[i] = out["translation_text"]
+    return results
+
+
+# Multilingual tokenizers carry src_lang as mutable state; they are shared through the registry.
+_TOKENIZER_LOCK = threading.Lock()
+# Shared tokenizer -> {src_code: copy}; the copies go away with the tokenizer when the registry evicts it
+_SOURCE_TOKENIZERS = weakref.WeakKeyDictionary()
+
+def source_tokenizer(tokenizer, src_code):
+    """
+    A copy of the shared tokenizer for one source language. HF translation
+    pipelines set tokenizer.src_lang on every call, so pipelines for different
+    source languages must not share a tokenizer; pipelines with the same source may.
+    """
+    with _TOKENIZER_LOCK:
+        copies = _SOURCE_TOKENIZERS.setdefault(tokenizer, {})
+        if src_code not in copies:
+            copy = deepcopy(tokenizer)
+            copy.src_lang = src_code
+            copies[src_code] = copy
+        return copies[src_code]
+
+def translate_multi_shared_encoder(tokenizer, model, texts, src_code, tgt_token_ids, batch_size=16):
+    """
+    Translate `texts` into several targets with one encoder pass per batch.
+    tgt_token_ids: {lang: forced BOS token id}. Only the decoder runs per target.
+    """
+    import torch
+    from transformers.modeling_outputs import BaseModelOutput
+
+    if not tgt_token_ids:
+        return {}
+    results = {lang: list(texts) for lang in tgt_token_ids}
+    for idxs in length_sorted_batches(texts, batch_size=batch_size):
+        chunk = [texts[i] for i in idxs]
+        with _TOKENIZER_LOCK:
+            tokenizer.src_lang = src_code
+            inputs = tokenizer(chunk, return_tensors="pt", padding=True, truncation=True)
+        inputs = {k: v.to(model.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            encoded = model.get_encoder()(**inputs)
+            for lang, bos_id in tgt_token_ids.items():
+                # generate() expands encoder outputs for beam search in place, so hand it a fresh wrapper.
+                generated = model.generate(
+                    encoder_outputs=BaseModelOutput(last_hidden_state=encoded.last_hidden_state),
+                    attention_mask=inputs["attention_mask"],
+                    forced_bos_token_id=bos_id,
+                )
+                decoded = tokenizer.batch_decode(generated, skip_special_tokens=True)
+                for i, text in zip(idxs, decoded):
+                    results[lang][i] = text
+    return results
+
+
 class LocalLLMTranslate(Translator):
+    MEMORY_MB = 800
+
     def __init__(self, model_path="./model"):
         self._pipeline_cache = {}
         self.MODEL_CACHE_DIR = model_path
 
-    def translate(self, text, src_lang,target_lang):
+    def _get_pipeline(self, src_lang, target_lang):
         src = src_lang.lower()
         tgt = target_lang.lower()
         attempts = []
@@ -99,45 +182,45 @@ class LocalLLMTranslate(Translator):
                 for model_variant in ["opus-mt-tc-big-", "opus-mt-"]:
                     model_name = f"Helsinki-NLP/{model_variant}{src_code}-{tgt_code}"
                     pipeline_task = f"translation_{src_code}_to_{tgt_code}"
-                    if key not in self._pipeline_cache:
+                    if (key, self.device) not in self._pipeline_cache:
                         try:
-                            self._pipeline_cache[key] = hf_pipeline(pipeline_task, model=model_name)
+                            self._pipeline_cache[key, self.device] = registry.get_or_load(
+                                ("opus-mt", model_name, self.device, "float32"),
+                                lambda: hf_pipeline(pipeline_task, model=model_name, device=self.device),
+                            )
                         except Exception as e:
                             attempts.append((pipeline_task, model_name, str(e)))
                             continue
-                    translator = self._pipeline_cache.get(key)
+                    translator = self._pipeline_cache.get((key, self.device))
                     if translator:
-                        result = translator(text)
-                        return result[0]["translation_text"]
+                        return translator
 
         # If we get here, all attempts failed
         raise ValueError(
             f"Could not load any HuggingFace model for {src_lang}→{target_lang}. "
             f"Tried: {attempts}"
         )
-    def translate_srt(self, input_srt, output_srt, src_lang, tgt_lang):
-        with open(input_srt, "r", encoding="utf-8") as f:
-            subs = list(srt.parse(f.read()))
-        translated_subs = []
-        for sub in subs:
-            try:
-                text = self.translate(sub.content, src_lang, tgt_lang)
-            except Exception as e:
-                print(f"Translation error: {e}")
-                text = sub.content
-            translated_subs.append(srt.Subtitle(
-                index=sub.index,
-                start=sub.start,
-                end=sub.end,
-                content=text
-            ))
-        with open(output_srt, "w", encoding="utf-8") as f:
-            f.write(srt.compose(translated_subs))
+
+    def translate(self, text, src_lang,target_lang):
+        translator = self._get_pipeline(src_lang, target_lang)
+        result = translator(text)
+        return result[0]["translation_text"]
+
+    def translate_batch(self, texts, src_lang, target_lang, batch_size=16):
+        translator = self._get_pipeline(src_lang, target_lang)
+        return translate_with_pipeline(translator, texts, batch_size=batch_size)
+
+    def warm(self, src_lang, target_lang):
+        self._get_pipeline(src_lang, target_lang)
 
 class NLLBTranslate(Translator):
+    MODEL_ID = "facebook/nllb-200-distilled-600M"
+    MEMORY_MB = 3000
+
     def __init__(self, model_path="./model"):
         self._pipeline_cache = {}
         self.MODEL_CACHE_DIR = model_path
+        self.memory = get_translation_memory(model_path)
 
     LANG_CODE_MAP = {
         "en": "eng_Latn", "fr": "fra_Latn", "es": "spa_Latn",
@@ -145,7 +228,7 @@ class NLLBTranslate(Translator):
         "he": "heb_Hebr", "ar": "arb_Arab", "iw": "heb_Hebr"
     }
 
-    def translate(self, text, src_lang, tgt_lang):
+    def _resolve_codes(self, src_lang, tgt_lang):
         src_key = src_lang.lower()
         tgt_key = tgt_lang.lower()
         if src_key not in self.LANG_CODE_MAP:
@@ -154,96 +237,293 @@ class NLLBTranslate(Translator):
         if tgt_key not in self.LANG_CODE_MAP:
             raise ValueError(
                 f"NLLB: Unsupported or ambiguous tgt_lang '{tgt_lang}'. Use one of: {list(self.LANG_CODE_MAP.keys())}")
-        src = self.LANG_CODE_MAP[src_key]
-        tgt = self.LANG_CODE_MAP[tgt_key]
-        print(f"DEBUG: Using src={src} tgt={tgt} text='{text[:40]}...'", flush=True)
-        key = (src, tgt)
+        return self.LANG_CODE_MAP[src_key], self.LANG_CODE_MAP[tgt_key]
+
+    def _get_pipeline(self, src, tgt):
+        key = (src, tgt, self.device)
         if key not in self._pipeline_cache:
             print(f"Loading NLLB model for {src}->{tgt} ...", flush=True)
             try:
-                self._pipeline_cache[key] = get_pipeline_with_tf_fallback(
+                tokenizer, model = get_shared_seq2seq("nllb", self.MODEL_ID, self.MODEL_CACHE_DIR, self.device)
+                # The pipeline is a thin wrapper; the weights are shared across language pairs and jobs.
+                self._pipeline_cache[key] = hf_pipeline(
                     "translation",
-                    model="facebook/nllb-200-distilled-600M",
+                    model=model,
+                    tokenizer=source_tokenizer(tokenizer, src),
                     src_lang=src,
                     tgt_lang=tgt,
-                    cache_dir=self.MODEL_CACHE_DIR
+                    device=model.device
                 )
             except Exception as e:
                 print(f"Failed to load NLLB pipeline: {e}", flush=True)
                 raise ValueError(f"Failed to load NLLB pipeline: {e}")
-        translator = self._pipeline_cache[key]
-        result = translator(text)
-        return result[0]["translation_text"]
+        return self._pipeline_cache[key]
 
-    def translate_srt(self, input_srt, output_srt, src_lang, tgt_lang):
-        with open(input_srt, "r", encoding="utf-8") as f:
-            subs = list(srt.parse(f.read()))
-        translated_subs = []
-        for i, sub in enumerate(subs, 1):
-            try:
-                print(f"Translating subtitle {i}/{len(subs)}...", flush=True)
-                text = self.translate(sub.content, src_lang, tgt_lang)
-            except Exception as e:
-                print(f"Translation error (subtitle {i}): {e}", flush=True)
-                text = sub.content
-            translated_subs.append(srt.Subtitle(
-                index=sub.index,
-                start=sub.start,
-                end=sub.end,
-                content=text
-            ))
-        with open(output_srt, "w", encoding="utf-8") as f:
-            f.write(srt.compose(translated_subs))
+    def translate(self, text, src_lang, tgt_lang):
+        src, tgt = self._resolve_codes(src_lang, tgt_lang)
+        return cached_translate(
+            self.memory, self.MODEL_ID, src, tgt, [text],
+            lambda missing: [self._get_pipeline(src, tgt)(t)[0]["translation_text"] for t in missing],
+        )[0]
+
+    def translate_batch(self, texts, src_lang, tgt_lang, batch_size=16):
+        src, tgt = self._resolve_codes(src_lang, tgt_lang)
+        return cached_translate(
+            self.memory, self.MODEL_ID, src, tgt, texts,
+            lambda missing: translate_with_pipeline(self._get_pipeline(src, tgt), missing, batch_size=batch_size),
+        )
+
+    def warm(self, src_lang, tgt_lang):
+        self._get_pipeline(*self._resolve_codes(src_lang, tgt_lang))
+
+    def translate_multi(self, texts, src_lang, target_langs, batch_size=16):
+        codes = {lang: self._resolve_codes(src_lang, lang) for lang in target_langs}
+        src = next(iter(codes.values()))[0] if codes else None
+
+        def run(missing, langs):
+            tokenizer, model = get_shared_seq2seq("nllb", self.MODEL_ID, self.MODEL_CACHE_DIR, self.device)
+            tgt_ids = {lang: tokenizer.convert_tokens_to_ids(codes[lang][1]) for lang in langs}
+            return translate_multi_shared_encoder(tokenizer, model, missing, src, tgt_ids, batch_size=batch_size)
+
+        tgt_codes = {lang: tgt for lang, (_, tgt) in codes.items()}
+        return cached_translate_multi(self.memory, self.MODEL_ID, src, tgt_codes, texts, run)
 
 class M2M100Translate(Translator):
+    MODEL_ID = "facebook/m2m100_418M"
+    MEMORY_MB = 2500
+
     def __init__(self, model_path="./model"):
         self._pipeline_cache = {}
         self.MODEL_CACHE_DIR = model_path
+        self.memory = get_translation_memory(model_path)
 
     LANG_CODE_MAP = {
         "en": "en", "fr": "fr", "es": "es", "de": "de", "it": "it",
         "ru": "ru", "he": "he", "ar": "ar"
     }
 
-    def translate(self, text, src_lang, tgt_lang):
+    def _resolve_codes(self, src_lang, tgt_lang):
         src = self.LANG_CODE_MAP.get(src_lang.lower(), src_lang)
         tgt = self.LANG_CODE_MAP.get(tgt_lang.lower(), tgt_lang)
-        key = (src, tgt)
+        return src, tgt
+
+    def _get_pipeline(self, src, tgt):
+        key = (src, tgt, self.device)
         if key not in self._pipeline_cache:
             print(f"Loading M2M100 model for {src}->{tgt} ...", flush=True)
             try:
-                self._pipeline_cache[key] = get_pipeline_with_tf_fallback(
+                tokenizer, model = get_shared_seq2seq("m2m100", self.MODEL_ID, self.MODEL_CACHE_DIR, self.device)
+                # The pipeline is a thin wrapper; the weights are shared across language pairs and jobs.
+                self._pipeline_cache[key] = hf_pipeline(
                     "translation",
-                    model="facebook/m2m100_418M",
+                    model=model,
+                    tokenizer=source_tokenizer(tokenizer, src),
                     src_lang=src,
                     tgt_lang=tgt,
-                    cache_dir=self.MODEL_CACHE_DIR
+                    device=model.device
                 )
             except Exception as e:
                 print(f"Failed to load M2M100 pipeline: {e}", flush=True)
                 raise ValueError(f"Failed to load M2M100 pipeline: {e}")
-        translator = self._pipeline_cache[key]
-        result = translator(text)
-        return result[0]["translation_text"]
+        return self._pipeline_cache[key]
+
+    def translate(self, text, src_lang, tgt_lang):
+        src, tgt = self._resolve_codes(src_lang, tgt_lang)
+        return cached_translate(
+            self.memory, self.MODEL_ID, src, tgt, [text],
+            lambda missing: [self._get_pipeline(src, tgt)(t)[0]["translation_text"] for t in missing],
+        )[0]
+
+    def translate_batch(self, texts, src_lang, tgt_lang, batch_size=16):
+        src, tgt = self._resolve_codes(src_lang, tgt_lang)
+        return cached_translate(
+            self.memory, self.MODEL_ID, src, tgt, texts,
+            lambda missing: translate_with_pipeline(self._get_pipeline(src, tgt), missing, batch_size=batch_size),
+        )
+
+    def warm(self, src_lang, tgt_lang):
+        self._get_pipeline(*self._resolve_codes(src_lang, tgt_lang))
+
+    def translate_multi(self, texts, src_lang, target_langs, batch_size=16):
+        codes = {lang: self._resolve_codes(src_lang, lang) for lang in target_langs}
+        src = next(iter(codes.values()))[0] if codes else None
 
-    def translate_srt(self, input_srt, output_srt, src_lang, tgt_lang):
-        with open(input_srt, "r", encoding="utf-8") as f:
-            subs = list(srt.parse(f.read()))
-        translated_subs = []
-        for i, sub in enumerate(subs, 1):
+        def run(missing, langs):
+            tokenizer, model = get_shared_seq2seq("m2m100", self.MODEL_ID, self.MODEL_CACHE_DIR, self.device)
+            tgt_ids = {lang: tokenizer.get_lang_id(codes[lang][1]) for lang in langs}
+            return translate_multi_shared_encoder(tokenizer, model, missing, src, tgt_ids, batch_size=batch_size)
+
+        tgt_codes = {lang: tgt for lang, (_, tgt) in codes.items()}
+        return cached_translate_multi(self.memory, self.MODEL_ID, src, tgt_codes, texts, run)
+
+
+# ---- CTranslate2 backend: the same models converted once to int8 ----
+
+CT2_QUANTIZATION = os.getenv("CT2_QUANTIZATION", "int8")
+# Weight type at conversion -> compute type on (cpu, cuda); CPUs have no fast float16 kernels
+CT2_COMPUTE_TYPES = {
+    "int8": ("int8", "int8_float16"),
+    "int8_float16": ("int8", "int8_float16"),
+    "int8_bfloat16": ("int8", "int8_bfloat16"),
+    "int16": ("int16", "float16"),
+    "float16": ("float32", "float16"),
+    "bfloat16": ("float32", "bfloat16"),
+    "float32": ("float32", "float32"),
+}
+
+def ct2_compute_type(quantization, device):
+    """CTranslate2 compute type for weights converted as `quantization`, on "cpu" or "cuda"."""
+    if quantization not in CT2_COMPUTE_TYPES:
+        raise ValueError(
+            f"Unsupported CT2_QUANTIZATION '{quantization}'. Use one of: {list(CT2_COMPUTE_TYPES)}")
+    cpu, cuda = CT2_COMPUTE_TYPES[quantization]
+    return cpu if device == "cpu" else cuda
+_CONVERT_LOCK = threading.Lock()
+
+def convert_to_ct2(model_id, cache_dir, quantization=CT2_QUANTIZATION):
+    """
+    CTranslate2 copy of `model_id` under cache_dir/ct2, converted on first use.
+    The HF checkpoint is loaded the usual way (same cache, same fallbacks) and
+    converted from a temporary export; generation defaults are kept next to it.
+    """
+    out = os.path.join(cache_dir, "ct2", f"{model_id.replace('/', '--')}-{quantization}")
+    if os.path.exists(os.path.join(out, "model.bin")):
+        return out
+    with _CONVERT_LOCK:
+        if os.path.exists(os.path.join(out, "model.bin")):
+            return out
+        import ctranslate2
+        print(f"Converting {model_id} to CTranslate2 ({quantization}), once ...", flush=True)
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(out)) as work:
+            tokenizer, model = load_seq2seq(model_id, cache_dir=cache_dir)
+            export = os.path.join(work, "hf")
+            model.save_pretrained(export)
+            tokenizer.save_pretrained(export)
+            generation = {"num_beams": model.generation_config.num_beams or 1,
+                          "max_length": model.generation_config.max_length or 256}
+            del model
+            converted = os.path.join(work, "ct2")
+            ctranslate2.converters.TransformersConverter(export).convert(converted, quantization=quantization)
+            with open(os.path.join(converted, "generation.json"), "w") as f:
+                json.dump(generation, f)
             try:
-                print(f"Translating subtitle {i}/{len(subs)}...", flush=True)
-                text = self.translate(sub.content, src_lang, tgt_lang)
-            except Exception as e:
-                print(f"Translation error (subtitle {i}): {e}", flush=True)
-                text = sub.content
-            translated_subs.append(srt.Subtitle(
-                index=sub.index,
-                start=sub.start,
-                end=sub.end,
-                content=text
-            ))
-        with open(output_srt, "w", encoding="utf-8") as f:
-            f.write(srt.compose(translated_subs))
+                os.replace(converted, out)
+            except OSError:
+                pass  # another process finished the same conversion first
+        return out
+
+class CT2Seq2SeqTranslate:
+    """
+    CTranslate2 inference for the multilingual seq2seq translators. Mixed into
+    NLLBTranslate/M2M100Translate, so language codes, translation memory and the
+    translate/translate_srt behaviour are theirs; only the model call differs.
+    On CPU the weights run in int8, on GPU in int8_float16.
+    """
+    BACKEND = None
+
+    def _target_token(self, tokenizer, code):
+        return code
+
+    @property
+    def _memory_id(self):
+        # int8 output differs slightly from fp32, so it is remembered separately
+        return f"{self.MODEL_ID}@ct2-{CT2_QUANTIZATION}"
+
+    def _tokenizer(self):
+        return registry.get_or_load(
+            (f"{self.BACKEND}-tokenizer", self.MODEL_ID, "cpu", "default"),
+            lambda: load_tokenizer(self.MODEL_ID, cache_dir=self.MODEL_CACHE_DIR),
+        )
+
+    def _ct2(self):
+        """(ctranslate2.Translator, generation defaults) on this translator's device."""
+        device, _, index = self.device.partition(":")
+        compute_type = ct2_compute_type(CT2_QUANTIZATION, device)
+        path = convert_to_ct2(self.MODEL_ID, self.MODEL_CACHE_DIR)
+
+        def load():
+            import ctranslate2
+            with open(os.path.join(path, "generation.json")) as f:
+                generation = json.load(f)
+            translator = ctranslate2.Translator(
+                path, device=device, device_index=int(index or 0), compute_type=compute_type,
+                intra_threads=int(os.getenv("CT2_THREADS", "0")),
+            )
+            return translator, generation
+        return registry.get_or_load(
+            (f"{self.BACKEND}-ct2", self.MODEL_ID, self.device, compute_type), load,
+            size_bytes=directory_size_bytes(path),
+        )
+
+    def _translate_ct2(self, texts, src_code, tgt_codes, batch_size=16):
+        """{lang: [translations]} for tgt_codes {lang: model code}; each batch is tokenized once for all targets."""
+        tokenizer = self._tokenizer()
+        translator, generation = self._ct2()
+        results = {lang: list(texts) for lang in tgt_codes}
+        for idxs in length_sorted_batches(texts, batch_size=batch_size):
+            chunk = [texts[i] for i in idxs]
+            with _TOKENIZER_LOCK:
+                tokenizer.src_lang = src_code
+                sources = [tokenizer.convert_ids_to_tokens(ids)
+                           for ids in tokenizer(chunk, truncation=True)["input_ids"]]
+            for lang, code in tgt_codes.items():
+                outputs = translator.translate_batch(
+                    sources, target_prefix=[[self._target_token(tokenizer, code)]] * len(sources),
+                    beam_size=generation["num_beams"], max_decoding_length=generation["max_length"],
+                    max_batch_size=batch_size,
+                )
+                for i, output in zip(idxs, outputs):
+                    tokens = output.hypotheses[0][1:]  # drop the forced target-language token
+                    results[lang][i] = tokenizer.decode(tokenizer.convert_tokens_to_ids(tokens),
+                                                        skip_special_tokens=True)
+        return results
+
+    def translate(self, text, src_lang, tgt_lang):
+        return self.translate_batch([text], src_lang, tgt_lang)[0]
+
+    def translate_batch(self, texts, src_lang, tgt_lang, batch_size=16):
+        src, tgt = self._resolve_codes(src_lang, tgt_lang)
+        return cached_translate(
+            self.memory, self._memory_id, src, tgt, texts,
+            lambda missing: self._translate_ct2(missing, src, {tgt: tgt}, batch_size=batch_size)[tgt],
+        )
+
+    def translate_multi(self, texts, src_lang, target_langs, batch_size=16):
+        codes = {lang: self._resolve_codes(src_lang, lang) for lang in target_langs}
+        src = next(iter(codes.values()))[0] if codes else None
+        tgt_codes = {lang: tgt for lang, (_, tgt) in codes.items()}
+
+        def run(missing, langs):
+            return self._translate_ct2(missing, src, {lang: tgt_codes[lang] for lang in langs}, batch_size=batch_size)
+        return cached_translate_multi(self.memory, self._memory_id, src, tgt_codes, texts, run)
+
+    def warm(self, src_lang, tgt_lang):
+        self._resolve_codes(src_lang, tgt_lang)
+        self._tokenizer()
+        self._ct2()
+
+class NLLBCT2Translate(CT2Seq2SeqTranslate, NLLBTranslate):
+    BACKEND = "nllb"
+    MEMORY_MB = 1200
+
+class M2M100CT2Translate(CT2Seq2SeqTranslate, M2M100Translate):
+    BACKEND = "m2m100"
+    MEMORY_MB = 1000
+
+    def _target_token(self, tokenizer, code):
+        return tokenizer.get_lang_token(code)
+
+
+def build_translator(translator_type, model_dir):
+    if translator_type == "nllb":
+        return NLLBTranslate(model_dir)
+    elif translator_type == "nllb-ct2":
+        return NLLBCT2Translate(model_dir)
+    elif translator_type == "m2m100-ct2":
+        return M2M100CT2Translate(model_dir)
+    elif translator_type == "localllm":
+        return LocalLLMTranslate(model_dir)
+    return M2M100Translate(model_dir)
 
 # ---- End of module ----
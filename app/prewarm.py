@@ -0,0 +1,138 @@
+# app/prewarm.py
+"""
+Startup prewarming from a declarative profile, a JSON file such as
+warmup.example.json:
+
+    {
+      "whisper": [{"backend": "faster-whisper", "model": "large-v3", "device": "auto"}],
+      "alignment": [{"language": "en", "device": "auto"}],
+      "translators": [{"type": "m2m100", "pairs": [["en", "de"], ["en", "he"]]}]
+    }
+
+Entries are loaded one by one in the background once the ML stack is imported
+(by the startup warm-up, or else by the first job) and pinned in the model registry, so LRU eviction never drops them. Backends,
+model sizes and translator types are the values the upload form sends, so a
+job with the same settings finds everything warm. "device": "auto" is cuda
+when a GPU is visible, else cpu; "cuda" warms the model on every GPU of the
+worker pool (jobs may be placed on any of them), "cuda:1" on that one only.
+Translators take the same key and default to where jobs translate
+(TRANSLATE_DEVICE).
+"""
+import os
+import json
+import time
+import logging
+import threading
+
+from app.ml_stack import cuda_device_count
+from app.pipeline.devices import device_pool, device_kind, translation_kind
+
+logger = logging.getLogger(__name__)
+
+DISABLED, PENDING, RUNNING, DONE = "disabled", "pending", "running", "done"
+
+
+def load_profile(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _devices(spec, translation=False):
+    """Torch devices an entry is loaded on."""
+    device = spec.get("device", "auto")
+    if device == "auto":
+        device = "cuda" if cuda_device_count() else "cpu"
+        if translation:
+            device = translation_kind(device)
+    if ":" in device:
+        return [device]
+    return device_pool.torch_devices(device_kind(device)) or ["cpu"]
+
+
+def plan(profile, model_dir):
+    """[(name, load_fn), ...] for every entry in the profile, in file order."""
+    steps = []
+    for spec in profile.get("whisper", []):
+        backend, size = spec.get("backend", "faster-whisper"), spec["model"]
+        for device in _devices(spec):
+            def load(backend=backend, size=size, device=device):
+                from app.pipeline.transcriber import build_transcriber
+                build_transcriber(model_dir, backend, size, device).warm()
+            steps.append((f"whisper {backend}:{size}@{device}", load))
+
+    for spec in profile.get("alignment", []):
+        language = spec["language"]
+        for device in _devices(spec):
+            def load(language=language, device=device):
+                from app.pipeline.transcriber import load_align_model_cached
+                load_align_model_cached(language, device)
+            steps.append((f"alignment {language}@{device}", load))
+
+    for spec in profile.get("translators", []):
+        translator_type = spec["type"]
+        for device in _devices(spec, translation=True):
+            for src, tgt in spec.get("pairs", []):
+                def load(translator_type=translator_type, src=src, tgt=tgt, device=device):
+                    from app.pipeline.translator import build_translator
+                    translator = build_translator(translator_type, model_dir)
+                    translator.use_device(device)
+                    translator.warm(src, tgt)
+                steps.append((f"translator {translator_type}:{src}-{tgt}@{device}", load))
+    return steps
+
+
+class Prewarmer:
+    def __init__(self, profile_path, model_dir):
+        self.profile_path = profile_path
+        self.model_dir = model_dir
+        self.state = PENDING if profile_path and os.path.exists(profile_path) else DISABLED
+        self.items = []
+        self._lock = threading.Lock()
+
+    def start_in_background(self):
+        """Run the profile on its own thread; used as an ml_stack ready callback, which may fire on a job's thread."""
+        threading.Thread(target=self.run, name="prewarm", daemon=True).start()
+
+    def run(self):
+        """Load every profile entry, pinned. Blocking; failures are recorded and do not stop the rest. Runs once."""
+        with self._lock:
+            if self.state != PENDING:
+                return
+            self.state = RUNNING
+        try:
+            profile = load_profile(self.profile_path)
+            steps = plan(profile, self.model_dir) if profile else []
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Invalid warm-up profile {self.profile_path}: {e}")
+            steps = []
+        with self._lock:
+            self.items = [{"name": name, "state": PENDING, "seconds": None, "error": None} for name, _ in steps]
+        from app.pipeline.model_registry import registry
+
+        for item, (name, load) in zip(self.items, steps):
+            item["state"] = RUNNING
+            started = time.perf_counter()
+            logger.info(f"Prewarming {name}")
+            try:
+                with registry.pinning():
+                    load()
+                item["state"] = DONE
+            except Exception as e:
+                logger.error(f"Prewarming {name} failed: {e}", exc_info=True)
+                item["state"], item["error"] = "failed", str(e)
+            item["seconds"] = round(time.perf_counter() - started, 2)
+        with self._lock:
+            self.state = DONE
+        if steps:
+            failed = sum(1 for item in self.items if item["state"] == "failed")
+            logger.info(f"Prewarming finished: {len(steps) - failed}/{len(steps)} loaded")
+
+    def status(self):
+        with self._lock:
+            return {"state": self.state, "profile": self.profile_path, "items": [dict(i) for i in self.items]}
+
+    def settled(self):
+        """Nothing left to warm: no profile, or the profile has been worked through."""
+        return self.state in (DISABLED, DONE)
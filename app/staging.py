@@ -0,0 +1,196 @@
+# app/staging.py
+import os
+import json
+import zlib
+import time
+import hashlib
+import logging
+import threading
+
+from app.pipeline.transcription_cache import fast_file_hash
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(size, window, crcs):
+    """Identity of a file's bytes: its size plus the CRC32 of every `window`-sized piece, in order."""
+    h = hashlib.sha1(f"{size}:{window}:".encode())
+    for crc in crcs:
+        h.update(int(crc).to_bytes(4, "big"))
+    return h.hexdigest()
+
+
+class StreamingChecksum:
+    """Per-window CRC32s of a stream written front to back; with the upload chunk size as window it matches chunked uploads."""
+
+    def __init__(self, window):
+        self.window = window
+        self.size = 0
+        self.crcs = []
+        self._crc = 0
+        self._filled = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.window - self._filled)
+            self._crc = zlib.crc32(view[:take], self._crc)
+            self._filled += take
+            self.size += take
+            view = view[take:]
+            if self._filled == self.window:
+                self.crcs.append(self._crc)
+                self._crc, self._filled = 0, 0
+
+    def key(self):
+        crcs = self.crcs + ([self._crc] if self._filled else [])
+        return content_key(self.size, self.window, crcs)
+
+
+class StagingArea:
+    """
+    Staged uploads live in one directory on the output filesystem, so handing a
+    file to a job is an os.rename and never a copy.
+
+    `blobs/` is a content-addressed index of hardlinks: the first upload of some
+    content is linked in under its content key, and a later identical upload is
+    replaced by a link to that blob, releasing its own blocks. Blobs whose only
+    remaining link is the index entry are dropped by cleanup().
+    """
+
+    def __init__(self, staging_dir):
+        self.staging_dir = staging_dir
+        self.blob_dir = os.path.join(staging_dir, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.staging_dir, name)
+
+    def find(self, file_id):
+        if not file_id or not all(c.isalnum() for c in file_id):
+            return None
+        prefix = f"analyze_{file_id}."
+        for name in os.listdir(self.staging_dir):
+            if name.startswith(prefix):
+                return self.path(name)
+        return None
+
+    @staticmethod
+    def _same_content(a, b):
+        # The key already covers every byte through the CRCs; also compare sampled bytes.
+        return os.path.getsize(a) == os.path.getsize(b) and fast_file_hash(a) == fast_file_hash(b)
+
+    def dedupe(self, path, key):
+        """Make `path` a hardlink to the stored copy of identical content, or register it. True if deduplicated."""
+        blob = os.path.join(self.blob_dir, key)
+        if os.path.exists(blob):
+            if os.path.samefile(blob, path):
+                return True
+            if self._same_content(blob, path):
+                tmp_path = f"{path}.dedupe"
+                try:
+                    os.link(blob, tmp_path)
+                    os.replace(tmp_path, path)
+                    logger.info(f"Identical upload already stored; {os.path.basename(path)} now links to it")
+                    return True
+                except OSError as e:
+                    logger.warning(f"Could not link to stored copy of {key}: {e}")
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    return False
+            logger.warning(f"Content key collision for {key}; keeping the new file as is")
+            return False
+        try:
+            os.link(path, blob)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            logger.info(f"Upload dedupe index unavailable on this filesystem: {e}")
+        return False
+
+    def content_key_of(self, path):
+        """Content key of a file registered by dedupe(), found through its hardlink in the index; None if it is not there."""
+        try:
+            st = os.stat(path)
+            names = os.listdir(self.blob_dir)
+        except OSError:
+            return None
+        if st.st_nlink <= 1:
+            return None
+        for name in names:
+            try:
+                blob = os.stat(os.path.join(self.blob_dir, name))
+            except OSError:
+                continue
+            if (blob.st_dev, blob.st_ino) == (st.st_dev, st.st_ino):
+                return name
+        return None
+
+    def adopt(self, staged_path, input_path):
+        """
+        Move a staged file to where the job expects it with os.rename, never a copy;
+        if `input_path` is on another filesystem, the job reads the staged file in place.
+        """
+        try:
+            os.rename(staged_path, input_path)
+            return input_path
+        except OSError as e:
+            logger.warning(f"Staging dir is not on the output filesystem ({e}); using {staged_path} in place")
+            return staged_path
+
+    def cleanup(self, max_age_seconds=24 * 3600):
+        now = time.time()
+        for name in os.listdir(self.staging_dir):
+            path = self.path(name)
+            if name.startswith("analyze_") and os.stat(path).st_mtime < now - max_age_seconds:
+                os.remove(path)
+                logger.info(f"Cleaned up old staged file: {name}")
+        for name in os.listdir(self.blob_dir):
+            path = os.path.join(self.blob_dir, name)
+            if os.stat(path).st_nlink <= 1:
+                os.remove(path)
+                logger.info(f"Dropped unreferenced upload blob: {name}")
+
+
+class ProbeCache:
+    """
+    ffprobe results keyed by file identity (device, inode, size, mtime), so the
+    probe /analyze or finalize ran on a staged file is reused by the job after
+    the file is renamed into place. Entries are JSON files, shared by every
+    process using the same staging directory.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(path, variant=""):
+        st = os.stat(path)
+        identity = f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}" + (f":{variant}" if variant else "")
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def get_or_probe(self, path, probe, variant=""):
+        """Cached result for `path`, else `probe(path)` stored for next time. `variant` keeps other per-file results apart."""
+        entry_path = os.path.join(self.cache_dir, f"{self._key(path, variant)}.json")
+        try:
+            with open(entry_path) as f:
+                result = json.load(f)
+            # Same bytes, possibly under a new name since it was probed
+            result.get("format", {})["filename"] = path
+            return result
+        except (OSError, ValueError):
+            pass
+        result = probe(path)
+        tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, entry_path)
+        return result
+
+    def cleanup(self, max_age_seconds=7 * 24 * 3600):
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.stat(path).st_mtime < now - max_age_seconds:
+                os.remove(path)
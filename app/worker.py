@@ -0,0 +1,103 @@
+# app/worker.py
+"""
+Pipeline worker: runs queued jobs outside the API process.
+
+    JOB_RUNNER=external uvicorn app.main:app ...     # API: uploads, enqueue, status
+    python -m app.worker --concurrency 2             # one or more per node
+
+The broker is the SQLite job table in OUTPUT_DIR (jobs.sqlite3). Claims are
+atomic, so any number of workers on any node sharing OUTPUT_DIR can pull from
+it. Workers write status files next to the outputs and the API serves them.
+Every worker heartbeats into the table. If a worker stops heartbeating for
+WORKER_TIMEOUT_SECONDS, its running jobs are queued again. SIGTERM/SIGINT hand
+this worker's running jobs back at once and stop the ffmpeg processes they
+started (SIGTERM, then SIGKILL after WORKER_STOP_TIMEOUT_SECONDS). The next run
+skips the stages the job's checkpoint records as finished.
+"""
+import os
+import sys
+import signal
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def serve_metrics(port, render):
+    """Prometheus text from `render()` on http://0.0.0.0:port/metrics, on a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued subtitle jobs from the shared job table.")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="jobs run at once (default JOB_MAX_CONCURRENCY, 4)")
+    parser.add_argument("--name", default=None, help="worker name in the job table (default host:pid)")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="import the ML stack with the first job instead of at startup")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve this worker's Prometheus metrics on this port")
+    args = parser.parse_args(argv)
+
+    # Not the API's app.log: two processes rotating one file lose lines. Set LOG_FILE per worker on a shared host.
+    os.environ.setdefault("LOG_FILE", "worker.log")
+    from app import main as api
+    from app.pipeline.metrics import metrics
+    from app.pipeline.devices import device_pool
+    from app.pipeline.processes import terminate_children
+
+    queue = api.job_queue
+    if args.concurrency:
+        queue.max_concurrent = args.concurrency
+    if args.name:
+        queue.worker_name = args.name
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if args.metrics_port:
+        def render():
+            extra = {f'device_reserved_bytes{{device="{d["device"]}"}}': d["reserved_mb"] * 1024 * 1024
+                     for d in device_pool.snapshot()}
+            extra["subtitle_worker_running_jobs"] = len(queue.running())
+            return metrics.render_prometheus(extra)
+        serve_metrics(args.metrics_port, render)
+
+    api.start_job_runner(warm_up=not args.no_warmup)
+    api.logger.info(f"Worker {queue.worker_name} started (concurrency {queue.max_concurrent}, "
+                    f"jobs table {queue.store.db_path})")
+    while not stopping.wait(1.0):
+        pass
+
+    api.logger.info(f"Worker {queue.worker_name} stopping")
+    queue.shutdown()
+    # Job threads are daemons and their jobs are already back in the queue; end the ffmpeg
+    # processes they started so nothing keeps writing outputs for a job another worker now owns.
+    stopped = terminate_children(timeout=float(os.getenv("WORKER_STOP_TIMEOUT_SECONDS", "10")))
+    if stopped:
+        api.logger.info(f"Worker {queue.worker_name} stopped {stopped} running ffmpeg process(es)")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
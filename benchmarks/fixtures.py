@@ -0,0 +1,113 @@
+# benchmarks/fixtures.py
+"""
+Synthetic media for the benchmarks, generated locally with ffmpeg's lavfi
+sources so nothing is downloaded and runs are reproducible. Names carry
+the duration and frame size, so fixtures are reused across runs:
+
+- audio_*.wav         16kHz mono tone, on for 3s / off for 1s (gives silence detection and VAD real gaps)
+- clean_*.mp4         solid-colour H.264 + AAC video with that soundtrack
+- burned_*.mp4        the same with drawtext captions in the bottom band, i.e. "burned-in subtitles"
+- subs_*.srt          English cues covering the whole duration
+"""
+import os
+import random
+import logging
+import subprocess
+
+import srt
+
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while we wait for the train to arrive "
+    "she said that nothing would change until morning and then everyone went home "
+    "please bring the documents to the office before noon tomorrow"
+).split()
+
+
+def _ffmpeg(args):
+    subprocess.run(["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"] + args, check=True)
+
+
+def _tone(duration):
+    return f"aevalsrc='0.3*sin(2*PI*440*t)*lt(mod(t\\,4)\\,3)':s=16000:d={duration}"
+
+
+def make_audio(path, duration):
+    _ffmpeg(["-f", "lavfi", "-i", _tone(duration), "-ac", "1", "-c:a", "pcm_s16le", path])
+    return path
+
+
+def make_video(path, duration, size="1280x720", rate=25, captions=False, fontfile=None):
+    vf = "format=yuv420p"
+    if captions:
+        font = f"fontfile='{fontfile}':" if fontfile else ""
+        vf = (
+            f"drawtext={font}text='Subtitle line %{{eif\\:floor(t/3)\\:d}} is on screen now'"
+            ":fontsize=h/16:fontcolor=white:box=1:boxcolor=black@0.6:boxborderw=8"
+            ":x=(w-tw)/2:y=h-th-h/20," + vf
+        )
+    _ffmpeg([
+        "-f", "lavfi", "-i", f"color=c=0x203040:s={size}:r={rate}:d={duration}",
+        "-f", "lavfi", "-i", _tone(duration),
+        "-vf", vf, "-c:v", "libx264", "-preset", "veryfast", "-g", str(rate * 2),
+        "-c:a", "aac", "-shortest", path,
+    ])
+    return path
+
+
+def make_srt(path, duration, cue_seconds=3.0, seed=0):
+    rng = random.Random(seed)
+    subs = []
+    t = 0.0
+    while t + cue_seconds <= duration:
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 12))).capitalize() + "."
+        subs.append(srt.Subtitle(
+            index=len(subs) + 1,
+            start=srt.timedelta(seconds=t),
+            end=srt.timedelta(seconds=t + cue_seconds - 0.2),
+            content=text,
+        ))
+        t += cue_seconds
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(srt.compose(subs))
+    return path
+
+
+def make_segments(count, seed=0):
+    """Whisper-style segment dicts, for benchmarking SRT building without a model."""
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    for _ in range(count):
+        length = rng.uniform(1.0, 8.0)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 40)))
+        segments.append({"start": t, "end": t + length, "text": " " + text})
+        t += length + rng.uniform(0.0, 1.0)
+    return segments
+
+
+def make_fixtures(work_dir, duration=30, size="1280x720", fontfile=None):
+    """Create (or reuse) every fixture in `work_dir`; returns {name: path}. Fixtures ffmpeg cannot build are left out."""
+    os.makedirs(work_dir, exist_ok=True)
+    tag = f"{duration}s_{size}"
+    builders = {
+        "audio": (f"audio_{tag}.wav", lambda p: make_audio(p, duration)),
+        "clean_video": (f"clean_{tag}.mp4", lambda p: make_video(p, duration, size)),
+        "burned_video": (f"burned_{tag}.mp4", lambda p: make_video(p, duration, size, captions=True, fontfile=fontfile)),
+        "srt": (f"subs_{tag}.srt", lambda p: make_srt(p, duration)),
+    }
+    fixtures = {}
+    for name, (filename, build) in builders.items():
+        path = os.path.join(work_dir, filename)
+        if not os.path.exists(path):
+            partial = os.path.join(work_dir, f"partial_{filename}")
+            try:
+                os.replace(build(partial), path)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Could not build fixture {name}: {e}")
+                if os.path.exists(partial):
+                    os.remove(partial)
+                continue
+        fixtures[name] = path
+    return fixtures
@@ -0,0 +1,341 @@
+# benchmarks/run.py
+"""
+Throughput of each pipeline stage on synthetic media (see fixtures.py).
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --only analyze_media,burn --repeat 5
+    python -m benchmarks.run --out new.json --baseline old.json
+
+Runs CPU-only with the smallest models (Whisper tiny, opus-mt, M2M100 418M,
+NLLB 600M distilled) from MODEL_DIR. Hugging Face is kept offline unless
+--allow-download, and the translation memory is disabled so every run
+translates for real. A stage whose tool, library or model is missing is
+reported as skipped rather than failing the run.
+
+The JSON has one entry per measurement with every repeat's wall time, the
+median, and throughput in the entry's unit per second (media_seconds per
+second is the realtime factor).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+from benchmarks.fixtures import make_fixtures, make_segments
+
+BENCHMARKS = {}
+
+ENCODERS = {"cpu": "libx264", "cuda": "h264_nvenc", "videotoolbox": "h264_videotoolbox"}
+TRANSLATORS = {"localllm": "LocalLLMTranslate", "m2m100": "M2M100Translate", "nllb": "NLLBTranslate",
+               "m2m100-ct2": "M2M100CT2Translate", "nllb-ct2": "NLLBCT2Translate"}
+
+
+class Skip(Exception):
+    pass
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+class Context:
+    def __init__(self, args, fixtures, work_dir):
+        self.args = args
+        self.fixtures = fixtures
+        self.work_dir = work_dir
+        self.repeat = args.repeat
+        self.duration = args.duration
+
+    def fixture(self, name):
+        if name not in self.fixtures:
+            raise Skip(f"fixture {name} unavailable (is ffmpeg installed?)")
+        return self.fixtures[name]
+
+    def out(self, name):
+        return os.path.join(self.work_dir, name)
+
+
+def measure(fn, repeat, warmup=0):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def result(name, times, work, unit, **extra):
+    median = statistics.median(times)
+    return {
+        "name": name, "status": "ok",
+        "seconds": [round(t, 4) for t in times],
+        "median_seconds": round(median, 4), "min_seconds": round(min(times), 4),
+        "work": work, "unit": unit,
+        "throughput": round(work / median, 3) if median else None,
+        **extra,
+    }
+
+
+def not_run(name, status, reason):
+    return {"name": name, "status": status, "reason": reason}
+
+
+# ---- benchmarks ----
+
+@benchmark("analyze_media")
+def bench_analyze_media(ctx):
+    from app.pipeline.FFmpegBurner import analyze_media
+    video = ctx.fixture("clean_video")
+    yield result("analyze_media", measure(lambda: analyze_media(video), ctx.repeat * 5, warmup=1), 1, "files")
+
+
+@benchmark("detect_burned_in_subs")
+def bench_detect_burned_in_subs(ctx):
+    from app.auto_subtitles import AutoSubtitlePipeline
+    detector = AutoSubtitlePipeline(transcriber=None)
+    for fixture in ("clean_video", "burned_video"):
+        name = f"detect_burned_in_subs[{fixture}]"
+        try:
+            video = ctx.fixture(fixture)
+        except Skip as e:
+            yield not_run(name, "skipped", str(e))
+            continue
+        detected = []
+        times = measure(lambda: detected.append(detector.detect_burned_in_subs(video)), ctx.repeat)
+        yield result(name, times, ctx.duration, "media_seconds", detected=detected[-1])
+
+
+def available_encoders():
+    proc = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True)
+    return {line.split()[1] for line in proc.stdout.splitlines() if len(line.split()) > 1}
+
+
+@benchmark("burn")
+def bench_burn(ctx):
+    from app.pipeline.FFmpegBurner import burn
+    video, srt_path = ctx.fixture("clean_video"), ctx.fixture("srt")
+    encoders = available_encoders()
+    for device in ctx.args.devices.split(","):
+        name = f"burn[{device}]"
+        encoder = ENCODERS.get(device, "libx264")
+        if encoder not in encoders:
+            yield not_run(name, "skipped", f"ffmpeg has no {encoder} encoder")
+            continue
+        out = ctx.out(f"burn_{device}.mp4")
+        try:
+            times = measure(lambda: burn(video, srt_path, out, device=device), ctx.repeat)
+        except subprocess.CalledProcessError as e:
+            # Encoder compiled in but no usable hardware
+            yield not_run(name, "skipped", f"{encoder} failed: {e}")
+            continue
+        yield result(name, times, ctx.duration, "media_seconds", encoder=encoder)
+
+
+@benchmark("mux")
+def bench_mux(ctx):
+    from app.pipeline.FFmpegBurner import mux_multiple_srts_into_mkv
+    video, srt_path = ctx.fixture("clean_video"), ctx.fixture("srt")
+    tracks = [(lang, srt_path) for lang in ("und", "de", "fr")]
+    times = measure(lambda: mux_multiple_srts_into_mkv(video, tracks, ctx.out("mux.mkv")), ctx.repeat)
+    yield result("mux_multiple_srts_into_mkv", times, ctx.duration, "media_seconds", tracks=len(tracks))
+
+
+@benchmark("create_srt")
+def bench_create_srt(ctx):
+    from app.auto_subtitles import AutoSubtitlePipeline
+    pipeline = AutoSubtitlePipeline(transcriber=None)
+    segments = make_segments(ctx.args.segments)
+    times = measure(lambda: pipeline.create_srt(segments, "en", ctx.out("create.srt")), ctx.repeat, warmup=1)
+    yield result("create_srt", times, len(segments), "segments")
+
+
+@benchmark("transcribe")
+def bench_transcribe(ctx):
+    audio = ctx.fixture("audio")
+    try:
+        from app.pipeline.transcriber import FasterWhisperTranscriber, OpenAIWhisperTranscriber
+    except ImportError as e:
+        yield not_run("transcribe", "skipped", str(e))
+        return
+    for backend in ("faster-whisper", "openai-whisper"):
+        name = f"transcribe[{backend}:{ctx.args.whisper_model}]"
+        cls = FasterWhisperTranscriber if backend == "faster-whisper" else OpenAIWhisperTranscriber
+        transcriber = cls(ctx.args.model_dir, backend, ctx.args.whisper_model, "cpu")
+        weights = "model.bin" if backend == "faster-whisper" else f"{ctx.args.whisper_model}.pt"
+        if not ctx.args.allow_download and not os.path.exists(os.path.join(transcriber.get_model_path(), weights)):
+            yield not_run(name, "skipped", f"{weights} not in {transcriber.get_model_path()} (use --allow-download)")
+            continue
+        try:
+            # The first call loads the model; it is reported separately from the warm runs.
+            load_seconds = measure(lambda: transcriber.transcribe(audio, language="en", align_output=False), 1)[0]
+        except Exception as e:
+            yield not_run(name, "skipped", f"model unavailable: {e}")
+            continue
+        times = measure(lambda: transcriber.transcribe(audio, language="en", align_output=False), ctx.repeat)
+        yield result(name, times, ctx.duration, "media_seconds", first_call_seconds=round(load_seconds, 3))
+
+
+@benchmark("translate_srt")
+def bench_translate_srt(ctx):
+    srt_path = ctx.fixture("srt")
+    try:
+        from app.pipeline import translator as translators
+    except ImportError as e:
+        yield not_run("translate_srt", "skipped", str(e))
+        return
+    with open(srt_path, encoding="utf-8") as f:
+        cues = f.read().count(" --> ")
+    for translator_type in ctx.args.translators.split(","):
+        name = f"translate_srt[{translator_type}:en-{ctx.args.target_lang}]"
+        if translator_type not in TRANSLATORS:
+            yield not_run(name, "error", f"unknown translator; use one of {','.join(TRANSLATORS)}")
+            continue
+        translator = getattr(translators, TRANSLATORS[translator_type])(ctx.args.model_dir)
+        out = ctx.out(f"translated_{translator_type}.srt")
+        try:
+            load_seconds = measure(lambda: translator.translate_batch(["Warm up."], "en", ctx.args.target_lang), 1)[0]
+        except Exception as e:
+            yield not_run(name, "skipped", f"model unavailable: {e}")
+            continue
+        times = measure(lambda: translator.translate_srt(srt_path, out, "en", ctx.args.target_lang), ctx.repeat)
+        yield result(name, times, cues, "cues", first_call_seconds=round(load_seconds, 3))
+
+
+# ---- driver ----
+
+def environment():
+    def command_output(cmd):
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True).stdout.strip() or None
+        except OSError:
+            return None
+
+    env = {
+        "git_commit": command_output(["git", "rev-parse", "HEAD"]),
+        "git_describe": command_output(["git", "describe", "--always", "--dirty"]),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": (command_output(["ffmpeg", "-version"]) or "").split("\n")[0] or None,
+    }
+    for module in ("torch", "transformers", "whisperx", "whisper", "ctranslate2"):
+        mod = sys.modules.get(module)
+        if mod is not None:
+            env[module] = getattr(mod, "__version__", "unknown")
+    return env
+
+
+def compare(results, baseline, threshold):
+    """Print median-time ratios against a previous run to stderr; returns the names that got slower than `threshold`."""
+    previous = {r["name"]: r for r in baseline.get("results", []) if r.get("status") == "ok"}
+    regressions = []
+    # stderr, like the other [bench] lines: without --out, stdout carries the JSON report
+    print(f"\n{'benchmark':<48} {'baseline':>10} {'now':>10} {'ratio':>7}", file=sys.stderr)
+    for r in results:
+        before = previous.get(r["name"])
+        if r.get("status") != "ok" or before is None:
+            continue
+        ratio = r["median_seconds"] / before["median_seconds"] if before["median_seconds"] else float("inf")
+        flag = "  SLOWER" if ratio > 1 + threshold else ""
+        print(f"{r['name']:<48} {before['median_seconds']:>10.3f} {r['median_seconds']:>10.3f} {ratio:>7.2f}{flag}",
+              file=sys.stderr)
+        if flag:
+            regressions.append(r["name"])
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--only", help=f"comma-separated subset of: {','.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--duration", type=int, default=30, help="length of the synthetic media in seconds")
+    parser.add_argument("--size", default="1280x720", help="frame size of the synthetic video")
+    parser.add_argument("--segments", type=int, default=2000, help="segments fed to create_srt")
+    parser.add_argument("--devices", default="cpu,cuda,videotoolbox", help="burn device branches to try")
+    parser.add_argument("--translators", default="localllm,m2m100,nllb")
+    parser.add_argument("--target-lang", default="de")
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR", "model"))
+    parser.add_argument("--fixtures-dir", default=os.path.join("outputs", "bench_fixtures"),
+                        help="generated media is cached here between runs")
+    parser.add_argument("--fontfile", help="font for the drawtext captions, if fontconfig has no default")
+    parser.add_argument("--allow-download", action="store_true", help="let Hugging Face fetch missing models")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio over baseline that counts as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Before any pipeline import: measure the models, not the translation memory or the network.
+    os.environ["TRANSLATION_MEMORY"] = "0"
+    if not args.allow_download:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    if not shutil.which("ffmpeg"):
+        print("[bench] ffmpeg not found; only the stages that need no media will run", file=sys.stderr)
+    fixtures = make_fixtures(args.fixtures_dir, args.duration, args.size, args.fontfile)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_") as work_dir:
+        ctx = Context(args, fixtures, work_dir)
+        for name in selected:
+            print(f"[bench] {name} ...", file=sys.stderr, flush=True)
+            try:
+                for entry in BENCHMARKS[name](ctx):
+                    results.append(entry)
+                    summary = f"{entry['median_seconds']:.3f}s median" if entry["status"] == "ok" else f"{entry['status']}: {entry['reason']}"
+                    print(f"[bench]   {entry['name']}: {summary}", file=sys.stderr, flush=True)
+            except Skip as e:
+                results.append(not_run(name, "skipped", str(e)))
+                print(f"[bench]   skipped: {e}", file=sys.stderr, flush=True)
+            except Exception as e:
+                results.append(not_run(name, "error", f"{type(e).__name__}: {e}"))
+                print(f"[bench]   error: {e}", file=sys.stderr, flush=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "fixtures": {name: os.path.basename(path) for name, path in fixtures.items()},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"[bench] Results written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
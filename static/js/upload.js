@@ -16,6 +16,7 @@ document.addEventListener('DOMContentLoaded', () => {
   const analyzeProgress = document.getElementById('analyze-progress');
 
   let currentFileId = null;
+  let currentUpload = null;  // in-flight chunked upload of the selected file
 
   const modelsByBackend = {
     'faster-whisper': ['tiny', 'base', 'small', 'medium', 'large-v1', 'large-v2', 'large-v3', 'large'],
@@ -40,18 +41,161 @@ document.addEventListener('DOMContentLoaded', () => {
   modelTypeSelect.addEventListener('change', updateModelOptions);
   updateModelOptions();
 
+  // ---- CHUNKED UPLOAD ----
+  // init -> PUT chunks in parallel at their offsets -> finalize. Re-selecting the same
+  // file after a dropped connection (or a server restart) resumes with the missing chunks.
+  const UPLOAD_PARALLELISM = 4;
+  const CHUNK_RETRIES = 5;
+
+  const CRC_TABLE = (() => {
+    const table = new Uint32Array(256);
+    for (let n = 0; n < 256; n++) {
+      let c = n;
+      for (let k = 0; k < 8; k++) c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+      table[n] = c >>> 0;
+    }
+    return table;
+  })();
+
+  function crc32(bytes, crc = 0) {
+    crc = ~crc >>> 0;
+    for (let i = 0; i < bytes.length; i++) crc = CRC_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+    return (~crc) >>> 0;
+  }
+
+  function combineCrcs(crcs) {
+    // Same as combine_crcs() on the server: CRC32 over the big-endian chunk CRCs in order.
+    let digest = 0;
+    for (const c of crcs) {
+      digest = crc32(new Uint8Array([c >>> 24, (c >>> 16) & 0xFF, (c >>> 8) & 0xFF, c & 0xFF]), digest);
+    }
+    return digest.toString(16).padStart(8, '0');
+  }
+
+  async function postForm(url, fields) {
+    const body = new FormData();
+    for (const [k, v] of Object.entries(fields)) body.append(k, v);
+    const res = await fetch(url, { method: 'POST', body });
+    const data = await res.json();
+    if (!res.ok || data.error) throw new Error(data.error || `Server error: ${res.status}`);
+    return data;
+  }
+
+  const PROBE_EVERY_CHUNKS = 4;
+
+  async function chunkedUpload(file, onProgress, onTracks) {
+    const session = await postForm('/uploads', {
+      filename: file.name,
+      size: file.size,
+      resume_key: `${file.name}:${file.size}:${file.lastModified}`
+    });
+    const { upload_id, chunk_size, chunks } = session;
+    const received = new Set(session.received);
+    const crcs = new Array(chunks);
+    let sent = 0;
+    for (const i of received) sent += Math.min(chunk_size, file.size - i * chunk_size);
+    onProgress(sent, file.size);
+
+    // Chunks go front to back, so the contiguous prefix the server can probe (container
+    // headers first) grows as fast as possible while the rest uploads.
+    const order = Array.from({ length: chunks }, (_, i) => i);
+    let present = received.size;
+    let probed = !onTracks, probing = false, probeAt = Math.min(2, chunks);
+
+    async function maybeProbe() {
+      if (probed || probing || present < probeAt) return;
+      probing = true;
+      try {
+        const res = await fetch(`/uploads/${upload_id}/tracks`);
+        const data = await res.json();
+        if (data.ready) {
+          probed = true;
+          onTracks(data);
+        } else {
+          probeAt = present + PROBE_EVERY_CHUNKS;
+        }
+      } catch (err) {
+        probeAt = present + PROBE_EVERY_CHUNKS;
+      } finally {
+        probing = false;
+      }
+    }
+    maybeProbe();
+
+    async function sendChunk(i) {
+      const offset = i * chunk_size;
+      const bytes = new Uint8Array(await file.slice(offset, offset + chunk_size).arrayBuffer());
+      crcs[i] = crc32(bytes);
+      if (received.has(i)) return;
+      for (let attempt = 0; ; attempt++) {
+        try {
+          const res = await fetch(`/uploads/${upload_id}?offset=${offset}`, {
+            method: 'PUT',
+            headers: { 'X-Chunk-CRC32': crcs[i].toString(16).padStart(8, '0') },
+            body: bytes
+          });
+          if (!res.ok) throw new Error(`Chunk ${i} failed: ${res.status}`);
+          break;
+        } catch (err) {
+          if (attempt >= CHUNK_RETRIES) throw err;
+          await new Promise(r => setTimeout(r, 1000 * 2 ** attempt));
+        }
+      }
+      sent += bytes.length;
+      present++;
+      onProgress(sent, file.size);
+      maybeProbe();
+    }
+
+    let next = 0;
+    const workers = Array.from({ length: Math.min(UPLOAD_PARALLELISM, chunks) }, async () => {
+      while (next < chunks) await sendChunk(order[next++]);
+    });
+    await Promise.all(workers);
+    return postForm(`/uploads/${upload_id}/finalize`, { checksum: combineCrcs(crcs) });
+  }
+
   // ---- TRACK ANALYSIS LOGIC ----
+  function showTracks(tracks) {
+    audioTrackSelect.innerHTML = '';
+    subtitleTrackSelect.innerHTML = '<option value="">None</option>';
+
+    let audioCount = 0, subCount = 0;
+    tracks.forEach(track => {
+      if (track.type === 'audio') {
+        const label = `#${track.index} - ${track.lang || 'und'} [${track.codec}]${track.default ? ' (default)' : ''}`;
+        const opt = document.createElement('option');
+        opt.value = track.index;
+        opt.textContent = label;
+        audioTrackSelect.appendChild(opt);
+        audioCount++;
+      } else if (track.type === 'subtitle') {
+        const label = `#${track.index} - ${track.lang || 'und'} [${track.codec}]${track.default ? ' (default)' : ''}`;
+        const opt = document.createElement('option');
+        opt.value = track.index;
+        opt.textContent = label;
+        subtitleTrackSelect.appendChild(opt);
+        subCount++;
+      }
+    });
+    if (audioCount + subCount > 0) {
+      trackSelectors.style.display = "";
+      console.log(`Found ${audioCount} audio track(s) and ${subCount} subtitle track(s)`);
+    } else {
+      trackSelectors.style.display = "none";
+      console.log('No audio or subtitle tracks found');
+    }
+  }
+
   const fileInput = document.getElementById('file-input');
   fileInput.addEventListener('change', async (e) => {
     const file = fileInput.files[0];
     currentFileId = null;
+    currentUpload = null;
     if (!file) {
       trackSelectors.style.display = "none";
       return;
     }
-    const formData = new FormData();
-    formData.append('file', file);
-
     // Reset dropdowns and show progress
     const fileSizeMB = (file.size / (1024 * 1024)).toFixed(2);
     audioTrackSelect.innerHTML = `<option>Preparing...</option>`;
@@ -62,75 +206,26 @@ document.addEventListener('DOMContentLoaded', () => {
     analyzeProgress.textContent = `Uploading ${fileSizeMB}MB - 0%`;
     console.log(`Starting file analysis for ${file.name} (${fileSizeMB}MB)...`);
 
+    let tracksShown = false;
     try {
-      // Use XMLHttpRequest for progress tracking
-      const data = await new Promise((resolve, reject) => {
-        const xhr = new XMLHttpRequest();
-
-        xhr.upload.addEventListener('progress', (e) => {
-          if (e.lengthComputable) {
-            const percentComplete = Math.round((e.loaded / e.total) * 100);
-            const loadedMB = (e.loaded / (1024 * 1024)).toFixed(1);
-            analyzeProgress.textContent = `Uploading: ${percentComplete}% (${loadedMB}MB / ${fileSizeMB}MB)`;
-            audioTrackSelect.innerHTML = `<option>Uploading: ${percentComplete}%</option>`;
-            console.log(`Upload progress: ${percentComplete}%`);
-          }
-        });
-
-        xhr.addEventListener('load', () => {
-          if (xhr.status === 200) {
-            analyzeProgress.textContent = 'Processing file...';
-            audioTrackSelect.innerHTML = '<option>Processing file...</option>';
-            console.log('Upload complete, analyzing...');
-            try {
-              resolve(JSON.parse(xhr.responseText));
-            } catch (err) {
-              reject(new Error('Failed to parse response'));
-            }
-          } else {
-            reject(new Error(`Server error: ${xhr.status}`));
-          }
-        });
-
-        xhr.addEventListener('error', () => reject(new Error('Network error')));
-        xhr.addEventListener('abort', () => reject(new Error('Upload aborted')));
-
-        xhr.open('POST', '/analyze');
-        xhr.send(formData);
+      currentUpload = chunkedUpload(file, (sent, total) => {
+        const percentComplete = Math.round((sent / total) * 100);
+        const loadedMB = (sent / (1024 * 1024)).toFixed(1);
+        analyzeProgress.textContent = `Uploading: ${percentComplete}% (${loadedMB}MB / ${fileSizeMB}MB)`;
+        if (!tracksShown) audioTrackSelect.innerHTML = `<option>Uploading: ${percentComplete}%</option>`;
+      }, (early) => {
+        // Tracks are known before the upload finishes; the selection stays as the user sets it.
+        console.log('Early track analysis:', early);
+        tracksShown = true;
+        showTracks(early.tracks);
+        analyzeStatus.style.display = "";
       });
+      const data = await currentUpload;
 
       console.log('Analysis complete:', data);
       currentFileId = data.file_id;
-      // Clear loading indicators
       analyzeStatus.style.display = "none";
-      audioTrackSelect.innerHTML = '';
-      subtitleTrackSelect.innerHTML = '<option value="">None</option>';
-
-      let audioCount = 0, subCount = 0;
-      data.tracks.forEach(track => {
-        if (track.type === 'audio') {
-          const label = `#${track.index} - ${track.lang || 'und'} [${track.codec}]${track.default ? ' (default)' : ''}`;
-          const opt = document.createElement('option');
-          opt.value = track.index;
-          opt.textContent = label;
-          audioTrackSelect.appendChild(opt);
-          audioCount++;
-        } else if (track.type === 'subtitle') {
-          const label = `#${track.index} - ${track.lang || 'und'} [${track.codec}]${track.default ? ' (default)' : ''}`;
-          const opt = document.createElement('option');
-          opt.value = track.index;
-          opt.textContent = label;
-          subtitleTrackSelect.appendChild(opt);
-          subCount++;
-        }
-      });
-      if (audioCount + subCount > 0) {
-        trackSelectors.style.display = "";
-        console.log(`Found ${audioCount} audio track(s) and ${subCount} subtitle track(s)`);
-      } else {
-        trackSelectors.style.display = "none";
-        console.log('No audio or subtitle tracks found');
-      }
+      if (!tracksShown) showTracks(data.tracks);
     } catch (err) {
       console.error("Track analysis failed:", err);
       analyzeProgress.textContent = 'Analysis failed: ' + err.message;
@@ -182,12 +277,34 @@ document.addEventListener('DOMContentLoaded', () => {
     }
     thisProgress.innerText = currentFileId ? `Staging ${file.name}...` : `Uploading ${file.name}...`;
 
-    const formData = new FormData();
-    if (currentFileId) {
-      formData.append('file_id', currentFileId);
-    } else {
-      formData.append('file', file);
+    let fileId = currentFileId;
+    if (!fileId && currentUpload) {
+      thisProgress.innerText = `Finishing upload of ${file.name}...`;
+      try {
+        fileId = (await currentUpload).file_id;
+      } catch (err) {
+        console.error(err);  // retried below; the upload resumes from the chunks already sent
+      }
     }
+    if (!fileId) {
+      try {
+        const staged = await chunkedUpload(file, (sent, total) => {
+          thisProgress.innerText = `Uploading ${file.name}... ${Math.round((sent / total) * 100)}%`;
+        });
+        fileId = staged.file_id;
+      } catch (err) {
+        console.error(err);
+        thisProgress.innerText = 'Upload failed: ' + err.message + ' (select the file again to resume)';
+        thisProgress.style.color = "red";
+        return;
+      }
+    }
+    // The staged file is consumed by this job; a new submit needs a new upload.
+    currentFileId = null;
+    currentUpload = null;
+
+    const formData = new FormData();
+    formData.append('file_id', fileId);
     formData.append('langs', langs);
     formData.append('original_lang', original_lang);
     formData.append('model', model);
@@ -216,7 +333,7 @@ document.addEventListener('DOMContentLoaded', () => {
         return;
       }
       thisProgress.innerText = `Processing ${file.name}...`;
-      await checkStatus(data.job_id, file.name, thisProgress);
+      watchJob(data.job_id, file.name, thisProgress);
     } catch (err) {
       console.error(err);
       thisProgress.innerText = 'Upload failed.';
@@ -224,42 +341,88 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   };
 
+  // Renders one status payload (same shape from /events and /status); returns true once the job has ended.
+  function renderStatus(data, inputFileName, thisProgress) {
+    if (data.status === 'done') {
+      thisProgress.innerHTML = `<span style="color:green;font-weight:bold">Done! (${inputFileName})</span>`;
+      resultsTable.style.display = ''; // show the table if hidden
+
+      let firstRow = true;
+      const nOutputs = Object.keys(data.outputs).length;
+      for (const [label, fullOutputFileName] of Object.entries(data.outputs)) {
+        if (!fullOutputFileName || typeof fullOutputFileName !== 'string') continue;
+        const tr = document.createElement('tr');
+        if (firstRow) {
+          tr.innerHTML = `
+            <td rowspan="${nOutputs}">${inputFileName}</td>
+            <td>${label}</td>
+            <td>${fullOutputFileName}</td>
+            <td><a href="/download/${fullOutputFileName}" target="_blank">Download</a></td>
+            <td rowspan="${nOutputs}">${data.duration_seconds || ''}</td>
+          `;
+          firstRow = false;
+        } else {
+          tr.innerHTML = `
+            <td>${label}</td>
+            <td>${fullOutputFileName}</td>
+            <td><a href="/download/${fullOutputFileName}" target="_blank">Download</a></td>
+          `;
+        }
+        resultsTbody.appendChild(tr);
+      }
+      return true;
+    } else if (data.status === 'failed' || data.status === 'not_found') {
+      thisProgress.innerText = 'Processing failed.';
+      thisProgress.style.color = "red";
+      return true;
+    } else if (data.status === 'queued') {
+      const position = data.queue_position ? ` (position ${data.queue_position})` : '';
+      thisProgress.innerText = `Queued ${inputFileName}...${position}`;
+      return false;
+    }
+
+    const details = [];
+    if (data.stage) details.push(data.stage.replace(/_/g, ' '));
+    if (data.audio_seconds && data.transcribed_seconds != null) {
+      details.push(`audio ${Math.min(100, Math.round((data.transcribed_seconds / data.audio_seconds) * 100))}%`);
+    }
+    if (data.segments_transcribed != null) {
+      details.push(`${data.segments_transcribed} transcribed, ${data.segments_translated || 0} translated`);
+    }
+    const encodes = Object.entries(data.encode_progress || {})
+      .map(([label, pct]) => `${label} ${Math.round(pct)}%`);
+    if (encodes.length) details.push('encoding ' + encodes.join(', '));
+
+    // Partial SRTs are written while transcription/translation is still running
+    const partialLinks = Object.entries(data.partial || {})
+      .map(([label, name]) => `<a href="/download/${name}" target="_blank">${label}</a>`)
+      .join(' ');
+    const partialHtml = partialLinks ? `<br><span style="font-size:0.5em">Partial subtitles: ${partialLinks}</span>` : '';
+    const detailHtml = details.length ? `<br><span style="font-size:0.5em">${details.join(' &middot; ')}</span>` : '';
+    thisProgress.innerHTML = `Processing ${inputFileName}...${detailHtml}${partialHtml}`;
+    return false;
+  }
+
+  // Progress is pushed over server-sent events; polling /status is only the fallback.
+  function watchJob(job_id, inputFileName, thisProgress) {
+    if (!window.EventSource) return checkStatus(job_id, inputFileName, thisProgress);
+    const events = new EventSource('/events/' + job_id);
+    let ended = false;
+    events.onmessage = (e) => {
+      ended = renderStatus(JSON.parse(e.data), inputFileName, thisProgress);
+      if (ended) events.close();
+    };
+    events.onerror = () => {
+      events.close();
+      if (!ended) checkStatus(job_id, inputFileName, thisProgress);
+    };
+  }
+
   async function checkStatus(job_id, inputFileName, thisProgress) {
     try {
       const res = await fetch('/status/' + job_id);
       const data = await res.json();
-
-      if (data.status === 'done') {
-        thisProgress.innerHTML = `<span style="color:green;font-weight:bold">Done! (${inputFileName})</span>`;
-        resultsTable.style.display = ''; // show the table if hidden
-
-        let firstRow = true;
-        const nOutputs = Object.keys(data.outputs).length;
-        for (const [label, fullOutputFileName] of Object.entries(data.outputs)) {
-          if (!fullOutputFileName || typeof fullOutputFileName !== 'string') continue;
-          const tr = document.createElement('tr');
-          if (firstRow) {
-            tr.innerHTML = `
-              <td rowspan="${nOutputs}">${inputFileName}</td>
-              <td>${label}</td>
-              <td>${fullOutputFileName}</td>
-              <td><a href="/download/${fullOutputFileName}" target="_blank">Download</a></td>
-              <td rowspan="${nOutputs}">${data.duration_seconds || ''}</td>
-            `;
-            firstRow = false;
-          } else {
-            tr.innerHTML = `
-              <td>${label}</td>
-              <td>${fullOutputFileName}</td>
-              <td><a href="/download/${fullOutputFileName}" target="_blank">Download</a></td>
-            `;
-          }
-          resultsTbody.appendChild(tr);
-        }
-      } else if (data.status === 'failed') {
-        thisProgress.innerText = 'Processing failed.';
-        thisProgress.style.color = "red";
-      } else {
+      if (!renderStatus(data, inputFileName, thisProgress)) {
         setTimeout(() => checkStatus(job_id, inputFileName, thisProgress), 2000);
       }
     } catch (err) {
@@ -0,0 +1,37 @@
+import numpy as np
+
+from app.pipeline.bitmap_subs import build_cues, crop_to_text
+
+
+def cues(subs):
+    return [(s.start.total_seconds(), s.end.total_seconds(), s.content) for s in subs]
+
+
+def test_cue_runs_until_the_picture_changes():
+    events = [(1.0, "a"), (3.0, None), (4.0, "b"), (6.5, "c"), (7.0, None)]
+    texts = {"a": "Hello", "b": "Two\nlines", "c": "Bye"}
+    assert cues(build_cues(events, texts)) == [(1.0, 3.0, "Hello"), (4.0, 6.5, "Two\nlines"), (6.5, 7.0, "Bye")]
+
+
+def test_resent_bitmap_extends_one_cue():
+    events = [(1.0, "a"), (1.5, "a"), (2.0, "a"), (3.0, None)]
+    subs = build_cues(events, {"a": "Hello"})
+    assert cues(subs) == [(1.0, 3.0, "Hello")]
+    assert [s.index for s in subs] == [1]
+
+
+def test_cue_without_a_clear_event_is_capped():
+    events = [(1.0, "a"), (30.0, "b")]
+    assert cues(build_cues(events, {"a": "A", "b": "B"}, max_cue_seconds=5.0)) == [(1.0, 6.0, "A"), (30.0, 35.0, "B")]
+
+
+def test_unreadable_bitmaps_are_dropped():
+    events = [(1.0, "a"), (2.0, "b"), (3.0, None)]
+    assert cues(build_cues(events, {"a": "", "b": "B"})) == [(2.0, 3.0, "B")]
+
+
+def test_crop_to_text():
+    frame = np.full((100, 200), 255, dtype=np.uint8)
+    assert crop_to_text(frame) is None
+    frame[40:50, 60:120] = 0
+    assert crop_to_text(frame, margin=4).shape == (18, 68)
@@ -0,0 +1,87 @@
+import time
+
+from app.pipeline.chunked_transcription import (
+    Deferred, choose_boundaries, stitch_chunk, stitch_segments, stream_chunks
+)
+from app.pipeline.metrics import metrics
+
+
+def seg(start, end, text):
+    return {"start": start, "end": end, "text": text}
+
+
+def test_boundaries_snap_to_nearby_silences():
+    assert choose_boundaries(250.0, [(95.0, 97.0), (300.0, 301.0)], 100) == [0.0, 96.0, 196.0, 250.0]
+
+
+def test_stitch_chunk_shifts_and_keeps_owned_segments():
+    segments = [seg(0.0, 1.0, "overlap"), seg(1.5, 3.0, "mine"), seg(9.5, 11.0, "next chunk's")]
+    assert stitch_chunk(segments, offset=9.0, own_start=10.0, own_end=19.0) == [seg(10.5, 12.0, "mine")]
+
+
+def test_stitch_chunk_shifts_word_timings():
+    segments = [{**seg(1.0, 2.0, "hi"), "words": [{"word": "hi", "start": 1.0, "end": 2.0}, {"word": "?"}]}]
+    [kept] = stitch_chunk(segments, offset=10.0, own_start=0.0, own_end=20.0)
+    assert kept["words"] == [{"word": "hi", "start": 11.0, "end": 12.0}, {"word": "?"}]
+
+
+def test_stitch_drops_a_repeat_straddling_the_boundary():
+    first = [seg(8.0, 10.2, "Hello there"), seg(10.2, 10.6, "x")]
+    second = [seg(0.5, 2.0, " Hello there "), seg(2.0, 3.0, "world")]
+    stitched = stitch_segments([(first, 0.0, 0.0, 10.0), (second, 9.0, 10.0, 20.0)])
+    assert [s["text"] for s in stitched] == ["Hello there", "world"]
+
+
+def test_stitch_skips_untimed_segments():
+    assert stitch_chunk([seg(None, 1.0, "a"), seg(1.0, 2.0, "b")], 0.0, 0.0, 5.0) == [seg(1.0, 2.0, "b")]
+
+
+class Submitter:
+    """Records submissions and which chunks had been submitted when each result was read."""
+
+    def __init__(self, detected="en"):
+        self.detected = detected
+        self.log = []
+
+    def __call__(self, audio_slice, language):
+        self.log.append(("submit", audio_slice, language))
+        return Deferred(self._run, audio_slice, language)
+
+    def _run(self, audio_slice, language):
+        self.log.append(("result", audio_slice, language))
+        return [seg(0.0, 1.0, audio_slice)], language or self.detected
+
+
+class Slice(str):
+    def load(self):
+        return self
+
+
+def chunks(n):
+    return [(Slice(f"c{i}"), i * 10.0, i * 10.0, (i + 1) * 10.0) for i in range(n)]
+
+
+def test_known_language_submits_every_chunk_up_front():
+    submit = Submitter()
+    results = list(stream_chunks(chunks(3), submit, language="de"))
+    assert [kind for kind, _, _ in submit.log[:3]] == ["submit"] * 3
+    assert {language for _, _, language in submit.log} == {"de"}
+    assert [[s["text"] for s in segments] for segments, _ in results] == [["c0"], ["c1"], ["c2"]]
+
+
+def test_detected_language_from_the_first_chunk_is_used_for_the_rest():
+    submit = Submitter(detected="fr")
+    results = list(stream_chunks(chunks(3), submit))
+    assert submit.log[:2] == [("submit", "c0", None), ("result", "c0", None)]
+    assert [language for kind, _, language in submit.log[2:] if kind == "submit"] == ["fr", "fr"]
+    assert [language for _, language in results] == ["fr"] * 3
+
+
+def test_postprocess_time_is_not_counted_as_transcription():
+    def slow_align(segments, language, audio):
+        time.sleep(0.05)
+        return segments
+
+    with metrics.job_context("job") as job:
+        list(stream_chunks(chunks(2), Submitter(), language="en", postprocess=slow_align))
+    assert job.snapshot()["stage_seconds"]["transcribe"] < 0.05
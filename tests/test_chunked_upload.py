@@ -0,0 +1,113 @@
+import os
+import re
+import json
+import shutil
+import time
+import zlib
+import threading
+import subprocess
+
+import pytest
+
+from app.chunked_upload import ChunkedUploads, UploadBusy, UploadError, combine_crcs
+from app.staging import StreamingChecksum
+
+UPLOAD_JS = os.path.join(os.path.dirname(__file__), "..", "static", "js", "upload.js")
+CHUNK = 4096
+DATA = bytes(range(256)) * 40  # three chunks, the last one short
+
+
+def uploads(tmp_path):
+    return ChunkedUploads(str(tmp_path / "uploads"), str(tmp_path))
+
+
+def chunk(i):
+    return DATA[i * CHUNK:(i + 1) * CHUNK]
+
+
+def test_chunks_in_any_order_give_the_streaming_content_key(tmp_path):
+    store = uploads(tmp_path)
+    upload_id = store.init("movie.mkv", len(DATA), chunk_size=CHUNK)["upload_id"]
+    for i in (2, 0, 1):
+        store.write_chunk(upload_id, i * CHUNK, chunk(i), crc32=f"{zlib.crc32(chunk(i)):08x}")
+    staged_path, key = store.finalize(upload_id, combine_crcs(zlib.crc32(chunk(i)) for i in range(3)))
+
+    with open(staged_path, "rb") as f:
+        assert f.read() == DATA
+    checksum = StreamingChecksum(CHUNK)
+    for piece in (DATA[:1000], DATA[1000:9000], DATA[9000:]):
+        checksum.update(piece)
+    assert checksum.key() == key
+
+
+def test_restarted_server_resumes_from_the_chunk_log(tmp_path):
+    upload_id = uploads(tmp_path).init("a.mp4", len(DATA), chunk_size=CHUNK, resume_key="a")["upload_id"]
+    store = uploads(tmp_path)
+    store.write_chunk(upload_id, 0, chunk(0))
+    with open(os.path.join(store.work_dir, f"{upload_id}.chunks"), "a") as f:
+        f.write("2 12")  # torn line from a crash mid-append
+
+    resumed = uploads(tmp_path).init("a.mp4", len(DATA), chunk_size=CHUNK, resume_key="a")
+    assert (resumed["upload_id"], resumed["received"]) == (upload_id, [0])
+
+
+def test_missing_chunks_fail_finalize_but_keep_the_upload_open(tmp_path):
+    store = uploads(tmp_path)
+    upload_id = store.init("a.mkv", len(DATA), chunk_size=CHUNK)["upload_id"]
+    store.write_chunk(upload_id, 0, chunk(0))
+    with pytest.raises(UploadError, match="2 chunk"):
+        store.finalize(upload_id)
+    store.write_chunk(upload_id, CHUNK, chunk(1))
+    store.write_chunk(upload_id, 2 * CHUNK, chunk(2))
+    store.finalize(upload_id)
+    with pytest.raises(UploadError):
+        store.write_chunk(upload_id, 0, chunk(0))
+
+
+def test_finalize_waits_for_chunks_in_flight_and_turns_away_new_ones(tmp_path, monkeypatch):
+    store = uploads(tmp_path)
+    upload_id = store.init("a.mkv", len(DATA), chunk_size=CHUNK)["upload_id"]
+    store.write_chunk(upload_id, 0, chunk(0))
+    store.write_chunk(upload_id, CHUNK, chunk(1))
+
+    writing, release = threading.Event(), threading.Event()
+    write_at = store._write_at
+
+    def slow_write(*args):
+        writing.set()
+        release.wait(5)
+        write_at(*args)
+
+    monkeypatch.setattr(store, "_write_at", slow_write)
+    writer = threading.Thread(target=store.write_chunk, args=(upload_id, 2 * CHUNK, chunk(2)))
+    writer.start()
+    writing.wait(5)
+    result = {}
+    finalizer = threading.Thread(target=lambda: result.update(path=store.finalize(upload_id)[0]))
+    finalizer.start()
+    while not store._guards[upload_id]["closing"]:
+        time.sleep(0.001)
+
+    with pytest.raises(UploadBusy):
+        store.write_chunk(upload_id, 0, chunk(0))
+    release.set()
+    writer.join(5)
+    finalizer.join(5)
+    with open(result["path"], "rb") as f:
+        assert f.read() == DATA
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_browser_checksums_match_the_server():
+    with open(UPLOAD_JS, encoding="utf-8") as f:
+        source = f.read()
+    functions = re.search(r"  const CRC_TABLE = .*?\n  function combineCrcs\(crcs\) \{.*?\n  \}\n", source, re.S).group(0)
+    chunks = [b"", b"hello", bytes(range(256)) * 3]
+    script = functions + (
+        "const chunks = %s.map(c => new Uint8Array(c));\n"
+        "const crcs = chunks.map(c => crc32(c));\n"
+        "console.log(JSON.stringify({crcs, combined: combineCrcs(crcs)}));\n"
+    ) % json.dumps([list(c) for c in chunks])
+    out = json.loads(subprocess.run(["node", "-e", script], capture_output=True, text=True, check=True).stdout)
+    assert out["crcs"] == [zlib.crc32(c) for c in chunks]
+    assert out["combined"] == combine_crcs(out["crcs"])
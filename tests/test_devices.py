@@ -0,0 +1,62 @@
+import threading
+from contextlib import ExitStack
+
+from app.auto_subtitles import AutoSubtitlePipeline
+from app.pipeline.devices import Device, DevicePool
+
+
+class FakeTranscriber:
+    device = "cuda"
+    model_size = "large-v3"
+
+    def memory_mb(self):
+        return 10000
+
+    def use_device(self, device):
+        self.device = device
+
+
+class FakeTranslator:
+    MEMORY_MB = 3000
+    device = "cpu"
+
+    def use_device(self, device):
+        self.device = device
+
+
+def place_in_thread(pipeline, stack, timeout=5):
+    placed = {}
+    worker = threading.Thread(target=lambda: placed.update(pipeline.place_models(stack)), daemon=True)
+    worker.start()
+    worker.join(timeout)
+    assert not worker.is_alive(), "placement blocked"
+    return placed
+
+
+def test_translation_shares_the_only_gpu_with_its_transcription():
+    pool = DevicePool([Device("cuda:0", 12000, encoders=3)])
+    pipeline = AutoSubtitlePipeline(FakeTranscriber(), FakeTranslator(), devices=pool)
+    with ExitStack() as stack:
+        placed = place_in_thread(pipeline, stack)
+        assert placed == {"transcribe": "cuda:0", "translate": "cuda:0"}
+        assert pool.snapshot()[0]["stages"] == ["transcribe", "translate"]
+    assert pool.snapshot()[0]["reserved_mb"] == 0
+
+
+def test_translation_prefers_another_gpu():
+    pool = DevicePool([Device("cuda:0", 12000), Device("cuda:1", 12000)])
+    pipeline = AutoSubtitlePipeline(FakeTranscriber(), FakeTranslator(), devices=pool)
+    with ExitStack() as stack:
+        placed = place_in_thread(pipeline, stack)
+    assert placed["transcribe"] != placed["translate"]
+
+
+def test_full_gpus_do_not_deadlock_two_jobs():
+    pool = DevicePool([Device("cuda:0", 12000), Device("cuda:1", 12000)])
+    with ExitStack() as stack:
+        # Both jobs transcribe first, so every GPU is full when their translations are placed
+        jobs = [stack.enter_context(pool.place("transcribe", "cuda", memory_mb=10000)).name for _ in range(2)]
+        for device in jobs:
+            placement = stack.enter_context(pool.place(
+                "translate", "cuda", memory_mb=3000, avoid=[device], held=[device]))
+            assert placement.name == device
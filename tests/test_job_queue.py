@@ -0,0 +1,80 @@
+import time
+
+from app.job_queue import JobStore, ResourcePool, estimate_resources, QUEUED, RUNNING, DONE
+
+
+def store(tmp_path, **kwargs):
+    return JobStore(str(tmp_path / "jobs.sqlite3"), **kwargs)
+
+
+def enqueue(jobs, job_id, priority=0, gpu_mem_mb=0):
+    jobs.enqueue(job_id, "full", {}, priority=priority, resources={"cpu_slots": 1, "gpu_mem_mb": gpu_mem_mb})
+
+
+def test_claims_highest_priority_first(tmp_path):
+    jobs = store(tmp_path)
+    enqueue(jobs, "low", priority=0)
+    enqueue(jobs, "high", priority=5)
+    assert jobs.claim_next("w1")["id"] == "high"
+    assert jobs.claim_next("w1")["id"] == "low"
+    assert jobs.claim_next("w1") is None
+
+
+def test_requeued_claim_no_longer_owns_the_job(tmp_path):
+    jobs = store(tmp_path)
+    enqueue(jobs, "a")
+    first = jobs.claim_next("w1")
+    assert jobs.checkpoint(first, "subtitles_written", {"segments": 3})
+    assert jobs.requeue_running(worker="w1") == 1
+    assert jobs.get("a")["state"] == QUEUED
+
+    second = jobs.claim_next("w1")
+    assert second["attempts"] == 2
+    assert second["checkpoint"]["subtitles_written"]["segments"] == 3
+    assert not jobs.owns(first) and jobs.owns(second)
+    assert not jobs.checkpoint(first, "encoded")
+    assert not jobs.finish(first)
+    assert jobs.finish(second)
+    assert jobs.get("a")["state"] == DONE
+
+
+def test_requeue_stale_only_touches_silent_workers(tmp_path):
+    jobs = store(tmp_path)
+    enqueue(jobs, "a", priority=1)
+    enqueue(jobs, "b")
+    jobs.heartbeat("alive")
+    jobs.claim_next("alive")
+    jobs.claim_next("gone")
+    assert jobs.requeue_stale(timeout=60) == 1
+    assert (jobs.get("a")["state"], jobs.get("b")["state"]) == (RUNNING, QUEUED)
+
+
+def test_large_job_is_not_starved_by_smaller_ones(tmp_path):
+    jobs = store(tmp_path, max_passovers=2)
+    pool = ResourcePool({"cpu_slots": 4, "gpu_mem_mb": 10000})
+    pool.acquire({"gpu_mem_mb": 6000})  # a job already running on the GPU
+    enqueue(jobs, "big", priority=1, gpu_mem_mb=8000)
+    for i in range(4):
+        enqueue(jobs, f"small{i}", gpu_mem_mb=1000)
+        time.sleep(0.001)
+
+    claimed = [jobs.claim_next("w1", fits=pool.fits) for _ in range(3)]
+    assert [job and job["id"] for job in claimed] == ["small0", "small1", None]
+    assert jobs.get("big")["passed_over"] == 2
+
+    pool.release({"gpu_mem_mb": 6000})
+    assert jobs.claim_next("w1", fits=pool.fits)["id"] == "big"
+    assert jobs.get("big")["passed_over"] == 0
+
+
+def test_oversized_job_runs_on_an_idle_pool():
+    pool = ResourcePool({"cpu_slots": 2, "gpu_mem_mb": 8000})
+    assert pool.fits({"cpu_slots": 1, "gpu_mem_mb": 20000})
+    pool.acquire({"cpu_slots": 1})
+    assert not pool.fits({"cpu_slots": 1, "gpu_mem_mb": 20000})
+
+
+def test_gpu_jobs_reserve_their_whisper_vram():
+    assert estimate_resources("full", {"ml_device": "cuda", "model": "medium.en"})["gpu_mem_mb"] == 5000
+    assert estimate_resources("full", {"ml_device": "cuda", "model": "unknown"})["gpu_mem_mb"] == 10000
+    assert estimate_resources("full", {"ml_device": "cpu", "model": "large"})["gpu_mem_mb"] == 0
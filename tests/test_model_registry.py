@@ -0,0 +1,62 @@
+from app.pipeline.model_registry import ModelRegistry, MB
+
+
+def load(registry, name, size_mb, calls, device="cpu", pin=False):
+    def loader():
+        calls.append(name)
+        return name
+    return registry.get_or_load((name, "base", device, "default"), loader, size_bytes=size_mb * MB, pin=pin)
+
+
+def cached(registry):
+    return [model["key"][0] for model in registry.stats()["models"]]
+
+
+def test_reuses_loaded_models():
+    registry, calls = ModelRegistry(ram_budget_bytes=100 * MB), []
+    assert load(registry, "a", 10, calls) == "a"
+    assert load(registry, "a", 10, calls) == "a"
+    assert calls == ["a"]
+    assert (registry.hits, registry.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_first():
+    registry, calls = ModelRegistry(ram_budget_bytes=100 * MB), []
+    load(registry, "a", 40, calls)
+    load(registry, "b", 40, calls)
+    load(registry, "a", 40, calls)  # "b" is now the oldest
+    load(registry, "c", 40, calls)
+    assert cached(registry) == ["a", "c"]
+
+
+def test_budgets_are_per_device_class():
+    registry, calls = ModelRegistry(ram_budget_bytes=50 * MB, vram_budget_bytes=50 * MB), []
+    load(registry, "a", 40, calls, device="cpu")
+    load(registry, "b", 40, calls, device="cuda:0")
+    assert cached(registry) == ["a", "b"]
+
+
+def test_pinned_models_are_never_evicted():
+    registry, calls = ModelRegistry(ram_budget_bytes=100 * MB), []
+    with registry.pinning():
+        load(registry, "a", 60, calls)
+    load(registry, "b", 30, calls)
+    load(registry, "c", 30, calls)
+    assert cached(registry) == ["a", "c"]
+    assert registry.stats()["models"][0]["pinned"]
+
+
+def test_model_just_loaded_stays_when_the_rest_is_pinned():
+    registry, calls = ModelRegistry(ram_budget_bytes=100 * MB), []
+    load(registry, "a", 80, calls, pin=True)
+    load(registry, "b", 40, calls)
+    load(registry, "b", 40, calls)
+    assert calls == ["a", "b"]
+    assert cached(registry) == ["a", "b"]
+
+
+def test_oversized_model_still_loads():
+    registry, calls = ModelRegistry(ram_budget_bytes=10 * MB), []
+    load(registry, "a", 5, calls)
+    load(registry, "big", 50, calls)
+    assert cached(registry) == ["big"]
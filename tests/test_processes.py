@@ -0,0 +1,40 @@
+import sys
+import threading
+import subprocess
+
+import pytest
+
+from app.pipeline import processes
+
+
+@pytest.fixture(autouse=True)
+def fresh_tracker(monkeypatch):
+    monkeypatch.setattr(processes, "_children", set())
+    monkeypatch.setattr(processes, "_closing", False)
+
+
+def test_run_matches_subprocess_run():
+    done = processes.run([sys.executable, "-c", "print('hi')"], capture_output=True, text=True, check=True)
+    assert (done.returncode, done.stdout) == (0, "hi\n")
+    with pytest.raises(subprocess.CalledProcessError):
+        processes.run([sys.executable, "-c", "raise SystemExit(3)"], check=True)
+    assert not processes._children
+
+
+def test_terminate_children_stops_running_ones_and_refuses_new_ones():
+    results = {}
+    started = threading.Event()
+
+    def job():
+        with processes.popen([sys.executable, "-c", "import time; time.sleep(60)"]) as proc:
+            started.set()
+            results["returncode"] = proc.wait()
+
+    thread = threading.Thread(target=job, daemon=True)
+    thread.start()
+    started.wait(5)
+    assert processes.terminate_children(timeout=5) == 1
+    thread.join(5)
+    assert results["returncode"] != 0
+    with pytest.raises(RuntimeError):
+        processes.run([sys.executable, "-c", "pass"])
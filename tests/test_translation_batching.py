@@ -0,0 +1,70 @@
+import srt
+
+from app.pipeline.base import Translator, length_sorted_batches
+
+
+class UpperTranslator(Translator):
+    """Translates by upper-casing and tagging the language; records every batch it is given."""
+
+    def __init__(self, fail_multi=False, fail_lines=()):
+        self.batches = []
+        self.fail_multi = fail_multi
+        self.fail_lines = set(fail_lines)
+
+    def translate(self, text, src_lang, target_lang):
+        if text in self.fail_lines:
+            raise RuntimeError("model error")
+        return f"{target_lang}:{text.upper()}"
+
+    def translate_batch(self, texts, src_lang, target_lang, batch_size=16):
+        self.batches.append((target_lang, list(texts)))
+        if self.fail_lines & set(texts):
+            raise RuntimeError("batch error")
+        return [self.translate(t, src_lang, target_lang) if t.strip() else t for t in texts]
+
+    def translate_multi(self, texts, src_lang, target_langs, batch_size=16):
+        if self.fail_multi:
+            raise RuntimeError("multi error")
+        return super().translate_multi(texts, src_lang, target_langs, batch_size=batch_size)
+
+
+def test_batches_cover_every_non_empty_text_once():
+    texts = ["a" * n for n in (5, 1, 30, 2, 12)] + ["", "   "]
+    batches = list(length_sorted_batches(texts, batch_size=2))
+    assert sorted(i for batch in batches for i in batch) == [0, 1, 2, 3, 4]
+    assert all(len(batch) <= 2 for batch in batches)
+
+
+def test_batches_are_sorted_by_length():
+    texts = ["a" * n for n in (5, 1, 30, 2, 12)]
+    flat = [i for batch in length_sorted_batches(texts, batch_size=2) for i in batch]
+    assert [len(texts[i]) for i in flat] == [1, 2, 5, 12, 30]
+
+
+def test_long_lines_get_smaller_batches():
+    texts = ["x" * 1000] * 8
+    batches = list(length_sorted_batches(texts, batch_size=16, max_batch_chars=4096))
+    assert [len(batch) for batch in batches] == [4, 4]
+
+
+def test_translate_texts_falls_back_per_language_then_per_line():
+    translator = UpperTranslator(fail_multi=True, fail_lines={"bad"})
+    result = translator.translate_texts(["hi", "bad", ""], "en", ["de", "fr"])
+    assert result == {"de": ["de:HI", "bad", ""], "fr": ["fr:HI", "bad", ""]}
+
+
+def test_translate_srt_multi_writes_every_target(tmp_path):
+    source = tmp_path / "in.srt"
+    subs = [srt.Subtitle(index=1, start=srt.timedelta(seconds=1), end=srt.timedelta(seconds=2), content="hello"),
+            srt.Subtitle(index=2, start=srt.timedelta(seconds=3), end=srt.timedelta(seconds=4), content="two\nlines")]
+    source.write_text(srt.compose(subs), encoding="utf-8")
+    outputs = {"de": str(tmp_path / "de.srt"), "he": str(tmp_path / "he.srt")}
+    translator = UpperTranslator()
+    translator.translate_srt_multi(str(source), outputs, "en")
+
+    assert [lang for lang, _ in translator.batches] == ["de", "he"]
+    for lang, path in outputs.items():
+        with open(path, encoding="utf-8") as f:
+            translated = list(srt.parse(f.read()))
+        assert [s.content for s in translated] == [f"{lang}:HELLO", f"{lang}:TWO\nLINES"]
+        assert [(s.start, s.end) for s in translated] == [(s.start, s.end) for s in subs]
@@ -0,0 +1,78 @@
+from app.pipeline.translation_memory import (
+    TranslationMemory, cached_translate, cached_translate_multi, normalize_text
+)
+
+
+def memory(tmp_path):
+    return TranslationMemory(str(tmp_path / "tm.sqlite3"), lru_size=2)
+
+
+class Recorder:
+    """translate_fn that tags each text with the language and records what the model was given."""
+
+    def __init__(self):
+        self.calls = []
+
+    def single(self, texts):
+        self.calls.append(list(texts))
+        return [f"de[{t}]" for t in texts]
+
+    def multi(self, texts, langs):
+        self.calls.append((list(texts), list(langs)))
+        return {lang: [f"{lang}[{t}]" for t in texts] for lang in langs}
+
+
+def test_normalize_collapses_whitespace():
+    assert normalize_text("  two\nlines  here ") == "two lines here"
+
+
+def test_translate_through_translates_each_unique_miss_once(tmp_path):
+    tm, model = memory(tmp_path), Recorder()
+    texts = ["Yes.", "", "Yes.", "No."]
+    assert tm.translate_through("m", "en", "de", texts, model.single) == ["de[Yes.]", "", "de[Yes.]", "de[No.]"]
+    assert model.calls == [["Yes.", "No."]]
+    assert tm.translate_through("m", "en", "de", ["No.", "Yes."], model.single) == ["de[No.]", "de[Yes.]"]
+    assert len(model.calls) == 1
+    assert (tm.hits, tm.misses) == (2, 3)
+
+
+def test_model_gets_the_original_line_not_the_key(tmp_path):
+    tm, model = memory(tmp_path), Recorder()
+    texts = ["two\nlines", "two  lines"]
+    assert tm.translate_through("m", "en", "de", texts, model.single) == ["de[two\nlines]", "de[two\nlines]"]
+    assert model.calls == [["two\nlines"]]
+    # A re-wrapped copy of the line is a hit
+    assert tm.translate_through("m", "en", "de", ["two lines"], model.single) == ["de[two\nlines]"]
+
+
+def test_entries_survive_a_reopen(tmp_path):
+    model = Recorder()
+    memory(tmp_path).translate_through("m", "en", "de", ["Hello"], model.single)
+    assert memory(tmp_path).lookup("m", "en", "de", ["Hello", "Bye"]) == ["de[Hello]", None]
+
+
+def test_entries_are_per_model_and_pair(tmp_path):
+    tm = memory(tmp_path)
+    tm.store("m", "en", "de", ["Hello"], ["Hallo"])
+    assert tm.lookup("other", "en", "de", ["Hello"]) == [None]
+    assert tm.lookup("m", "en", "fr", ["Hello"]) == [None]
+
+
+def test_cached_translate_without_memory_calls_the_model():
+    model = Recorder()
+    assert cached_translate(None, "m", "en", "de", ["a"], model.single) == ["de[a]"]
+
+
+def test_multi_only_asks_for_missing_languages_and_texts(tmp_path):
+    tm, model = memory(tmp_path), Recorder()
+    tm.store("m", "eng", "deu", ["Hello"], ["Hallo"])
+    codes = {"de": "deu", "he": "heb"}
+    result = cached_translate_multi(tm, "m", "eng", codes, ["Hello", "", "Bye\nnow", "Bye now"], model.multi)
+    [(sources, langs)] = model.calls
+    assert sorted(sources) == ["Bye\nnow", "Hello"] and langs == ["de", "he"]
+    assert result["de"] == ["Hallo", "", "de[Bye\nnow]", "de[Bye\nnow]"]
+    assert result["he"] == ["he[Hello]", "", "he[Bye\nnow]", "he[Bye\nnow]"]
+
+    again = cached_translate_multi(tm, "m", "eng", codes, ["Bye now", "Hello"], model.multi)
+    assert len(model.calls) == 1
+    assert again == {"de": ["de[Bye\nnow]", "Hallo"], "he": ["he[Bye\nnow]", "he[Hello]"]}